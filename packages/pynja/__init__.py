@@ -4,6 +4,9 @@ from .build import *
 from .cpp import *
 from .java import *
 from .io import *
+from .option_list import *
+from .transitive import *
+from .pools import *
 from .tc_gcc import *
 from .tc_clang import *
 from .tc_msvc import *
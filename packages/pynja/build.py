@@ -1,19 +1,27 @@
 import sys
 import os
+import pickle
+import sysconfig
+import hashlib
+import itertools
+import fnmatch
 from . import io
 from . import root_paths
+from . import ninja_writer
+from . import build_graph
+from . import dir_snapshot
+from . import pools
+from .ninja_writer import ninja_esc_path
+from .scripts import identity_stamp
 from abc import *
 
 
-def ninja_esc_path(path):
-    return path.replace('$','$$').replace(' ','$ ').replace(':', '$:')
-
 def xlat_path(project, path):
     """Translate common prefix to variable reference."""
     if path.startswith(project.projectDir):
-        return path.replace(project.projectDir, '$'+project._pdirName)
+        return '$' + project._pdirName + ninja_esc_path(path[len(project.projectDir):])
     if path.startswith(project.builtDir):
-        return path.replace(project.builtDir, '$'+project._bdirName)
+        return '$' + project._bdirName + ninja_esc_path(path[len(project.builtDir):])
     return ninja_esc_path(path)
 
 def translate_path_list(ninjaFile, project, paths, separator = " ", prefix = None):
@@ -32,7 +40,16 @@ def translate_order_only_deps(ninjaFile, project, task, needPipe):
     prefix = " ||" if needPipe else ""
     translate_path_list(ninjaFile, project, task.orderOnlyDeps, " $\n    ", prefix)
 
+_pynjaDir = os.path.dirname(os.path.abspath(__file__))
+
 def get_loaded_modules(rootDir):
+    """Returns the paths of the loaded modules that generation depends on: pynja
+    itself, modules under the repo's root directory, and scripts imported through
+    root_paths.  The standard library and other installed packages are left out;
+    the identity stamp covers the interpreter instead (see emit_regenerator_target).
+    """
+    repoDirs = (os.path.join(_pynjaDir, ""), os.path.join(os.path.abspath(root_paths.rootDir or rootDir), ""))
+    scriptPaths = root_paths.get_script_paths()
     modules = []
     for name, module in sorted(sys.modules.items()):
         path = getattr(module, "__file__", None)
@@ -42,42 +59,223 @@ def get_loaded_modules(rootDir):
             continue
         if not os.path.isabs(path):
             path = os.path.join(rootDir, path)
-        modules.append(path)
+        if os.path.abspath(path).startswith(repoDirs) or (path in scriptPaths):
+            modules.append(path)
     return modules
 
 
-class Variant:
-    def __init__(self, string, fieldDefs):
-        self.__str = string
-        parts = self.__str.split("-")
-        for i in range(len(parts)):
-            fieldValue   = parts[i]
-            fieldName    = fieldDefs[i * 2 + 0]
-            fieldOptions = fieldDefs[i * 2 + 1]
+class VariantAxes:
+    """The named axes of a variant, and the valid values of each.
+
+    fieldDefs is a flat list of alternating field names and option lists, e.g.
+        [ "os", [ "windows", "linux" ], "config", [ "dbg", "rel" ] ]
+    """
+    __slots__ = ("fieldDefs", "names", "options", "_index")
+
+    _cache = {}
+
+    def __init__(self, fieldDefs):
+        self.fieldDefs = fieldDefs
+        self.names = tuple(fieldDefs[0::2])
+        self.options = tuple([tuple(options) for options in fieldDefs[1::2]])
+        self._index = dict([(name, i) for i, name in enumerate(self.names)])
+
+    @staticmethod
+    def get(fieldDefs):
+        """Returns the shared VariantAxes for fieldDefs."""
+        key = tuple([field if isinstance(field, str) else tuple(field) for field in fieldDefs])
+        axes = VariantAxes._cache.get(key)
+        if axes == None:
+            axes = VariantAxes(fieldDefs)
+            VariantAxes._cache[key] = axes
+        return axes
+
+    def validate(self, values):
+        if len(values) > len(self.names):
+            raise Exception("too many fields in variant %s; expected at most %d" % ("-".join(values), len(self.names)))
+        for i in range(len(values)):
+            fieldValue   = values[i]
+            fieldName    = self.names[i]
+            fieldOptions = self.options[i]
             if not (fieldValue in fieldOptions):
                 errstr = "%s is not valid for field %s\n" % (fieldValue, fieldName)
                 errstr = errstr + "Valid options are:\n"
                 for option in fieldOptions:
                     errstr = errstr + ("    %s\n" % (option,))
                 raise Exception(errstr)
-            setattr(self, fieldName, fieldValue)
+
+    def has_field(self, name):
+        return name in self._index
+
+    def enumerate(self, variantClass, where = None, **constraints):
+        """Lazily yields each variantClass in the cross-product of all axes.
+
+        Args:
+            constraints -- map of field name -> a value, or a list of allowed values
+            where -- optional predicate; only variants for which where(variant) is true are yielded
+        """
+        choices = list(self.options)
+        for name, allowed in constraints.items():
+            index = self._index.get(name)
+            if index == None:
+                raise Exception("unknown variant field %s; valid fields are: %s" % (name, ", ".join(self.names)))
+            if isinstance(allowed, str):
+                allowed = (allowed,)
+            choices[index] = [option for option in choices[index] if option in allowed]
+        for values in itertools.product(*choices):
+            variant = variantClass("-".join(values))
+            if (where == None) or where(variant):
+                yield variant
+
+
+def _get_variant_class_axes(variantClass):
+    fieldDefs = getattr(variantClass, "fieldDefs", None)
+    if fieldDefs == None:
+        raise Exception("%s must define fieldDefs" % variantClass.__name__)
+    return VariantAxes.get(fieldDefs)
+
+
+def _unpickle_variant(variantClass, string, fieldDefs):
+    variant = Variant._interned.get((variantClass, string))
+    if variant == None:
+        variant = object.__new__(variantClass)
+        Variant.__init__(variant, string, fieldDefs)
+    return variant
+
+
+class Variant:
+    """An immutable, interned set of named fields, written as "value0-value1-...".
+
+    Constructing a variant that already exists returns the existing object, so
+    variants are cheap to compare and to use as dictionary keys.  Fields are read
+    as attributes, e.g. variant.config; subclasses declare __slots__ = () so that
+    their variants do not get a __dict__.
+    """
+    __slots__ = ("_str", "_hash", "_axes", "_values", "_derived")
+
+    _interned = {}      # map (class, string) -> variant
+
+    def __new__(cls, string, *args, **kwargs):
+        variant = Variant._interned.get((cls, string))
+        if variant == None:
+            variant = object.__new__(cls)
+        return variant
+
+    def __init__(self, string, fieldDefs):
+        if (type(self), string) in Variant._interned:
+            return
+        axes = VariantAxes.get(fieldDefs)
+        parts = string.split("-")
+        axes.validate(parts)
+        object.__setattr__(self, "_values", tuple(parts))
+        object.__setattr__(self, "_str", string)
+        object.__setattr__(self, "_hash", hash(string))
+        object.__setattr__(self, "_axes", axes)
+        object.__setattr__(self, "_derived", {})
+        Variant._interned[(type(self), string)] = self
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set, which includes the fields
+        if not name.startswith("_"):
+            index = self._axes._index.get(name)
+            if (index != None) and (index < len(self._values)):
+                return self._values[index]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def __setattr__(self, name, value):
+        raise Exception("Variant objects are immutable")
+
+    def __reduce__(self):
+        return (_unpickle_variant, (type(self), self._str, self._axes.fieldDefs))
+
+    def __eq__(self, other):
+        return (self is other) or (isinstance(other, Variant) and (self._str == other._str))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return self._hash
 
     def __lt__(self, other):
-        return self.__str < other.__str
+        return self._str < other._str
 
     def __str__(self, ):
-        return self.__str
+        return self._str
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self._str)
+
+    def derive(self, variantClass = None, **fields):
+        """Returns the variant with the same fields as this one, except for those given.
+
+        Example:
+            libVariant = variant.derive(CppLibVariant, linkage = "dyn")
+
+        Args:
+            variantClass -- class of the result; defaults to type(self).  A different
+                class must define fieldDefs; its fields are taken from this variant
+                unless given.
+        """
+        key = (variantClass, tuple(sorted(fields.items())))
+        variant = self._derived.get(key)
+        if variant != None:
+            return variant
+
+        if variantClass == None:
+            variantClass = type(self)
+            axes = self._axes
+        else:
+            axes = _get_variant_class_axes(variantClass)
+        values = []
+        for name in axes.names:
+            value = fields.get(name)
+            if value == None:
+                value = getattr(self, name, None)
+                if value == None:
+                    raise Exception("variant %s has no field %s; pass it to derive()" % (self._str, name))
+            values.append(value)
+        for name in fields:
+            if not axes.has_field(name):
+                raise Exception("unknown variant field %s; valid fields are: %s" % (name, ", ".join(axes.names)))
+        variant = variantClass("-".join(values))
+        self._derived[key] = variant
+        return variant
+
+    @classmethod
+    def enumerate(cls, where = None, **constraints):
+        """Lazily yields every valid variant of this class; see VariantAxes.enumerate.
+
+        The class must define fieldDefs.
+        """
+        return _get_variant_class_axes(cls).enumerate(cls, where, **constraints)
 
 
 class BuildTask(metaclass = ABCMeta):
+    """Base class of tasks; subclasses declare their attributes in __slots__.
+
+    When projectMan.releaseTasks is True, an emitted task drops every attribute
+    that is not listed in a _resultSlots of its class hierarchy, such as option
+    lists, so that tasks kept by project scripts do not hold on to them.
+    """
+    __slots__ = ("project", "extraDeps", "extraOutputs", "orderOnlyDeps", "phonyTarget", "pool", "_emitted")
+    _resultSlots = ("project", "extraOutputs", "phonyTarget", "_emitted")
+
     def __init__(self, project):
         self.project = project
         self.extraDeps = []
         self.extraOutputs = []
         self.orderOnlyDeps = []
         self.phonyTarget = None # name of phony target to declare with this
+        self.pool = None        # name of the ninja pool of the task's edges; None for the toolchain's default
         self._emitted = False
 
+    def __getattr__(self, name):
+        # only called for attributes that are not set
+        if (name != "_emitted") and _is_task_slot(type(self), name) and self._emitted and self.project.projectMan.releaseTasks:
+            raise AttributeError("%s.%s was released after the task was emitted (projectMan.releaseTasks)" % (type(self).__name__, name))
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
     def __enter__(self):
         if self._emitted:
             raise Exception("A task should not be re-used in a with statement.")
@@ -89,13 +287,72 @@ class BuildTask(metaclass = ABCMeta):
     def _emit_once(self):
         if not self._emitted:
             self._emitted = True
-            self.emit()
+            profiler = self.project.projectMan.profiler
+            if profiler:
+                profiler.task_start(self)
+                try:
+                    self.emit()
+                finally:
+                    profiler.task_end(self)
+            else:
+                self.emit()
+            if self.project.projectMan.releaseTasks:
+                self._release()
+
+    def _release(self):
+        kept = _get_task_result_slots(type(self))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if (name not in kept) and hasattr(self, name):
+                    delattr(self, name)
 
     @abstractmethod
     def emit(self):
         pass
 
 
+_taskResultSlots = {}   # map task class -> frozenset of the slots kept by BuildTask._release()
+
+def _get_task_result_slots(taskClass):
+    kept = _taskResultSlots.get(taskClass)
+    if kept == None:
+        kept = set()
+        for cls in taskClass.__mro__:
+            kept.update(cls.__dict__.get("_resultSlots", ()))
+        kept = frozenset(kept)
+        _taskResultSlots[taskClass] = kept
+    return kept
+
+def _is_task_slot(taskClass, name):
+    """Returns True if name is a slot of taskClass, or a property such as an option_block_property."""
+    if isinstance(getattr(taskClass, name, None), property):
+        return True
+    for cls in taskClass.__mro__:
+        if name in cls.__dict__.get("__slots__", ()):
+            return True
+    return False
+
+
+def option_block_property(blockSlot, blockClass, name):
+    """Returns a property that stores a task option in a lazily created option block.
+
+    Options that only some toolchains read are grouped in a blockClass, with
+    __slots__ and default values set by its __init__.  Until one of them is
+    assigned, blockSlot is None and the defaults are shared by all tasks.
+    """
+    defaults = blockClass()
+    def get_option(self):
+        block = getattr(self, blockSlot)
+        return getattr(block if block else defaults, name)
+    def set_option(self, value):
+        block = getattr(self, blockSlot)
+        if not block:
+            block = blockClass()
+            setattr(self, blockSlot, block)
+        setattr(block, name, value)
+    return property(get_option, set_option)
+
+
 class BuildTasks:
     def __init__(self, tasks):
         self.__dict__["_tasks"] = tasks
@@ -139,8 +396,12 @@ class Project(metaclass = ABCMeta):
         self.projectRelDir = self.get_project_rel_dir()
         self.builtDir = self.get_built_dir()
         self.makeFiles = []
+        self.subninjaPath = None
+        self._subninjaReused = False
         self._runtimeDeps = {}
+        self._runtimeDepProjects = set()    # (project, destDir) pairs merged into _runtimeDeps
         self._cbProjectRefs = set()
+        self._globDirs = set()      # directories whose listings emit() depended on
 
     def get_project_dir(self):
         return getattr(root_paths.rootPaths, type(self).__name__)
@@ -164,8 +425,20 @@ class Project(metaclass = ABCMeta):
         else:
             return os.path.join(self.projectDir, path)
 
-    def custom_command(self, command, desc = None, inputs = [], outputs = []):
-        self.projectMan.emit_custom_command(command, desc, inputs, outputs)
+    def glob(self, patterns, excludes = ()):
+        """Returns the sorted paths relative to projectDir of the files that match
+        any of patterns and none of excludes; see dir_snapshot.glob().
+
+        Listings are cached in a directory snapshot, and the scanned directories
+        become inputs of the regenerator, so that adding or removing a matching
+        file regenerates the build.
+        """
+        paths, dirs = self.projectMan.glob(self.projectDir, patterns, excludes)
+        self._globDirs.update(dirs)
+        return paths
+
+    def custom_command(self, command, desc = None, inputs = [], outputs = [], pool = None):
+        self.projectMan.emit_custom_command(command, desc, inputs, outputs, pool)
 
     def copy(self, orig, dest, phonyTarget = None):
         origPath = self.get_abs_path(orig)
@@ -192,33 +465,138 @@ class Project(metaclass = ABCMeta):
         return self._add_runtime_dep(destPath, srcPath)
 
     def add_runtime_dependency_project(self, project, destDir = None):
-        for destPath, srcPath in project._runtimeDeps.items():
-            self.add_runtime_dependency(srcPath, destPath, destDir)
+        # A project's runtime deps are complete once it has been emitted, and are
+        # already normalized and validated, so each one is merged only once.
+        key = (project, destDir)
+        if key not in self._runtimeDepProjects:
+            self._runtimeDepProjects.add(key)
+            if destDir:
+                for destPath, srcPath in project._runtimeDeps.items():
+                    self.add_runtime_dependency(srcPath, destPath, destDir)
+            else:
+                for destPath, srcPath in project._runtimeDeps.items():
+                    self._add_runtime_dep(destPath, srcPath)
         self.add_cb_project_reference(project)
 
     def add_cb_project_reference(self, project):
+        # reference sets are closed, so a known project's references are known too
+        if project in self._cbProjectRefs:
+            return
         self._cbProjectRefs.add(project)
-        for ref in project._cbProjectRefs:
-            self._cbProjectRefs.add(ref)
+        self._cbProjectRefs.update(project._cbProjectRefs)
 
 
 class ToolChain(metaclass = ABCMeta):
     def __init__(self, name):
         self.name = name
+        # If True, rules derive per-edge file names from $in and $out, and edges only
+        # bind the variables that cannot be derived; set before emit_rules().
+        self.compactEdges = False
+        # If True, response file contents are stored in the manifest, and ninja writes
+        # each response file when its edge runs; see tc.emit_rsp_file().
+        self.rspInManifest = False
+        # If True, ninja moves the header dependencies of each compile into its deps
+        # log (.ninja_deps) after the compile, instead of re-reading every depfile on
+        # each build; set before emit_rules().
+        self.useDepsLog = False
+        # If True, rules run their python scripts through a runner process that stays
+        # alive between edges, which saves the script's imports and compilation on each
+        # edge; the runner starts on first use and exits when idle.  Requires Unix
+        # sockets and Python 3.9; elsewhere, or if the runner fails to start, the scripts
+        # run as usual.  Set before emit_rules().
+        self.useActionRunner = False
+        # If set, the python scripts append the tool output of each edge to the log
+        # store at this path, instead of writing a .log file next to the edge's output;
+        # see scripts/log_store.py and scripts/query-build-log.py.  Set before emit_rules().
+        self.logStorePath = None
 
     @abstractmethod
     def emit_rules(self, file):
         pass
 
+    def get_identity_paths(self):
+        """Returns the paths of the tool binaries, whose contents identify the toolchain.
+
+        Paths that do not exist are ignored.  A path without an extension also
+        matches the same path + '.exe'.
+        """
+        return []
+
+
+def _get_root_key(projName, variant):
+    return "%s %s" % (projName, variant)
+
+
+class ProjectFragment:
+    """The ninja records and side-effects of one project, as emitted by one generation process."""
+    def __init__(self):
+        self.records = []
+        self.makeFiles = []
+        self.runtimeDeps = {}
+        self.phonyTargets = []  # list of (name, path)
+        self.deployCalls = []   # list of (deployFiles, destDir, phonyTarget)
+        self.root = None        # the top-level request that emitted the project
+
 
 class ProjectMan:
     def __init__(self, ninjaFile, ninjaPath):
         self.ninjaFile = ninjaFile
         self.ninjaPath = ninjaPath
-        self._projects = {}
+        self._projects = {}         # map projName -> {variant -> project}
         self._toolchains = {}
         self._phonyTargets = {}
         self._ninjaVars = set()
+        self._scopeKeys = {}        # map project._ninjaScope -> (projName, variantName)
+
+        # per-project subninja support
+        self._subninjas = False
+        self._mainNinjaFile = ninjaFile
+        self._emitStack = []
+        self._projectDeps = {}      # map project -> set of projects it requested
+        self._subninjaStatePath = ninjaPath + ".subninja_state"
+        self._subninjaState = None
+        self._globalScripts = []
+        self._changedScripts = {}   # map script path -> bool, memoized mtime comparisons
+
+        # multi-process generation
+        self._partition = None      # (index, count) of this process, when generating with several processes
+        self._isWorker = False
+        self._merging = False
+        self._topLevelRequests = 0
+        self._fragments = {}        # map (projName, variantName) -> ProjectFragment
+        self._fragmentsPos = None   # index in ninjaFile.records where project fragments are merged
+        self._deferredEmits = []    # list of (index in ninjaFile.records, method, args)
+        self._extraRegenInputs = set()
+        self._globDirs = set()       # directories scanned by glob(), in this process
+        self._regenInputs = None     # set by emit_regenerator_target
+        self._identityPaths = None   # set by emit_rules
+
+        self.profiler = None         # a profiler.GenerationProfiler, when profiling
+        self.releaseTasks = False    # if True, tasks drop their options once emitted; see BuildTask
+        self._dirSnapshot = None
+
+        # If True, a compile whose command equals one emitted earlier, such as the
+        # same file in variants that only differ in axes the toolchain ignores, is
+        # not emitted again; its task uses the earlier object.  See tc.share_compile().
+        self.shareCompiles = False
+        self._sharedCompiles = {}   # map compile key -> outputPath of its first compile
+        self._sharedOutputs = {}    # map outputPath of each shared compile -> the object it uses
+        self._compileCount = 0
+
+        # If True, code generators (protoc, re2c, Qt uic and moc) write to a directory
+        # under built/shared/ keyed by their command instead of by the variant, and
+        # each output is generated once for all variants; see tc.share_generated_output().
+        self.shareGeneratedSources = False
+        self._generatedOutputs = {} # map shared outputPath -> command that generates it
+
+        # ninja pools, declared by emit_rules(); see add_pool()
+        self._pools = {}            # map pool name -> depth
+        self._rulesEmitted = False
+
+        # selective generation
+        self._selection = None      # (set of root keys, set of projNames, list of variant patterns)
+        self._currentRoot = None    # key of the top-level request being emitted
+        self._targetIndex = {}      # map project or phony target name -> set of root keys
 
         self._copyCommand = os.path.join(os.path.dirname(__file__), "scripts", "copy-file.py")
 
@@ -228,27 +606,401 @@ class ProjectMan:
     def _define_project_ninja_vars(self, project):
         ninjaFile = self.ninjaFile
         project._pdirName = type(project).__name__ + '_pdir'
-        if project._pdirName not in self._ninjaVars:
+        # variables defined in a subninja file are scoped to that file, and
+        # project fragments from several processes may be merged in any order
+        if self._subninjas or self._partition or project._pdirName not in self._ninjaVars:
             self._ninjaVars.add(project._pdirName)
-            ninjaFile.write('%s = %s\n' % (project._pdirName, project.projectDir))
+            ninjaFile.variable(project._pdirName, project.projectDir)
         project._bdirName = type(project).__name__ + str(project.variant)
-        ninjaFile.write('%s = %s\n' % (project._bdirName, project.builtDir))
+        ninjaFile.variable(project._bdirName, project.builtDir)
+        project._ninjaScope = (project.projectDir, '$' + project._pdirName, project.builtDir, '$' + project._bdirName)
+        self._scopeKeys[project._ninjaScope] = (type(project).__name__, str(project.variant))
 
     def get_project(self, projName, variant):
+        """Returns the project of projName and variant, emitting it on first use."""
         if not isinstance(variant, Variant):
             raise Exception("variant must be instanceof(Variant)")
-        variantName = str(variant)
+        if not self._emitStack:
+            self._begin_top_level_request(projName, variant)
+        return self._get_project(projName, variant)
+
+    def request_project(self, projName, variant):
+        """Like get_project(), but returns None if this process skips the request.
+
+        Use it for the top-level requests of a generate function: with selective
+        or multi-process generation, only some of them are emitted by each process.
+        Nested requests are never skipped.
+        """
+        if not isinstance(variant, Variant):
+            raise Exception("variant must be instanceof(Variant)")
+        if not self._emitStack:
+            if self._selection and not self._is_top_level_request_selected(projName, variant):
+                return None
+            if self._partition and not self._is_top_level_request_local():
+                return None
+            self._begin_top_level_request(projName, variant)
+        return self._get_project(projName, variant)
+
+    def _begin_top_level_request(self, projName, variant):
+        if self._partition and (self._fragmentsPos == None):
+            self._fragmentsPos = len(self.ninjaFile.records)
+        self._currentRoot = _get_root_key(projName, variant)
+
+    def _get_project(self, projName, variant):
         variants = self._projects.get(projName)
         if variants == None:
             variants = {}
             self._projects[projName] = variants
-        project = variants.get(variantName)
+        project = variants.get(variant)
         if project == None:
             project = projectFactory[projName](self, variant)
-            variants[variantName] = project
+            variants[variant] = project
+            self._add_to_target_index(projName)
+            self._projectDeps[project] = set()
+            if self._emitStack:
+                self._projectDeps[self._emitStack[-1]].add(project)
+            if self._subninjas:
+                self._emit_subninja_project(project)
+            elif self._partition:
+                self._emit_project_fragment(project)
+            else:
+                self._emit_project(project)
+        elif self._emitStack:
+            self._projectDeps[self._emitStack[-1]].add(project)
+        return project
+
+    def _emit_project(self, project):
+        profiler = self.profiler
+        self._emitStack.append(project)
+        if profiler:
+            profiler.project_start(project)
+        try:
             self._define_project_ninja_vars(project)
             project.emit()
-        return project
+        finally:
+            self._emitStack.pop()
+            if profiler:
+                profiler.project_end(project)
+
+    def glob(self, baseDir, patterns, excludes = ()):
+        """Returns (paths, dirs); see dir_snapshot.glob()."""
+        if self._dirSnapshot == None:
+            self._dirSnapshot = dir_snapshot.DirSnapshot(self.ninjaPath + ".dirs")
+        paths, dirs = dir_snapshot.glob(self._dirSnapshot, baseDir, patterns, excludes)
+        self._globDirs.update(dirs)
+        return paths, dirs
+
+    def get_shared_compile_output(self, key, outputPath):
+        """Returns the object of the first compile with key, recording outputPath's if it is the first."""
+        if self._subninjas or self._partition:
+            raise Exception("shareCompiles cannot be combined with subninjas or multi-process generation (jobs > 1)")
+        self._compileCount += 1
+        sharedPath = self._sharedCompiles.setdefault(key, outputPath)
+        if sharedPath != outputPath:
+            self._sharedOutputs[outputPath] = sharedPath
+        return sharedPath
+
+    def get_shared_compile_report(self):
+        """Returns a JSON-compatible summary of the compiles removed by shareCompiles."""
+        return {
+            "compiles" : self._compileCount,
+            "emitted" : self._compileCount - len(self._sharedOutputs),
+            "shared" : len(self._sharedOutputs),
+            "sharedOutputs" : self._sharedOutputs,
+        }
+
+    def get_shared_output_dir(self, toolName, key):
+        """Returns the variant-independent output directory of toolName, for the command identified by key."""
+        if self._subninjas or self._partition:
+            raise Exception("shareGeneratedSources cannot be combined with subninjas or multi-process generation (jobs > 1)")
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(root_paths.rootPaths.built, "shared", toolName, digest)
+
+    def claim_generated_output(self, outputPath, command):
+        """Returns True if the edge that generates shared outputPath must be emitted, and False if it already was."""
+        oldCommand = self._generatedOutputs.get(outputPath)
+        if oldCommand == None:
+            self._generatedOutputs[outputPath] = command
+            return True
+        if oldCommand != command:
+            raise Exception("conflicting commands generate shared output %s; options that differ between variants must be set in set_*_options()" % outputPath)
+        return False
+
+    def save_dir_snapshot(self):
+        if self._dirSnapshot and not self._isWorker:
+            self._dirSnapshot.save()
+
+    # Per-project subninja files.
+    #
+    # Each project instance is written to its own .ninja file, which the main
+    # build.ninja pulls in with a 'subninja' statement.  On regeneration, a project
+    # whose script and globbed directories, and those of its dependency projects,
+    # are unchanged still runs
+    # its emit() -- dependents read its linkLibraries, runtime deps, etc. -- but its
+    # ninja text is discarded and its existing subninja file and response files are
+    # left untouched.  Any change to a non-project script (remake.py, the repo
+    # package, pynja itself) regenerates every project.
+
+    def enable_subninjas(self):
+        self._subninjas = True
+        self._subninjaState = io.read_json_file(self._subninjaStatePath)
+        projectScripts = root_paths.get_project_scripts()
+        rootDir = os.path.dirname(self.ninjaPath)
+        self._globalScripts = [path for path in get_loaded_modules(rootDir) if path not in projectScripts]
+
+    def _is_script_changed(self, path):
+        changed = self._changedScripts.get(path)
+        if changed == None:
+            oldMTime = self._subninjaState["scripts"].get(path)
+            try:
+                changed = (os.stat(path).st_mtime_ns != oldMTime)
+            except OSError:
+                changed = True
+            self._changedScripts[path] = changed
+        return changed
+
+    def _can_reuse_subninja(self, project):
+        state = self._subninjaState
+        if not state:
+            return False
+        if not os.path.exists(project.subninjaPath):
+            return False
+        scripts = state["projects"].get(project.subninjaPath)
+        if scripts == None:
+            return False
+        if set(state["globals"]) != set(self._globalScripts):
+            return False
+        for path in state["globals"]:
+            if self._is_script_changed(path):
+                return False
+        for path in scripts:
+            if self._is_script_changed(path):
+                return False
+        return True
+
+    def _emit_subninja_project(self, project):
+        project.subninjaPath = os.path.join(project.builtDir, type(project).__name__ + ".ninja")
+        project._subninjaReused = self._can_reuse_subninja(project)
+        if project._subninjaReused:
+            projectFile = ninja_writer.NullNinjaWriter()
+        else:
+            projectFile = ninja_writer.NinjaWriter()
+
+        oldNinjaFile = self.ninjaFile
+        self._mainNinjaFile.subninja(project.subninjaPath)
+        self.ninjaFile = projectFile
+        try:
+            self._emit_project(project)
+        finally:
+            self.ninjaFile = oldNinjaFile
+
+        if not project._subninjaReused:
+            projectFile.write_file(project.subninjaPath)
+        project.makeFiles.append(project.subninjaPath)
+
+    def _get_project_scripts_closure(self, project, memo):
+        scripts = memo.get(project)
+        if scripts == None:
+            scripts = set()
+            memo[project] = scripts # guards against dependency cycles
+            script = root_paths.get_project_script(type(project).__name__)
+            if script:
+                scripts.add(script)
+            scripts.update(project._globDirs)
+            for dep in self._projectDeps[project]:
+                scripts.update(self._get_project_scripts_closure(dep, memo))
+        return scripts
+
+    def save_subninja_state(self):
+        if not self._subninjas:
+            return
+        memo = {}
+        allScripts = set(self._globalScripts)
+        projectsState = {}
+        for project in self.get_project_list():
+            scripts = self._get_project_scripts_closure(project, memo)
+            projectsState[project.subninjaPath] = sorted(scripts)
+            allScripts.update(scripts)
+        scriptsState = {}
+        for path in sorted(allScripts):
+            try:
+                scriptsState[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+        state = {
+            "globals" : sorted(self._globalScripts),
+            "scripts" : scriptsState,
+            "projects" : projectsState,
+        }
+        io.write_json_file(self._subninjaStatePath, state)
+
+    # Selective generation.
+    #
+    # Only top-level request_project() calls that are selected are emitted; the
+    # rest return None.  Top-level get_project() calls are always emitted.  A request is selected by naming it (projName), or by
+    # naming any project or phony target that a previous full generation emitted
+    # under it; the target index records that mapping as root keys, which are
+    # "projName variant" strings.  Variant patterns are fnmatch patterns matched
+    # against str(variant) of top-level requests.
+
+    def set_selection(self, roots, projNames, variantPatterns):
+        self._selection = (set(roots), set(projNames), list(variantPatterns))
+
+    def _is_top_level_request_selected(self, projName, variant):
+        roots, projNames, variantPatterns = self._selection
+        if roots or projNames:
+            if not ((projName in projNames) or (_get_root_key(projName, variant) in roots)):
+                return False
+        if variantPatterns:
+            variantName = str(variant)
+            for pattern in variantPatterns:
+                if fnmatch.fnmatchcase(variantName, pattern):
+                    return True
+            return False
+        return True
+
+    def _add_to_target_index(self, name, root = None):
+        root = root or self._currentRoot
+        if not root:
+            return
+        roots = self._targetIndex.get(name)
+        if roots == None:
+            roots = set()
+            self._targetIndex[name] = roots
+        roots.add(root)
+
+    def get_target_index(self):
+        """Returns a map of each project and phony target name -> sorted list of root keys."""
+        return dict([(name, sorted(roots)) for name, roots in self._targetIndex.items()])
+
+    # Multi-process generation.
+    #
+    # Every process runs the same generate function.  Top-level request_project()
+    # calls are dealt round-robin to the processes; a process returns None for
+    # requests that belong to another process, and emits its own requests (and
+    # their dependencies) into one ProjectFragment per project.  Workers pickle
+    # their fragments for the parent process, which merges them: a project emitted
+    # by several processes is kept once, its runtime deps must agree, and its
+    # phony targets and deploy requests are replayed so that deploy conflicts are
+    # still detected.  emit_deploy_targets(), emit_phony_targets() and
+    # emit_regenerator_target() are deferred in the parent until the merge, and
+    # are no-ops in workers.
+
+    def set_partition(self, index, count, isWorker):
+        self._partition = (index, count)
+        self._isWorker = isWorker
+
+    def _is_top_level_request_local(self):
+        requestIndex = self._topLevelRequests
+        self._topLevelRequests += 1
+        return (requestIndex % self._partition[1]) == self._partition[0]
+
+    def _get_current_fragment(self):
+        if not (self._partition and self._emitStack):
+            return None
+        project = self._emitStack[-1]
+        return self._fragments[(type(project).__name__, str(project.variant))]
+
+    def _emit_project_fragment(self, project):
+        fragment = ProjectFragment()
+        fragment.root = self._currentRoot
+        self._fragments[(type(project).__name__, str(project.variant))] = fragment
+
+        oldNinjaFile = self.ninjaFile
+        self.ninjaFile = ninja_writer.NinjaWriter()
+        try:
+            self._emit_project(project)
+        finally:
+            fragment.records = self.ninjaFile.records
+            self.ninjaFile = oldNinjaFile
+        fragment.makeFiles = project.makeFiles
+        fragment.runtimeDeps = project._runtimeDeps
+
+    def _defer_emit(self, method, *args):
+        """Returns True if a finalizing emit must not run now."""
+        if not self._partition or self._merging:
+            return False
+        if not self._isWorker:
+            self._deferredEmits.append((len(self.ninjaFile.records), method, args))
+        return True
+
+    def save_partition(self, path):
+        rootDir = os.path.dirname(self.ninjaPath)
+        with open(path, "wb") as file:
+            pickle.dump((self._fragments, get_loaded_modules(rootDir) + sorted(self._globDirs)), file, pickle.HIGHEST_PROTOCOL)
+
+    def merge_partition(self, path):
+        with open(path, "rb") as file:
+            fragments, regenInputs = pickle.load(file)
+        self._extraRegenInputs.update(regenInputs)
+        for key, fragment in sorted(fragments.items()):
+            current = self._fragments.get(key)
+            if current:
+                if current.runtimeDeps != fragment.runtimeDeps:
+                    raise Exception("Conflicting runtime dependencies between generation processes for project %s, variant %s" % key)
+                continue
+            self._fragments[key] = fragment
+            self._add_to_target_index(key[0], fragment.root)
+            for name, path in fragment.phonyTargets:
+                self._add_to_target_index(name, fragment.root)
+                self.add_phony_target(name, path)
+            for deployFiles, destDir, phonyTarget in fragment.deployCalls:
+                self.deploy(deployFiles, destDir, phonyTarget)
+
+    def finish_partitions(self):
+        """Assembles the merged manifest, and runs the deferred emits."""
+        mainRecords = self.ninjaFile.records
+        inserts = list(self._deferredEmits)
+        if self._fragmentsPos != None:
+            inserts.append((self._fragmentsPos, None, ()))
+        inserts.sort(key = lambda insert: insert[0])
+
+        self.ninjaFile = ninja_writer.NinjaWriter()
+        self._merging = True
+        prevPos = 0
+        for pos, method, args in inserts:
+            self.ninjaFile.extend(mainRecords[prevPos:pos])
+            prevPos = pos
+            if method:
+                method(*args)
+            else:
+                for key, fragment in sorted(self._fragments.items()):
+                    self.ninjaFile.extend(fragment.records)
+        self.ninjaFile.extend(mainRecords[prevPos:])
+        self._merging = False
+
+    def get_regenerator_inputs(self):
+        """Returns the paths whose modification triggers regeneration."""
+        if self._regenInputs != None:
+            return self._regenInputs
+        return get_loaded_modules(os.getcwd())
+
+    def get_generated_files(self):
+        """Returns the paths written by generation: the manifest, and all makeFiles."""
+        return [self.ninjaPath] + self._get_make_files()
+
+    def _get_make_files(self):
+        makeFiles = []
+        if self._partition:
+            for key, fragment in sorted(self._fragments.items()):
+                makeFiles.extend(fragment.makeFiles)
+        else:
+            for project in self.get_project_list():
+                makeFiles.extend(project.makeFiles)
+        return makeFiles
+
+    def get_build_graph(self):
+        """Returns a build_graph.BuildGraph of everything emitted so far."""
+        if self._subninjas:
+            raise Exception("the build graph is not available with subninjas, since reused subninja files are not re-emitted")
+        scopeKeys = dict(self._scopeKeys)
+        for key, fragment in self._fragments.items():
+            for record in fragment.records:
+                if record[0] == ninja_writer.BUILD and record[1][0]:
+                    scopeKeys[record[1]] = key
+        graph = build_graph.BuildGraph()
+        graph.add_records(self.ninjaFile.records, scopeKeys)
+        return graph
 
     def get_first_project(self, projName):
         variants = self._projects.get(projName)
@@ -259,81 +1011,115 @@ class ProjectMan:
     def add_toolchain(self, toolchain):
         if self._toolchains.get(toolchain.name):
             raise NameError("toolchain %s already defined" % toolchain.name)
+        if self.profiler:
+            self.profiler.instrument_toolchain(toolchain)
         self._toolchains[toolchain.name] = toolchain
 
     def get_toolchain(self, toolchainName):
         return self._toolchains.get(toolchainName)
 
     def add_phony_target(self, name, path):
+        if self._emitStack:
+            self._add_to_target_index(name)
+        fragment = self._get_current_fragment()
+        if fragment:
+            fragment.phonyTargets.append((name, path))
         refs = self._phonyTargets.get(name)
         if refs == None:
             refs = []
             self._phonyTargets[name] = refs
         refs.append(path)
 
+    def add_pool(self, name, depth):
+        """Declares a ninja pool; call before emit_rules().
+
+        Toolchains put their edges in a default pool, such as "link", only if a
+        pool of that name was added.  A task's pool attribute overrides the default.
+        Adding "console" enables ninja's built-in console pool as a default.
+        """
+        if self._rulesEmitted:
+            raise Exception("pool %s must be added before emit_rules()" % name)
+        self._pools[name] = max(int(depth), 1)
+
+    def add_default_pools(self, cores = None, memory = None, linkMemory = 2 * pools.GB, ltoLinkMemory = 8 * pools.GB, javacMemory = 1 * pools.GB):
+        """Adds the pools that the toolchains use by default, sized by pools.calc_pool_depth().
+
+            link     -- links and shared library links
+            lto-link -- links with link-time optimization
+            javac    -- java compiles
+            console  -- custom commands, which then run one at a time with ninja's console
+        """
+        self.add_pool("link", pools.calc_pool_depth(linkMemory, cores, memory))
+        self.add_pool("lto-link", pools.calc_pool_depth(ltoLinkMemory, cores, memory))
+        self.add_pool("javac", pools.calc_pool_depth(javacMemory, cores, memory))
+        self.add_pool("console", 1)
+
+    def get_pool(self, pool, defaultPool = None):
+        """Returns pool if it is set, else defaultPool if it was added, else None."""
+        if pool:
+            if (pool not in self._pools) and (pool != "console"):
+                raise Exception("pool %s was not added; see ProjectMan.add_pool()" % pool)
+            return pool
+        if defaultPool in self._pools:
+            return defaultPool
+        return None
+
     def emit_rules(self):
         ninjaFile = self.ninjaFile
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# CUSTOM_COMMAND\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule CUSTOM_COMMAND\n")
-        ninjaFile.write("  command = $COMMAND\n")
-        ninjaFile.write("  description = $DESC\n")
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
-
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# File copy\n")
-        ninjaFile.write("rule FILE_COPY\n")
-        ninjaFile.write("  command = python %s \"$in\" \"$out\" \n" % self._copyCommand)
-        ninjaFile.write("  description = Copy $in -> $out.\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("\n")
+        self._rulesEmitted = True
+        if self._pools:
+            ninjaFile.banner("Pools")
+            for name, depth in sorted(self._pools.items()):
+                if name != "console":  # built into ninja
+                    ninjaFile.pool(name, depth)
+        ninjaFile.banner("CUSTOM_COMMAND")
+        ninjaFile.rule("CUSTOM_COMMAND", (
+            ("command", "$COMMAND"),
+            ("description", "$DESC"),
+            ("restat", "1"),
+        ))
+
+        ninjaFile.banner("File copy")
+        ninjaFile.rule("FILE_COPY", (
+            ("command", "python %s \"$in\" \"$out\" " % self._copyCommand),
+            ("description", "Copy $in -> $out."),
+        ))
+        ninjaFile.newline()
 
         for toolchainName, toolchain in sorted(self._toolchains.items()):
             toolchain.emit_rules(self.ninjaFile)
 
-    def emit_custom_command(self, command, desc = None, inputs = [], outputs = []):
-        ninjaFile = self.ninjaFile
-        ninjaFile.write("build $\n")
-        for output in outputs:
-            outputEsc = ninja_esc_path(output)
-            ninjaFile.write("    %s $\n" % outputEsc)
-        ninjaFile.write("  : CUSTOM_COMMAND")
-        for input in inputs:
-            inputEsc = ninja_esc_path(input)
-            ninjaFile.write(" $\n    %s" % inputEsc)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  COMMAND = %s\n" % command)
-        ninjaFile.write("  DESC = %s\n" % desc)
+        # The stamp is written before any project emits its make files, so that
+        # it is not newer than the outputs of the regenerator; write_stamp() only
+        # touches it when a hash changed.
+        if not self._isWorker:
+            self._identityPaths = self.get_identity_paths()
+            identity_stamp.write_stamp(self.ninjaPath + ".identity", self._identityPaths)
 
-    def emit_copy(self, origPath, destPath, phonyTarget = None):
-        ninjaFile = self.ninjaFile
-        origPathEsc = ninja_esc_path(origPath)
-        destPathEsc = ninja_esc_path(destPath)
-        scriptPathEsc = ninja_esc_path(self._copyCommand)
+    def emit_custom_command(self, command, desc = None, inputs = [], outputs = [], pool = None):
+        variables = (("COMMAND", command), ("DESC", desc))
+        pool = self.get_pool(pool, "console")
+        if pool:
+            variables += (("pool", pool),)
+        self.ninjaFile.build(None, outputs, "CUSTOM_COMMAND", inputs, variables = variables)
 
-        ninjaFile.write("build %s : FILE_COPY %s | %s\n" % (destPathEsc, origPathEsc, scriptPathEsc))
+    def emit_copy(self, origPath, destPath, phonyTarget = None):
+        self.ninjaFile.build(None, (destPath,), "FILE_COPY", (origPath,), (self._copyCommand,))
         if phonyTarget:
             self.add_phony_target(phonyTarget, destPath)
 
     def emit_phony_targets(self):
+        if self._defer_emit(self.emit_phony_targets):
+            return
         ninjaFile = self.ninjaFile
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# phony targets\n")
-        ninjaFile.write("\n")
+        ninjaFile.banner("phony targets")
         for name, targets in sorted(self._phonyTargets.items()):
-            nameEsc = ninja_esc_path(name)
-            ninjaFile.write("build %s : phony" % nameEsc)
-            for target in targets:
-                targetEsc = ninja_esc_path(target)
-                ninjaFile.write(" ");
-                ninjaFile.write(targetEsc)
-            ninjaFile.write("\n")
-        ninjaFile.write("\n")
+            ninjaFile.build(None, (name,), "phony", targets)
+        ninjaFile.newline()
 
     def emit_deploy_targets(self):
+        if self._defer_emit(self.emit_deploy_targets):
+            return
         for destPath, srcInfo in self._deployFiles.items():
             srcPath, phonyTarget = srcInfo
             self.emit_copy(srcPath, destPath, phonyTarget)
@@ -345,52 +1131,73 @@ class ProjectMan:
                 projects.append(project)
         return projects
 
+    def get_identity_paths(self):
+        """Returns the existing interpreter and toolchain binaries, sorted."""
+        paths = set([os.path.realpath(sys.executable)])
+        if sysconfig.get_config_var("Py_ENABLE_SHARED"):
+            paths.add(os.path.join(sysconfig.get_config_var("LIBDIR"), sysconfig.get_config_var("LDLIBRARY")))
+        for toolchain in self._toolchains.values():
+            for path in toolchain.get_identity_paths():
+                if not os.path.splitext(path)[1] and not os.path.isfile(path):
+                    path += ".exe"
+                paths.add(path)
+        return sorted([path for path in paths if os.path.isfile(path)])
+
     def emit_regenerator_target(self, remakeScriptPath):
+        if self._defer_emit(self.emit_regenerator_target, remakeScriptPath):
+            return
         ninjaFile = self.ninjaFile
         ninjaPath = self.ninjaPath
-        remakeScriptPathEsc = ninja_esc_path(remakeScriptPath)
-        projects = self.get_project_list()
         rootDir = os.path.dirname(remakeScriptPath)
 
-        ninjaFile.write("#############################################\n");
-        ninjaFile.write("# Remake build.ninja if any python sources changed.\n");
-        ninjaFile.write("rule REGENERATE\n");
-        ninjaFile.write("  command = python \"%s\"\n" % remakeScriptPath);
-        ninjaFile.write("  description = Running remake script.\n");
-        ninjaFile.write("  generator = 1\n");
-        ninjaFile.write("  restat = 1\n");
-        ninjaFile.write("\n");
-
-        buildInputs = set()
-        loadedModules = get_loaded_modules(rootDir)
-        for path in sorted(loadedModules):
-            buildInputs.add(ninja_esc_path(path))
-        buildInputs.add(remakeScriptPathEsc)
+        # The identity stamp hashes the interpreter and toolchain binaries.  Its
+        # edge only runs when one of them is modified, and only touches the stamp
+        # (and so the regenerator) when a hash changed.  emit_rules() writes it.
+        identityPaths = self._identityPaths
+        stampPath = ninjaPath + ".identity"
+        if identityPaths == None:
+            identityPaths = self.get_identity_paths()
+            identity_stamp.write_stamp(stampPath, identityPaths)
+        ninjaFile.banner("Track the identity of the interpreter and toolchains.")
+        ninjaFile.rule("IDENTITY_STAMP", (
+            ("command", "python \"%s\" \"$out\" $in" % identity_stamp.__file__),
+            ("description", "Hashing interpreter and toolchain binaries."),
+            ("generator", "1"),
+            ("restat", "1"),
+        ))
+        ninjaFile.build(None, [stampPath], "IDENTITY_STAMP", identityPaths)
+
+        ninjaFile.banner("Remake build.ninja if any python sources changed.")
+        ninjaFile.rule("REGENERATE", (
+            ("command", "python \"%s\"" % remakeScriptPath),
+            ("description", "Running remake script."),
+            ("generator", "1"),
+            ("restat", "1"),
+        ))
+
+        # sorted, so that the manifest does not depend on string hashing
+        buildInputs = set(get_loaded_modules(rootDir))
+        buildInputs.add(remakeScriptPath)
+        buildInputs.update(self._extraRegenInputs)
+        buildInputs.update(self._globDirs)
+        buildInputs = sorted(buildInputs)
+        self._regenInputs = buildInputs + [stampPath]
 
         # NOTE: Use of basename() is a work-around for a bug in ninja.
         #   If you emit an absolute path here, the generator does not gain priority over missing source files.
-        ninjaFile.write("build %s $\n" % os.path.basename(ninjaPath))
-        for project in projects:
-            for path in project.makeFiles:
-                pathEsc = ninja_esc_path(path)
-                ninjaFile.write("    %s $\n" % pathEsc)
-        ninjaFile.write("  : REGENERATE |$\n")
-        for pathEsc in buildInputs:
-            ninjaFile.write("    %s $\n" % pathEsc)
-        loadedModules = get_loaded_modules(rootDir)
-        ninjaFile.write("\n");
+        outputs = [os.path.basename(ninjaPath)]
+        outputs.extend(self._get_make_files())
+        ninjaFile.build(None, outputs, "REGENERATE", implicit = buildInputs + [stampPath])
 
         # If a user removes a project, we don't want to trigger a 'missing input' error.
         # Marking all buildInputs as being output from a phony build rule accomplishes this.
         # https://groups.google.com/forum/#!topic/ninja-build/aXkhxZ_oXcw
-        ninjaFile.write("build $\n")
-        for pathEsc in buildInputs:
-            ninjaFile.write("    %s $\n" % pathEsc)
-        ninjaFile.write("  : phony $\n")
-
-        ninjaFile.write("\n");
+        ninjaFile.build(None, buildInputs + identityPaths, "phony")
 
     def deploy(self, deployFiles, destDir = None, phonyTarget = None):
+        fragment = self._get_current_fragment()
+        if fragment:
+            fragment.deployCalls.append((dict(deployFiles), destDir, phonyTarget))
         if destDir:
             destDir = os.path.normpath(destDir)
             if not os.path.isabs(destDir):
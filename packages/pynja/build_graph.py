@@ -0,0 +1,178 @@
+import os
+import pickle
+import collections
+from . import io
+from .ninja_writer import BUILD
+
+
+class BuildEdge:
+    """One build statement.  Paths are absolute, except for phony target names."""
+    __slots__ = ("rule", "outputs", "implicitOutputs", "inputs", "implicit", "orderOnly", "projName", "variantName")
+
+    def __init__(self, record, key):
+        _, _, self.outputs, self.implicitOutputs, self.rule, self.inputs, self.implicit, self.orderOnly, _ = record
+        self.projName, self.variantName = key
+
+    def get_outputs(self):
+        return self.outputs + self.implicitOutputs
+
+    def get_inputs(self):
+        """Returns the inputs whose modification makes the edge re-run (explicit and implicit)."""
+        return self.inputs + self.implicit
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.rule, " ".join(self.outputs))
+
+
+_NO_PROJECT = (None, None)
+
+
+class BuildGraph:
+    """The build edges of a generation run, indexed for queries.
+
+    Edges are indexed by output path, input path, phony target, project and
+    variant.  Edges emitted outside of a project (deploy copies, phony targets,
+    the regenerator, and custom commands) have projName == variantName == None.
+    Header dependencies discovered through depfiles are not known at generation
+    time, and so are not part of the graph.
+    """
+
+    def __init__(self):
+        self.edges = []
+        self._init_indices()
+
+    def _init_indices(self):
+        self._producers = {}        # map output -> edge
+        self._consumers = {}        # map input -> list of edges, for all input kinds
+        self._duplicates = {}       # map output -> list of edges, for outputs of several edges
+        self._phonyTargets = {}     # map phony target name -> edge
+        self._projects = {}         # map projName -> list of edges
+        self._variants = {}         # map variantName -> list of edges
+
+    def __getstate__(self):
+        return (self.edges,)
+
+    def __setstate__(self, state):
+        edges, = state
+        self.edges = []
+        self._init_indices()
+        for edge in edges:
+            self._add_edge(edge)
+
+    def add_records(self, records, scopeKeys):
+        """Adds the BUILD records of a NinjaWriter.
+
+        Args:
+            scopeKeys -- map of project._ninjaScope -> (projName, variantName)
+        """
+        for record in records:
+            if record[0] == BUILD:
+                self._add_edge(BuildEdge(record, scopeKeys.get(record[1], _NO_PROJECT)))
+
+    def _add_edge(self, edge):
+        self.edges.append(edge)
+        for output in edge.outputs + edge.implicitOutputs:
+            other = self._producers.get(output)
+            if other:
+                duplicates = self._duplicates.get(output)
+                if duplicates == None:
+                    duplicates = [other]
+                    self._duplicates[output] = duplicates
+                duplicates.append(edge)
+            else:
+                self._producers[output] = edge
+        for input in edge.inputs + edge.implicit + edge.orderOnly:
+            consumers = self._consumers.get(input)
+            if consumers == None:
+                consumers = []
+                self._consumers[input] = consumers
+            consumers.append(edge)
+        if edge.rule == "phony":
+            for output in edge.outputs:
+                if not os.path.isabs(output):
+                    self._phonyTargets[output] = edge
+        if edge.projName:
+            self._projects.setdefault(edge.projName, []).append(edge)
+            self._variants.setdefault(edge.variantName, []).append(edge)
+
+    def get_producer(self, path):
+        """Returns the edge that outputs path, or None for source files."""
+        return self._producers.get(path)
+
+    def get_consumers(self, path):
+        """Returns the edges that have path as any kind of input."""
+        return list(self._consumers.get(path, ()))
+
+    def get_phony_target(self, name):
+        return self._phonyTargets.get(name)
+
+    def get_phony_target_names(self):
+        return sorted(self._phonyTargets.keys())
+
+    def get_edges(self, projName = None, variantName = None):
+        """Returns the edges of a project, a variant, or a project variant."""
+        if projName:
+            edges = self._projects.get(projName, [])
+            if variantName:
+                edges = [edge for edge in edges if edge.variantName == variantName]
+            return list(edges)
+        if variantName:
+            return list(self._variants.get(variantName, []))
+        return list(self.edges)
+
+    def get_duplicate_outputs(self):
+        """Returns a map of each output produced by more than one edge -> those edges."""
+        return dict([(output, list(edges)) for output, edges in self._duplicates.items()])
+
+    def _walk_consumers(self, paths, includeOrderOnly):
+        visited = set()
+        outputs = set()
+        pending = collections.deque(paths)
+        while pending:
+            path = pending.popleft()
+            for edge in self._consumers.get(path, ()):
+                if id(edge) in visited:
+                    continue
+                if not includeOrderOnly and path not in edge.inputs and path not in edge.implicit:
+                    continue
+                visited.add(id(edge))
+                for output in edge.outputs + edge.implicitOutputs:
+                    if output not in outputs:
+                        outputs.add(output)
+                        pending.append(output)
+        return outputs
+
+    def get_rdeps(self, path):
+        """Returns every output that transitively depends on path, including through order-only deps."""
+        return self._walk_consumers((path,), True)
+
+    def get_affected(self, paths):
+        """Returns every output that rebuilds if any of paths changes.
+
+        Order-only dependencies are not followed, since they do not cause rebuilds.
+        Phony targets are included by name.
+        """
+        return self._walk_consumers(paths, False)
+
+    def get_deps(self, path):
+        """Returns every input that path transitively depends on."""
+        deps = set()
+        pending = collections.deque((path,))
+        while pending:
+            edge = self._producers.get(pending.popleft())
+            if not edge:
+                continue
+            for input in edge.inputs + edge.implicit + edge.orderOnly:
+                if input not in deps:
+                    deps.add(input)
+                    pending.append(input)
+        return deps
+
+    def save(self, filePath):
+        """Writes the graph to filePath, unless the file already has identical contents."""
+        return io.write_chunks_if_different(filePath, [pickle.dumps(self, pickle.HIGHEST_PROTOCOL)])
+
+
+def load(filePath):
+    with open(filePath, "rb") as file:
+        return pickle.load(file)
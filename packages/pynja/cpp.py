@@ -1,10 +1,38 @@
 import os
 from abc import *
 from . import build
+from .option_list import OptionList
+from .transitive import TransitiveList
 import pynja.tc
 
 
+class MsvcCppOptions:
+    __slots__ = ("dynamicCRT", "asyncExceptionHandling", "externCNoThrow")
+
+    def __init__(self):
+        self.dynamicCRT = True
+        self.asyncExceptionHandling = False
+        self.externCNoThrow = True
+
+
+class NvccCppOptions:
+    __slots__ = ("relocatableDeviceCode", "deviceDebugLevel")
+
+    def __init__(self):
+        self.relocatableDeviceCode = True
+        self.deviceDebugLevel = 1 # {0 = none, 1 = lineinfo, 2 = full [disables optimization]}
+
+
 class CppTask(build.BuildTask):
+    __slots__ = (
+        "sourcePath", "outputPath", "workingDir",
+        "extraOptions", "optLevel", "debugLevel", "warnLevel", "warningsAsErrors",
+        "includePaths", "defines", "createPCH", "usePCH",
+        "addressModel", "std", "lto",
+        "_msvcOptions", "_nvccOptions", "_creatingPDB",
+    )
+    _resultSlots = ("sourcePath", "outputPath", "createPCH", "usePCH")
+
     def __init__(self, project, sourcePath, outputPath, workingDir):
         super().__init__(project)
         self.sourcePath = sourcePath
@@ -16,24 +44,27 @@ class CppTask(build.BuildTask):
         self.debugLevel = 2
         self.warnLevel = 3
         self.warningsAsErrors = False
-        self.includePaths = []
-        self.defines = []
+        self.includePaths = OptionList()
+        self.defines = OptionList()
         self.createPCH = False
         self.usePCH = None # point this at a PCH file
         # gcc-specific
         self.addressModel = None # = {"-m32", "-m64"}
         self.std = None # see option -std within "C Dialect Options"
         self.lto = None
-        # msvc-specific
-        self.dynamicCRT = True
-        self.asyncExceptionHandling = False
-        self.externCNoThrow = True
-        # nvcc-specific
-        self.relocatableDeviceCode = True
-        self.deviceDebugLevel = 1 # {0 = none, 1 = lineinfo, 2 = full [disables optimization]}
+        # msvc-specific and nvcc-specific options are created on first assignment
+        self._msvcOptions = None
+        self._nvccOptions = None
 
         # internal state tracking
         self._creatingPDB = False
+        self.extraDeps = OptionList()
+
+    dynamicCRT              = build.option_block_property("_msvcOptions", MsvcCppOptions, "dynamicCRT")
+    asyncExceptionHandling  = build.option_block_property("_msvcOptions", MsvcCppOptions, "asyncExceptionHandling")
+    externCNoThrow          = build.option_block_property("_msvcOptions", MsvcCppOptions, "externCNoThrow")
+    relocatableDeviceCode   = build.option_block_property("_nvccOptions", NvccCppOptions, "relocatableDeviceCode")
+    deviceDebugLevel        = build.option_block_property("_nvccOptions", NvccCppOptions, "deviceDebugLevel")
 
     def emit(self):
         project = self.project
@@ -49,6 +80,8 @@ class CppTask(build.BuildTask):
 # Toolchains must also detect when the 'usePCH' attribute points at a header
 # and handle it specially.
 class DummyPchTask(CppTask):
+    __slots__ = ()
+
     def __init__(self, project, sourcePath, workingDir):
         super().__init__(project, sourcePath, sourcePath, workingDir)
 
@@ -58,6 +91,9 @@ class DummyPchTask(CppTask):
 
 
 class StaticLibTask(build.BuildTask):
+    __slots__ = ("outputPath", "workingDir", "inputs")
+    _resultSlots = ("outputPath",)
+
     def __init__(self, project, outputPath, workingDir):
         super().__init__(project)
         self.outputPath = outputPath
@@ -74,6 +110,12 @@ class StaticLibTask(build.BuildTask):
 
 
 class LinkTask(build.BuildTask):
+    __slots__ = (
+        "extraOptions", "outputPath", "outputLibraryPath", "workingDir", "makeExecutable",
+        "inputs", "keepDebugInfo", "addressModel", "lto", "noUndefined",
+    )
+    _resultSlots = ("outputPath", "outputLibraryPath", "makeExecutable")
+
     def __init__(self, project, outputPath, workingDir):
         super().__init__(project)
         self.extraOptions = []
@@ -109,11 +151,11 @@ class CppProject(build.Project):
         super().__init__(projectMan, variant)
         self.outputPath = None
         self.toolchain = self.get_toolchain()
-        self.defines = []           # project-level defines affect all compilations; tasks that use preprocessor may also consume this
-        self.includePaths = []      # ""
-        self.linkLibraries = []
+        self.defines = OptionList()         # project-level defines affect all compilations; tasks that use preprocessor may also consume this
+        self.includePaths = OptionList()    # ""
+        self.linkLibraries = TransitiveList()   # this project's library, followed by the libraries it must be linked with
         self._inputs = []
-        self._inputLibs = []
+        self._inputLibs = TransitiveList()
 
         # for situations where we want to aggregate implicit dependencies for cpp_compiles
         self._forcedDeps = set()
@@ -136,6 +178,7 @@ class CppProject(build.Project):
         self._inputLibs.extend(filePaths)
 
     def add_lib_dependency(self, project):
+        # references project.linkLibraries, which is flattened and deduplicated once
         self._inputLibs.extend(project.linkLibraries)
         self.add_runtime_dependency_project(project)
         self.add_cb_project_reference(project)
@@ -209,6 +252,13 @@ class CppProject(build.Project):
             tasks = pynja.BuildTasks(taskList)
             return tasks
 
+    def cpp_compile_glob(self, patterns, excludes = ()):
+        """Compiles the files that match patterns; see Project.glob()."""
+        return self.cpp_compile(self.glob(patterns, excludes))
+
+    def cpp_compile_glob_ex(self, patterns, excludes = ()):
+        return self.cpp_compile_ex(self.glob(patterns, excludes))
+
     def set_cpp_compile_options(self, task):
         """Can be overridden to apply common compiler options to CppTask created by cpp_compile*."""
         self.set_include_paths_and_defines(task)
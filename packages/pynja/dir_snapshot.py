@@ -0,0 +1,127 @@
+import os
+import fnmatch
+from . import io
+
+
+################################################################################
+#   Directory snapshot
+#
+#   Caches directory listings between generation runs, keyed by directory path,
+#   as [mtime_ns, fileNames, subdirNames].  Creating, deleting or renaming an
+#   entry updates the mtime of its directory, so a listing is reused as long as
+#   the directory's mtime is unchanged, and only changed directories are
+#   rescanned.  Only the listings used by the current run are saved.
+
+class DirSnapshot:
+    def __init__(self, filePath):
+        self.filePath = filePath
+        self._oldListings = io.read_json_file(filePath) or {}
+        self._listings = {}     # the listings used by this run
+
+    def listdir(self, dirPath):
+        """Returns (fileNames, subdirNames), both sorted; both are empty if dirPath is not a directory."""
+        listing = self._listings.get(dirPath)
+        if listing == None:
+            try:
+                mtime = os.stat(dirPath).st_mtime_ns
+            except OSError:
+                mtime = None
+            listing = self._oldListings.get(dirPath)
+            if (listing == None) or (mtime == None) or (listing[0] != mtime):
+                listing = [mtime] + _scan_dir(dirPath)
+            self._listings[dirPath] = listing
+        return listing[1], listing[2]
+
+    def exists(self, dirPath):
+        self.listdir(dirPath)
+        return self._listings[dirPath][0] != None
+
+    def save(self):
+        listings = dict([(dirPath, listing) for dirPath, listing in self._listings.items() if listing[0] != None])
+        io.write_json_file(self.filePath, listings)
+
+
+def _scan_dir(dirPath):
+    fileNames = []
+    subdirNames = []
+    try:
+        with os.scandir(dirPath) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirNames.append(entry.name)
+                else:
+                    fileNames.append(entry.name)
+    except OSError:
+        pass
+    return [sorted(fileNames), sorted(subdirNames)]
+
+
+def _filter_names(names, part):
+    # as with the glob module, wildcards do not match names that start with a dot
+    if not part.startswith("."):
+        names = [name for name in names if not name.startswith(".")]
+    return fnmatch.filter(names, part)
+
+
+def _has_magic(part):
+    return ("*" in part) or ("?" in part) or ("[" in part)
+
+
+def _glob_dir(snapshot, dirPath, relDir, parts, matches, scannedDirs):
+    part = parts[0]
+    rest = parts[1:]
+    if part == "**":
+        if rest:
+            _glob_dir(snapshot, dirPath, relDir, rest, matches, scannedDirs)
+        fileNames, subdirNames = snapshot.listdir(dirPath)
+        scannedDirs.add(dirPath)
+        for name in _filter_names(subdirNames, "*"):
+            _glob_dir(snapshot, os.path.join(dirPath, name), relDir + name + "/", parts, matches, scannedDirs)
+    elif rest and _has_magic(part):
+        fileNames, subdirNames = snapshot.listdir(dirPath)
+        scannedDirs.add(dirPath)
+        for name in _filter_names(subdirNames, part):
+            _glob_dir(snapshot, os.path.join(dirPath, name), relDir + name + "/", rest, matches, scannedDirs)
+    elif rest:
+        # a literal directory name does not need a listing
+        _glob_dir(snapshot, os.path.join(dirPath, part), relDir + part + "/", rest, matches, scannedDirs)
+    else:
+        fileNames, subdirNames = snapshot.listdir(dirPath)
+        scannedDirs.add(dirPath)
+        for name in _filter_names(fileNames, part):
+            matches.add(relDir + name)
+
+
+def _get_dependency_dir(snapshot, dirPath):
+    # a missing directory is replaced by its closest existing ancestor, whose
+    # mtime changes when the next directory down the path is created
+    while not snapshot.exists(dirPath):
+        parentPath = os.path.dirname(dirPath)
+        if parentPath == dirPath:
+            break
+        dirPath = parentPath
+    return dirPath
+
+
+def glob(snapshot, baseDir, patterns, excludes = ()):
+    """Returns (paths, dirs): the sorted paths relative to baseDir of the files
+    that match any of patterns and none of excludes, and the set of directories
+    whose listings the result depends on.
+
+    Patterns are relative to baseDir and separated by '/'.  Each component may
+    use the fnmatch wildcards *, ? and [...], and a '**' component matches any
+    number of directories, including none.
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if isinstance(excludes, str):
+        excludes = [excludes]
+    matches = set()
+    excluded = set()
+    scannedDirs = set()
+    for pattern in patterns:
+        _glob_dir(snapshot, baseDir, "", pattern.split("/"), matches, scannedDirs)
+    for pattern in excludes:
+        _glob_dir(snapshot, baseDir, "", pattern.split("/"), excluded, scannedDirs)
+    dirs = set([_get_dependency_dir(snapshot, dirPath) for dirPath in scannedDirs])
+    return sorted(matches - excluded), dirs
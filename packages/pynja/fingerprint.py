@@ -0,0 +1,107 @@
+import sys
+import os
+import stat
+import hashlib
+from . import io
+from . import root_paths
+
+
+################################################################################
+#   Generation fingerprint
+#
+#   Records everything a generation run depended on: the content hash of every
+#   pynja and repo script that was loaded (see build.get_loaded_modules), of the
+#   identity stamp of the interpreter and toolchain binaries, the rootPaths values
+#   (and whether each one exists, since remake scripts commonly enable toolchains
+#   based on that), the interpreter, and the script arguments.  Toolchain
+#   settings are derived from these, so they are covered as well.
+#
+#   When ninja re-runs the generator only because an input's mtime changed (a
+#   checkout or a touch), the fingerprint still matches and generation can be
+#   skipped.  File hashes are only recomputed when a file's size or mtime differ
+#   from the recorded ones.  Directories scanned by Project.glob() are inputs as
+#   well; their hash covers the sorted names of their entries.
+
+def _hash_file(path):
+    hasher = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _hash_dir(path):
+    hasher = hashlib.sha1()
+    for name in sorted(os.listdir(path)):
+        hasher.update(name.encode("utf-8", "surrogateescape") + b"\n")
+    return hasher.hexdigest()
+
+
+def _get_file_state(path, oldState = None):
+    """Returns [size, mtime_ns, sha1], or None if the file cannot be read."""
+    try:
+        st = os.stat(path)
+        if oldState and (oldState[0] == st.st_size) and (oldState[1] == st.st_mtime_ns):
+            return oldState
+        if stat.S_ISDIR(st.st_mode):
+            return [st.st_size, st.st_mtime_ns, _hash_dir(path)]
+        return [st.st_size, st.st_mtime_ns, _hash_file(path)]
+    except OSError:
+        return None
+
+
+def _get_environment_state():
+    paths = {}
+    for name, path in sorted(vars(root_paths.rootPaths).items()):
+        if isinstance(path, str):
+            paths[name] = [path, os.path.exists(path)]
+    return {
+        "interpreter" : [sys.executable, sys.version],
+        "argv" : sys.argv[1:],
+        "rootPaths" : paths,
+    }
+
+
+def is_current(fingerprintPath, loadedModules, settings = None):
+    """Returns True if a generation run recorded at fingerprintPath would produce the same output.
+
+    Args:
+        loadedModules -- the script paths loaded so far; each must have been an input last time.
+        settings -- JSON-compatible generation settings, which must equal the recorded ones.
+    """
+    state = io.read_json_file(fingerprintPath)
+    if not state:
+        return False
+    if state.get("environment") != _get_environment_state():
+        return False
+    if state.get("settings") != settings:
+        return False
+    inputs = state["inputs"]
+    for path in loadedModules:
+        if path not in inputs:
+            return False
+    for path, oldState in inputs.items():
+        newState = _get_file_state(path, oldState)
+        if (not newState) or (newState[2] != oldState[2]):
+            return False
+    for path in state["outputs"]:
+        if not os.path.exists(path):
+            return False
+    return True
+
+
+def save(fingerprintPath, inputPaths, outputPaths, settings = None):
+    oldState = io.read_json_file(fingerprintPath) or {}
+    oldInputs = oldState.get("inputs", {})
+    inputs = {}
+    for path in sorted(set(inputPaths)):
+        fileState = _get_file_state(path, oldInputs.get(path))
+        if fileState:
+            inputs[path] = fileState
+    state = {
+        "environment" : _get_environment_state(),
+        "inputs" : inputs,
+        "outputs" : sorted(set(outputPaths)),
+        "settings" : settings,
+    }
+    io.write_json_file(fingerprintPath, state)
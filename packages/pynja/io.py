@@ -1,4 +1,5 @@
 import os
+import json
 
 
 def create_dir(d):
@@ -12,6 +13,7 @@ def create_dir_for_file(f):
 
 
 def write_file_if_different(filePath, newContents):
+    """Returns True if the file was written."""
     needToWrite = True
     if os.path.exists(filePath):
         with open(filePath, "rt") as file:
@@ -21,6 +23,45 @@ def write_file_if_different(filePath, newContents):
         create_dir_for_file(filePath)
         with open(filePath, "wt") as file:
             file.write(newContents)
+    return needToWrite
+
+
+def _file_has_chunks(filePath, chunks, size):
+    """Streams filePath against the byte strings in chunks, without reading it whole."""
+    try:
+        if os.path.getsize(filePath) != size:
+            return False
+        with open(filePath, "rb") as file:
+            for chunk in chunks:
+                if file.read(len(chunk)) != chunk:
+                    return False
+    except OSError:
+        return False
+    return True
+
+
+def write_chunks_if_different(filePath, chunks):
+    """Writes the byte strings in chunks to filePath if its contents differ; returns True if written."""
+    size = sum(len(chunk) for chunk in chunks)
+    if _file_has_chunks(filePath, chunks, size):
+        return False
+    create_dir_for_file(filePath)
+    with open(filePath, "wb") as file:
+        file.writelines(chunks)
+    return True
+
+
+def read_json_file(filePath):
+    """Returns the decoded contents of a JSON file, or None if it is missing or corrupt."""
+    try:
+        with open(filePath, "rt") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_file(filePath, obj):
+    write_file_if_different(filePath, json.dumps(obj, indent=1, sort_keys=True))
 
 
 class CrudeLockFile:
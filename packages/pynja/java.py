@@ -5,6 +5,9 @@ from . import build
 
 class JavaTask(build.BuildTask):
     # outputPath = fanin file
+    __slots__ = ("sourceFilePaths", "workingDir", "outputPath", "outputDir", "classPaths", "verbose")
+    _resultSlots = ("outputPath", "outputDir")
+
     def __init__(self, project, workingDir, outputPath, outputDir):
         super().__init__(project)
         self.sourceFilePaths = []
@@ -23,6 +26,9 @@ class JavaTask(build.BuildTask):
 
 
 class JarTask(build.BuildTask):
+    __slots__ = ("workingDir", "outputPath")
+    _resultSlots = ("outputPath",)
+
     def __init__(self, project, workingDir, outputPath):
         super().__init__(project)
         self.workingDir = workingDir
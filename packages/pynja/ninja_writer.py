@@ -0,0 +1,188 @@
+from . import io
+
+
+def ninja_esc_path(path):
+    if ('$' in path) or (' ' in path) or (':' in path):
+        return path.replace('$','$$').replace(' ','$ ').replace(':', '$:')
+    return path
+
+
+# record kinds
+RAW      = 0
+VARIABLE = 1
+RULE     = 2
+BUILD    = 3
+POOL     = 4
+SUBNINJA = 5
+
+_DEFAULT_SCOPE = (None, None, None, None)
+
+
+class NinjaWriter:
+    """Records the statements of a ninja manifest as compact tuples.
+
+    Build edges keep their raw (absolute) paths, together with the path scope of
+    the project that emitted them.  Path translation to $pdir/$bdir references
+    and escaping happen once, when the manifest is serialized.
+
+    Records:
+        (RAW, text)
+        (VARIABLE, name, value)
+        (RULE, name, variables)
+        (BUILD, scope, outputs, implicitOutputs, rule, inputs, implicit, orderOnly, variables)
+        (POOL, name, depth)
+        (SUBNINJA, path)
+    """
+
+    # number of records serialized per joined chunk
+    chunkRecords = 2048
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, text):
+        """Append raw manifest text."""
+        self.records.append((RAW, text))
+
+    def comment(self, text):
+        self.write("# %s\n" % text)
+
+    def banner(self, text):
+        self.write("#############################################\n# %s\n\n" % text)
+
+    def newline(self):
+        self.write("\n")
+
+    def variable(self, name, value):
+        self.records.append((VARIABLE, name, value))
+
+    def rule(self, name, variables):
+        """variables is a sequence of (name, value) pairs, e.g. (("command", "..."), ("restat", "1"))."""
+        self.records.append((RULE, name, tuple(variables)))
+
+    def build(self, project, outputs, rule, inputs = (), implicit = (), orderOnly = (), variables = (), implicitOutputs = ()):
+        """Record a build edge.
+
+        All paths are absolute and unescaped.  If project is given, paths under its
+        projectDir and builtDir are written relative to the project's ninja variables.
+        variables is a sequence of (name, value) pairs, written verbatim.
+        """
+        scope = project._ninjaScope if project else _DEFAULT_SCOPE
+        self.records.append((BUILD, scope, tuple(outputs), tuple(implicitOutputs), rule, tuple(inputs), tuple(implicit), tuple(orderOnly), tuple(variables)))
+
+    def pool(self, name, depth):
+        self.records.append((POOL, name, depth))
+
+    def subninja(self, path):
+        self.records.append((SUBNINJA, path))
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def iter_chunks(self, records = None):
+        """Yields the serialized manifest (or the given records), in chunks of chunkRecords records."""
+        if records == None:
+            records = self.records
+        translators = {}
+        parts = []
+        append = parts.append
+        count = 0
+        for record in records:
+            kind = record[0]
+            if kind == BUILD:
+                scope = record[1]
+                xlat = translators.get(scope)
+                if xlat == None:
+                    xlat = _make_translator(scope)
+                    translators[scope] = xlat
+                _, _, outputs, implicitOutputs, rule, inputs, implicit, orderOnly, variables = record
+                append("build ")
+                append(" ".join(map(xlat, outputs)))
+                if implicitOutputs:
+                    append(" | ")
+                    append(" ".join(map(xlat, implicitOutputs)))
+                append(" : ")
+                append(rule)
+                if inputs:
+                    append(" ")
+                    append(" ".join(map(xlat, inputs)))
+                if implicit:
+                    append(" | ")
+                    append(" $\n    ".join(map(xlat, implicit)))
+                if orderOnly:
+                    append(" || ")
+                    append(" $\n    ".join(map(xlat, orderOnly)))
+                append("\n")
+                for name, value in variables:
+                    append("  %-11s = %s\n" % (name, value))
+                append("\n")
+            elif kind == RAW:
+                append(record[1])
+            elif kind == VARIABLE:
+                append("%s = %s\n" % (record[1], record[2]))
+            elif kind == RULE:
+                append("rule %s\n" % record[1])
+                for name, value in record[2]:
+                    append("  %s = %s\n" % (name, value))
+                append("\n")
+            elif kind == POOL:
+                append("pool %s\n  depth = %d\n\n" % (record[1], record[2]))
+            elif kind == SUBNINJA:
+                append("subninja %s\n" % ninja_esc_path(record[1]))
+            count += 1
+            if count == self.chunkRecords:
+                yield "".join(parts)
+                parts.clear()
+                count = 0
+        if parts:
+            yield "".join(parts)
+
+    def getvalue(self):
+        return "".join(self.iter_chunks())
+
+    def write_file(self, filePath):
+        """Writes the manifest to filePath, unless the file already has identical contents.
+
+        Returns True if the file was written.
+        """
+        return io.write_chunks_if_different(filePath, [chunk.encode("utf-8") for chunk in self.iter_chunks()])
+
+
+class NullNinjaWriter(NinjaWriter):
+    """Discards all records; used when an up-to-date subninja file is reused."""
+
+    def write(self, text):
+        pass
+
+    def variable(self, name, value):
+        pass
+
+    def rule(self, name, variables):
+        pass
+
+    def build(self, project, outputs, rule, inputs = (), implicit = (), orderOnly = (), variables = (), implicitOutputs = ()):
+        pass
+
+    def pool(self, name, depth):
+        pass
+
+    def subninja(self, path):
+        pass
+
+    def extend(self, records):
+        pass
+
+
+def _make_translator(scope):
+    projectDir, pdirRef, builtDir, bdirRef = scope
+    if not projectDir:
+        return ninja_esc_path
+    projectDirLen = len(projectDir)
+    builtDirLen = len(builtDir)
+    def xlat(path):
+        if path.startswith(projectDir):
+            return pdirRef + ninja_esc_path(path[projectDirLen:])
+        if path.startswith(builtDir):
+            return bdirRef + ninja_esc_path(path[builtDirLen:])
+        return ninja_esc_path(path)
+    return xlat
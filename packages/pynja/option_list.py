@@ -0,0 +1,180 @@
+import collections.abc
+
+
+class OptionSet:
+    """An immutable, interned sequence of option values; create with intern_options().
+
+    Sets are shared by every task whose options start with the same values, and
+    cache the command-line fragments that toolchains translate them into.
+    """
+    __slots__ = ("items", "_hash", "_fragments", "_concats")
+
+    _interned = {}  # map tuple of items -> OptionSet
+
+    def __init__(self, items):
+        self.items = items
+        self._hash = hash(items)
+        self._fragments = {}
+        self._concats = {}      # map OptionSet -> OptionSet of self.items + its items
+
+    def __hash__(self):
+        return self._hash
+
+    def __len__(self):
+        return len(self.items)
+
+    def get_fragment(self, key, translate):
+        """Returns the tuple of translate(value) for each value, memoized under key."""
+        fragment = self._fragments.get(key)
+        if fragment == None:
+            fragment = tuple([translate(value) for value in self.items])
+            self._fragments[key] = fragment
+        return fragment
+
+    def concat(self, other):
+        """Returns the OptionSet of these values followed by the values of other."""
+        if not other.items:
+            return self
+        result = self._concats.get(other)
+        if result == None:
+            result = intern_options(self.items + other.items)
+            self._concats[other] = result
+        return result
+
+
+def intern_options(values):
+    items = tuple(values)
+    optionSet = OptionSet._interned.get(items)
+    if optionSet == None:
+        optionSet = OptionSet(items)
+        OptionSet._interned[items] = optionSet
+    return optionSet
+
+EMPTY_OPTIONS = intern_options(())
+
+
+class OptionList(collections.abc.MutableSequence):
+    """A copy-on-write list of options.
+
+    The values are a shared OptionSet (base) followed by values owned by this
+    list only (extra).  While there are no extra values, extending the list by
+    another OptionList shares the concatenated values, and extending an empty
+    list by any other sequence interns the values.  Other mutations only
+    allocate the extra values, except that changing base values copies them.
+    """
+    __slots__ = ("base", "extra", "_frozen")
+
+    def __init__(self, values = ()):
+        self.base = EMPTY_OPTIONS
+        self.extra = None
+        self._frozen = None     # OptionSet of all values, cached by freeze()
+        if values:
+            self.extend(values)
+
+    def freeze(self):
+        """Returns an OptionSet of the current values."""
+        if self._frozen == None:
+            if self.extra:
+                self._frozen = intern_options(self.base.items + tuple(self.extra))
+            else:
+                self._frozen = self.base
+        return self._frozen
+
+    def _flatten(self):
+        if self.base.items:
+            self.extra = list(self.base.items) + (self.extra or [])
+            self.base = EMPTY_OPTIONS
+        elif self.extra == None:
+            self.extra = []
+        return self.extra
+
+    def __len__(self):
+        return len(self.base.items) + (len(self.extra) if self.extra else 0)
+
+    def __iter__(self):
+        yield from self.base.items
+        if self.extra:
+            yield from self.extra
+
+    def __contains__(self, value):
+        return (value in self.base.items) or (bool(self.extra) and (value in self.extra))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        baseLen = len(self.base.items)
+        if 0 <= index < baseLen:
+            return self.base.items[index]
+        if self.extra and (0 <= index - baseLen < len(self.extra)):
+            return self.extra[index - baseLen]
+        raise IndexError("OptionList index out of range")
+
+    def __setitem__(self, index, value):
+        self._frozen = None
+        self._flatten()[index] = value
+
+    def __delitem__(self, index):
+        self._frozen = None
+        del self._flatten()[index]
+
+    def insert(self, index, value):
+        self._frozen = None
+        self._flatten().insert(index, value)
+
+    def append(self, value):
+        self._frozen = None
+        if self.extra == None:
+            self.extra = [value]
+        else:
+            self.extra.append(value)
+
+    def extend(self, values):
+        if not self.extra:
+            if isinstance(values, OptionList):
+                self.base = self.base.concat(values.freeze())
+                self.extra = None
+                self._frozen = self.base
+                return
+            if not self.base.items:
+                self.base = intern_options(values)
+                self.extra = None
+                self._frozen = self.base
+                return
+        self._frozen = None
+        if self.extra == None:
+            self.extra = []
+        self.extra.extend(values)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (OptionList, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "OptionList(%r)" % list(self)
+
+
+def translate_option_list(options, values, key, translate):
+    """Appends translate(value) to options, for each of values.
+
+    If values is an OptionList, the translation of its shared values is
+    memoized under key, which must identify translate; e.g. (toolchain, "defines").
+    """
+    if isinstance(values, OptionList):
+        if values.base.items:
+            options.extend(values.base.get_fragment(key, translate))
+        values = values.extra or ()
+    for value in values:
+        options.append(translate(value))
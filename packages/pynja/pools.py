@@ -0,0 +1,55 @@
+import os
+
+
+################################################################################
+#   Pool sizing
+#
+#   Ninja runs the edges of a pool at most depth at a time, whatever -j is.
+#   Memory-hungry jobs, such as links, go in pools whose depth is the number of
+#   such jobs that fit in physical memory, so that -j can stay at the core count.
+
+GB = 1 << 30
+
+
+def get_memory_size():
+    """Returns the size of physical memory in bytes, or None if it is unknown."""
+    if os.name == 'nt':
+        import ctypes
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+        return None
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def calc_pool_depth(jobMemory, cores = None, memory = None, jobsPerCore = 1.0):
+    """Returns how many jobs that each use jobMemory bytes can run at once.
+
+    The depth is at most cores * jobsPerCore, and at least 1.  cores and memory
+    default to those of this machine; if memory is unknown, only cores limits
+    the depth.
+    """
+    if cores == None:
+        cores = os.cpu_count() or 1
+    if memory == None:
+        memory = get_memory_size()
+    depth = int(cores * jobsPerCore)
+    if memory and jobMemory:
+        depth = min(depth, int(memory // jobMemory))
+    return max(depth, 1)
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+from . import io
+
+
+class _ProjectFrame:
+    def __init__(self, stats, writer, startTime):
+        self.stats = stats
+        self.writer = writer
+        self.countedPos = len(writer.records)   # records before this index are counted, here or by a nested project
+        self.startTime = startTime
+        self.childTime = 0.0
+        self.ownBytes = 0
+        self.ownRecords = 0
+
+    def count_records(self):
+        """Adds the records written since the last call to this project's own records."""
+        records = self.writer.records[self.countedPos:]
+        self.ownBytes += sum([len(chunk.encode("utf-8")) for chunk in self.writer.iter_chunks(records)])
+        self.ownRecords += len(records)
+        self.countedPos += len(records)
+
+
+class GenerationProfiler:
+    """Records where generation spends its time, per project and variant.
+
+    Enable it with regenerate_build(..., profile = True), or pass an instance to
+    attach hooks first.  Hooks are called as:
+        project_start(project)
+        project_end(project, stats)
+        task_emitted(task, seconds)
+        rsp_file(project, rspPath, written)
+
+    Times are wall-clock seconds.  Per-project times are reported both inclusive
+    and exclusive of nested get_project() calls; translate_* times are inclusive
+    of the translate_* methods they call.
+    """
+
+    hookNames = ("project_start", "project_end", "task_emitted", "rsp_file")
+
+    def __init__(self):
+        self.projects = {}      # map "projName variant" -> stats dict
+        self.traceEvents = []
+        self._hooks = dict([(name, []) for name in self.hookNames])
+        self._frames = []
+        self._taskStarts = []
+        self._pid = os.getpid()
+        self._epoch = time.perf_counter()
+
+    def add_hook(self, hookName, callback):
+        if hookName not in self._hooks:
+            raise Exception("unknown profiler hook %s; valid hooks are: %s" % (hookName, ", ".join(self.hookNames)))
+        self._hooks[hookName].append(callback)
+
+    def _add_trace_event(self, name, category, startTime, duration, args = None):
+        event = {
+            "name" : name,
+            "cat" : category,
+            "ph" : "X",
+            "ts" : (startTime - self._epoch) * 1e6,
+            "dur" : duration * 1e6,
+            "pid" : self._pid,
+            "tid" : 0,
+        }
+        if args:
+            event["args"] = args
+        self.traceEvents.append(event)
+
+    def _get_current_stats(self):
+        if self._frames:
+            return self._frames[-1].stats
+        return None
+
+    def project_start(self, project):
+        projName = type(project).__name__
+        variantName = str(project.variant)
+        stats = {
+            "project" : projName,
+            "variant" : variantName,
+            "wallTime" : 0.0,
+            "selfTime" : 0.0,
+            "taskCounts" : {},
+            "taskTimes" : {},
+            "translateTimes" : {},
+            "ninjaBytes" : 0,
+            "ninjaRecords" : 0,
+            "rspWritten" : 0,
+            "rspSkipped" : 0,
+        }
+        self.projects["%s %s" % (projName, variantName)] = stats
+        for callback in self._hooks["project_start"]:
+            callback(project)
+        writer = project.projectMan.ninjaFile
+        if self._frames and self._frames[-1].writer is writer:
+            self._frames[-1].count_records()
+        self._frames.append(_ProjectFrame(stats, project.projectMan.ninjaFile, time.perf_counter()))
+
+    def project_end(self, project):
+        endTime = time.perf_counter()
+        frame = self._frames.pop()
+        stats = frame.stats
+        wallTime = endTime - frame.startTime
+        frame.count_records()
+
+        stats["wallTime"] = wallTime
+        stats["selfTime"] = wallTime - frame.childTime
+        stats["ninjaBytes"] = frame.ownBytes
+        stats["ninjaRecords"] = frame.ownRecords
+        if self._frames:
+            parent = self._frames[-1]
+            parent.childTime += wallTime
+            if parent.writer is frame.writer:
+                parent.countedPos = frame.countedPos
+
+        self._add_trace_event("%s %s" % (stats["project"], stats["variant"]), "project", frame.startTime, wallTime)
+        for callback in self._hooks["project_end"]:
+            callback(project, stats)
+
+    def task_start(self, task):
+        self._taskStarts.append(time.perf_counter())
+
+    def task_end(self, task):
+        endTime = time.perf_counter()
+        startTime = self._taskStarts.pop()
+        seconds = endTime - startTime
+        taskType = type(task).__name__
+        stats = self._get_current_stats()
+        if stats:
+            stats["taskCounts"][taskType] = stats["taskCounts"].get(taskType, 0) + 1
+            stats["taskTimes"][taskType] = stats["taskTimes"].get(taskType, 0.0) + seconds
+        outputPath = getattr(task, "outputPath", None)
+        self._add_trace_event(taskType, "task", startTime, seconds, {"output" : outputPath} if outputPath else None)
+        for callback in self._hooks["task_emitted"]:
+            callback(task, seconds)
+
+    def rsp_file(self, project, rspPath, written):
+        stats = self._get_current_stats()
+        if stats:
+            if written:
+                stats["rspWritten"] += 1
+            else:
+                stats["rspSkipped"] += 1
+        for callback in self._hooks["rsp_file"]:
+            callback(project, rspPath, written)
+
+    def _add_translate_time(self, key, seconds):
+        stats = self._get_current_stats()
+        if stats:
+            translateTimes = stats["translateTimes"]
+            translateTimes[key] = translateTimes.get(key, 0.0) + seconds
+
+    def _wrap_translate(self, key, method):
+        def timed_translate(*args, **kwargs):
+            startTime = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._add_translate_time(key, time.perf_counter() - startTime)
+        return timed_translate
+
+    def instrument_toolchain(self, toolchain):
+        """Times every translate_* method of toolchain."""
+        for name in dir(toolchain):
+            if name.startswith("translate_"):
+                method = getattr(toolchain, name)
+                if callable(method):
+                    key = "%s.%s" % (toolchain.name, name)
+                    setattr(toolchain, name, self._wrap_translate(key, method))
+
+    def phase(self, name):
+        """Returns a context manager that records a named phase in the trace."""
+        return _Phase(self, name)
+
+    def get_report(self):
+        projects = sorted(self.projects.values(), key = lambda stats: stats["selfTime"], reverse = True)
+        totals = {
+            "projects" : len(projects),
+            "selfTime" : sum([stats["selfTime"] for stats in projects]),
+            "ninjaBytes" : sum([stats["ninjaBytes"] for stats in projects]),
+            "rspWritten" : sum([stats["rspWritten"] for stats in projects]),
+            "rspSkipped" : sum([stats["rspSkipped"] for stats in projects]),
+            "taskCounts" : {},
+            "translateTimes" : {},
+        }
+        for stats in projects:
+            for taskType, count in stats["taskCounts"].items():
+                totals["taskCounts"][taskType] = totals["taskCounts"].get(taskType, 0) + count
+            for key, seconds in stats["translateTimes"].items():
+                totals["translateTimes"][key] = totals["translateTimes"].get(key, 0.0) + seconds
+        return {"totals" : totals, "projects" : projects}
+
+    def write_report(self, filePath):
+        io.write_json_file(filePath, self.get_report())
+
+    def write_chrome_trace(self, filePath):
+        """Writes a trace viewable with chrome://tracing or Perfetto."""
+        io.create_dir_for_file(filePath)
+        with open(filePath, "wt") as file:
+            json.dump({"traceEvents" : self.traceEvents, "displayTimeUnit" : "ms"}, file)
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._startTime = time.perf_counter()
+
+    def __exit__(self, type, value, traceback):
+        self._profiler._add_trace_event(self._name, "phase", self._startTime, time.perf_counter() - self._startTime)
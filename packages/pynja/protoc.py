@@ -4,6 +4,12 @@ from . import build
 from . import monkey
 
 class ProtocTask(build.BuildTask):
+    __slots__ = (
+        "sourcePath", "builtDir", "workingDir", "toolchain", "outputLanguage",
+        "includePaths", "includeImports", "errorFormatMsvs", "outputPath", "outputHeader",
+    )
+    _resultSlots = ("sourcePath", "outputPath", "outputHeader")
+
     def __init__(self, project, sourcePath, builtDir, workingDir, language, toolchain):
         super().__init__(project)
         self.sourcePath = sourcePath
@@ -51,16 +57,23 @@ class ProtocToolChain(build.ToolChain):
         self._scriptDir = os.path.join(os.path.dirname(__file__), "scripts")
         self._protocScript = os.path.join(self._scriptDir, "protoc-invoke.py")
 
+    def get_identity_paths(self):
+        return [self.protocPath]
+
     def emit_rules(self, ninjaFile):
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# protoc\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule protoc\n")
-        ninjaFile.write("  depfile = $DEP_FILE\n")
-        ninjaFile.write("  command = python \"%s\"  \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OUT_FILE\"  \"$DEP_FILE\"  \"$LOG_FILE\"  \"$RSP_FILE\"\n" % (self._protocScript, self.protocPath))
-        ninjaFile.write("  description = protoc $DESC\n")
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
+        ninjaFile.banner("protoc")
+        if self.compactEdges:
+            ninjaFile.rule("protoc", depfile_rule_variables(self, "$out.d") + (
+                ("command", "%s  \"%s\"  \"$WORKING_DIR\"  $in  $out  $out.d  %s  $out.rsp" % (get_script_command(self, self._protocScript), self.protocPath, log_rule_arg(self, "$out.log", "$out"))),
+                ("description", "protoc $in"),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$out.rsp"))
+            return
+        ninjaFile.rule("protoc", depfile_rule_variables(self, "$DEP_FILE") + (
+            ("command", "%s  \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OUT_FILE\"  \"$DEP_FILE\"  %s  \"$RSP_FILE\"" % (get_script_command(self, self._protocScript), self.protocPath, log_rule_arg(self))),
+            ("description", "protoc $DESC"),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$RSP_FILE"))
 
     def emit_build(self, project, task):
         # write response file
@@ -75,39 +88,43 @@ class ProtocToolChain(build.ToolChain):
             options.append("--include_imports")
         if task.errorFormatMsvs:
             options.append("--error_format=msvs")
-        write_rsp_file(project, task, options)
+        if not claim_generated_output(project, task, "protoc", options):
+            return
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        outputPath = build.xlat_path(project, task.outputPath)
-        sourcePath = build.xlat_path(project, task.sourcePath)
-        logPath = outputPath + ".log"
-        sourceName = os.path.basename(task.sourcePath)
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._protocScript)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-        # write build command
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : protoc  %(sourcePath)s | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  SRC_FILE    = %s\n" % sourcePath)
-        ninjaFile.write("  OUT_FILE    = %s\n" % outputPath)
-        ninjaFile.write("  DEP_FILE    = %s.d\n" % outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            sourceName = os.path.basename(task.sourcePath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                ("SRC_FILE", build.xlat_path(project, task.sourcePath)),
+                ("OUT_FILE", outputPath),
+                ("DEP_FILE", outputPath + ".d"),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("DESC", "%s -> %s" % (sourceName, outputName)),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            "protoc",
+            inputs = (task.sourcePath,),
+            implicit = rspDeps + [self._protocScript] + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + rspVariables)
 
 def add_tool(cls):
     def _protoc_one(self, sourcePath, language):
         protocToolChain = self.projectMan.get_toolchain("protoc")
         task = ProtocTask(self, sourcePath, self.builtDir, self.projectDir, language, protocToolChain)
         self.set_protoc_options(task)
+        shareKey = (task.workingDir, task.outputLanguage, tuple(task.includePaths), task.includeImports, task.errorFormatMsvs)
+        share_generated_output(self, task, "protoc", self.builtDir, shareKey, ("outputPath", "outputHeader"))
         self._forcedDeps.add(task.outputHeader)
         return task
 
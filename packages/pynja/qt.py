@@ -5,6 +5,9 @@ from . import monkey
 
 
 class QtUiTask(build.BuildTask):
+    __slots__ = ("sourcePath", "outputPath", "workingDir", "toolchain")
+    _resultSlots = ("sourcePath", "outputPath")
+
     def __init__(self, project, sourcePath, outputPath, workingDir, toolchain):
         super().__init__(project)
         self.sourcePath = sourcePath
@@ -20,6 +23,9 @@ class QtUiTask(build.BuildTask):
             project.projectMan.add_phony_target(self.phonyTarget, self.outputPath)
 
 class QtMocTask(build.BuildTask):
+    __slots__ = ("sourcePath", "outputPath", "workingDir", "toolchain", "includePaths", "defines", "emitInclude")
+    _resultSlots = ("sourcePath", "outputPath")
+
     def __init__(self, project, sourcePath, outputPath, workingDir, toolchain):
         super().__init__(project)
         self.sourcePath = sourcePath
@@ -49,49 +55,60 @@ class QtToolChain(build.ToolChain):
         self._mocScript = os.path.join(self._scriptDir, "qt-moc-invoke.py")
         self._mocRule = "%s_moc" % self.name
 
+    def get_identity_paths(self):
+        return [os.path.join(self.qtBinDir, "moc"), os.path.join(self.qtBinDir, "uic")]
+
     def emit_rules(self, ninjaFile):
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# Qt uic\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s\n" % self._uicRule)
-        ninjaFile.write("  command = python \"%s\"  \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OUT_FILE\"  \"$LOG_FILE\"\n" % (self._uicScript, self.qtBinDir))
-        ninjaFile.write("  description = uic $DESC\n")
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# Qt moc\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s\n" % self._mocRule)
-        ninjaFile.write("  command = python \"%s\"  \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OUT_FILE\"  \"$LOG_FILE\"  \"$RSP_FILE\"\n" % (self._mocScript, self.qtBinDir))
-        ninjaFile.write("  description = moc $DESC\n")
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            logArg = log_rule_arg(self, "$out.log", "$out")
+            uicFiles = "$in  $out  %s" % logArg
+            mocFiles = "$in  $out  %s  $out.rsp" % logArg
+            desc = "$in"
+        else:
+            logArg = log_rule_arg(self)
+            uicFiles = "\"$SRC_FILE\"  \"$OUT_FILE\"  %s" % logArg
+            mocFiles = "\"$SRC_FILE\"  \"$OUT_FILE\"  %s  \"$RSP_FILE\"" % logArg
+            desc = "$DESC"
+        ninjaFile.banner("Qt uic")
+        ninjaFile.rule(self._uicRule, (
+            ("command", "%s  \"%s\"  \"$WORKING_DIR\"  %s" % (get_script_command(self, self._uicScript), self.qtBinDir, uicFiles)),
+            ("description", "uic " + desc),
+            ("restat", "1"),
+        ))
+        ninjaFile.banner("Qt moc")
+        ninjaFile.rule(self._mocRule, (
+            ("command", "%s  \"%s\"  \"$WORKING_DIR\"  %s" % (get_script_command(self, self._mocScript), self.qtBinDir, mocFiles)),
+            ("description", "moc " + desc),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$out.rsp" if self.compactEdges else "$RSP_FILE"))
 
     def emit_uic(self, project, task):
+        if not claim_generated_output(project, task, self._uicRule, ()):
+            return
+
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        outputPath = build.xlat_path(project, task.outputPath)
-        sourcePath = build.xlat_path(project, task.sourcePath)
-        logPath = outputPath + ".log"
-        sourceName = os.path.basename(task.sourcePath)
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._uicScript)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-        ruleName = self._uicRule
-
-        # write build command
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(ruleName)s %(sourcePath)s | %(scriptPath)s" % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  SRC_FILE    = %s\n" % sourcePath)
-        ninjaFile.write("  OUT_FILE    = %s\n" % outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            sourceName = os.path.basename(task.sourcePath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                ("SRC_FILE", build.xlat_path(project, task.sourcePath)),
+                ("OUT_FILE", outputPath),
+                log_edge_variable(self, outputPath),
+                ("DESC", "%s -> %s" % (sourceName, outputName)),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            self._uicRule,
+            inputs = (task.sourcePath,),
+            implicit = [self._uicScript] + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables)
 
     def translate_include_paths(self, options, task):
         for includePath in task.includePaths:
@@ -112,33 +129,34 @@ class QtToolChain(build.ToolChain):
         self.translate_defines(options, task)
         if not task.emitInclude:
             options.append("-i")
-        write_rsp_file(project, task, options)
+        if not claim_generated_output(project, task, self._mocRule, options):
+            return
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        outputPath = build.xlat_path(project, task.outputPath)
-        sourcePath = build.xlat_path(project, task.sourcePath)
-        logPath = outputPath + ".log"
-        sourceName = os.path.basename(task.sourcePath)
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._mocScript)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-        ruleName = self._mocRule
-
-        # write build command
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(ruleName)s  %(sourcePath)s | %(outputPath)s.rsp %(scriptPath)s " % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  SRC_FILE    = %s\n" % sourcePath)
-        ninjaFile.write("  OUT_FILE    = %s\n" % outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            sourceName = os.path.basename(task.sourcePath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                ("SRC_FILE", build.xlat_path(project, task.sourcePath)),
+                ("OUT_FILE", outputPath),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("DESC", "%s -> %s" % (sourceName, outputName)),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            self._mocRule,
+            inputs = (task.sourcePath,),
+            implicit = rspDeps + [self._mocScript] + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + rspVariables)
 
 def add_tool(cls):
     @monkey.new_method(cls)
@@ -159,7 +177,8 @@ def add_tool(cls):
         if not os.path.isabs(sourcePath):
             sourcePath = os.path.join(self.projectDir, sourcePath)
         task = QtUiTask(self, sourcePath, outputPath, self.projectDir, self.qtToolChain)
-        self._forcedDeps.add(outputPath)
+        share_generated_output(self, task, self.qtToolChain._uicRule, self.qtBuiltDir, (task.workingDir,))
+        self._forcedDeps.add(task.outputPath)
         return task
 
     @monkey.new_method(cls)
@@ -194,8 +213,10 @@ def add_tool(cls):
         if not isHeader:
             task.emitInclude = False
         self.set_qt_moc_options(task)
-        if outputPath.endswith(".moc"):
-            self._forcedDeps.add(outputPath)
+        shareKey = (task.workingDir, tuple(task.includePaths), tuple(task.defines), task.emitInclude)
+        share_generated_output(self, task, self.qtToolChain._mocRule, self.qtBuiltDir, shareKey)
+        if task.outputPath.endswith(".moc"):
+            self._forcedDeps.add(task.outputPath)
         return task
 
     @monkey.new_method(cls)
@@ -4,6 +4,13 @@ from . import build
 from . import monkey
 
 class Re2cTask(build.BuildTask):
+    __slots__ = (
+        "sourcePath", "builtDir", "workingDir", "toolchain", "outputPath",
+        "useBitVectors", "debug", "emitDot", "storableState", "flexSyntax", "computedGoto",
+        "lineMappings", "reuse", "nestedIfs", "charType", "singlePass",
+    )
+    _resultSlots = ("sourcePath", "outputPath")
+
     def __init__(self, project, sourcePath, builtDir, workingDir, toolchain, outputExt='.cpp'):
         super().__init__(project)
         self.sourcePath = sourcePath
@@ -53,18 +60,26 @@ class Re2cToolChain(build.ToolChain):
         super().__init__("re2c")
         self._re2cPath = re2cPath
 
-    def emit_rules(self, ninjaFile):
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# re2c\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule re2c\n")
-        ninjaFile.write("  depfile = $DEP_FILE\n")
-        ninjaFile.write("  command = \"%s\"  -$OPTIONS -o \"$OUT_FILE\"  \"$SRC_FILE\" \n" % (self._re2cPath))
-        ninjaFile.write("  description = re2c $DESC\n")
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
+    def get_identity_paths(self):
+        return [self._re2cPath]
 
-    def emit_build(self, project, task):
+    def emit_rules(self, ninjaFile):
+        ninjaFile.banner("re2c")
+        if self.compactEdges:
+            ninjaFile.rule("re2c", (
+                ("command", "\"%s\"  -$OPTIONS -o $out  $in" % (self._re2cPath)),
+                ("description", "re2c $in"),
+                ("restat", "1"),
+            ))
+            return
+        ninjaFile.rule("re2c", (
+            ("depfile", "$DEP_FILE"),
+            ("command", "\"%s\"  -$OPTIONS -o \"$OUT_FILE\"  \"$SRC_FILE\"" % (self._re2cPath)),
+            ("description", "re2c $DESC"),
+            ("restat", "1"),
+        ))
+
+    def translate_options(self, task):
         options = []
         if task.useBitVectors:
             options.append("s")
@@ -93,34 +108,42 @@ class Re2cToolChain(build.ToolChain):
             options.append("u")
         else: # catch-all, handles default behavior of task.charType == 'ascii':
             pass
+        return options
+
+    def emit_build(self, project, task):
+        options = self.translate_options(task)
+        if not claim_generated_output(project, task, "re2c", options):
+            return
 
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        outputPath = build.ninja_esc_path(task.outputPath)
-        sourcePath = build.ninja_esc_path(task.sourcePath)
-        re2cPath   = build.ninja_esc_path(self._re2cPath)
-        sourceName = os.path.basename(task.sourcePath)
-        outputName = os.path.basename(task.outputPath)
-        optionsStr = "".join(options)
-        extraOutputs = " ".join([build.ninja_esc_path(p) for p in task.extraOutputs])
-
-        # write build command
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s : re2c  %(sourcePath)s | %(re2cPath)s" % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  SRC_FILE    = %s\n" % task.sourcePath)
-        ninjaFile.write("  OUT_FILE    = %s\n" % task.outputPath)
-        ninjaFile.write("  OPTIONS     = %s\n" % optionsStr)
-        ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("OPTIONS", "".join(options)),)
+        else:
+            sourceName = os.path.basename(task.sourcePath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("SRC_FILE", task.sourcePath),
+                ("OUT_FILE", task.outputPath),
+                ("OPTIONS", "".join(options)),
+                ("DESC", "%s -> %s" % (sourceName, outputName)),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs,
+            "re2c",
+            inputs = (task.sourcePath,),
+            implicit = [self._re2cPath] + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables)
 
 def add_tool(cls):
     def _re2c_one(self, sourcePath, ext=".cpp"):
         re2cToolChain = self.projectMan.get_toolchain("re2c")
         task = Re2cTask(self, sourcePath, self.builtDir, self.projectDir, re2cToolChain, ext)
         self.set_re2c_options(task)
+        shareKey = (task.workingDir, tuple(re2cToolChain.translate_options(task)))
+        share_generated_output(self, task, "re2c", self.builtDir, shareKey)
         self._forcedDeps.add(task.outputPath)
         return task
 
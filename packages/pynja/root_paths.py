@@ -1,7 +1,7 @@
+import sys
 import os
-import inspect
-import uuid
-import importlib.machinery
+import importlib.util
+import concurrent.futures
 
 
 ################################################################################
@@ -17,16 +17,81 @@ import importlib.machinery
 ################################################################################
 #   Script loading
 
-_scriptPathsRel = {}            # map [uuid4] name -> relative path for script files
-_scriptPathsAbs = {}            # map [uuid4] name -> absolute path for script files
+_scriptPathsRel = {}            # map module name -> relative path for script files
+_scriptPathsAbs = {}            # map module name -> absolute path for script files
 _scriptRelToAbs = {}            # map relPath -> absPath for script files
+_scriptModules = {}             # map relPath -> module
+_projectScripts = {}            # map project name -> absolute path of the defining script
 
-def _import_script(name, absPath):
+# Number of threads used by import_subdirs to read and compile scripts.
+importThreads = min(8, os.cpu_count() or 1)
+
+def _get_module_name(relPath):
+    """Returns a stable module name for a script, derived from its path relative to rootDir.
+
+    Stable names make scripts' classes picklable and keep sys.modules free of
+    one-off entries; the bytecode cache is keyed by the script's path.
+    """
+    stem = os.path.splitext(relPath)[0]
+    chars = [c if c.isalnum() else '_' for c in stem]
+    baseName = "pynja_script_" + "".join(chars)
+    name = baseName
+    suffix = 1
+    while name in _scriptPathsRel and _scriptPathsRel[name] != relPath:
+        suffix += 1
+        name = "%s_%d" % (baseName, suffix)
+    return name
+
+def _prepare_script(relPath, absPath):
+    """Registers a script, and returns (name, spec), or None if it was already imported."""
     absPath = os.path.normpath(absPath)
     if not os.path.isabs(absPath):
         raise Exception("expected absolute path, but absPath=%s" % (absPath))
-    loader = importlib.machinery.SourceFileLoader(name, absPath)
-    return loader.load_module(name)
+    if relPath in _scriptRelToAbs:
+        oldAbsPath = _scriptRelToAbs[relPath]
+        if oldAbsPath != absPath:
+            raise Exception("Attempting to import same project_file with differing absPath:\n    %s\n    %s" % (oldAbsPath, absPath))
+        return None
+
+    name = _get_module_name(relPath)
+    _scriptPathsAbs[name] = absPath
+    _scriptPathsRel[name] = relPath
+    _scriptRelToAbs[relPath] = absPath
+    spec = importlib.util.spec_from_file_location(name, absPath)
+    return (name, spec)
+
+def _forget_script(relPath, name):
+    """Undoes _prepare_script() and _exec_script() for a script that failed, so that it can be imported again."""
+    sys.modules.pop(name, None)
+    _scriptModules.pop(relPath, None)
+    _scriptRelToAbs.pop(relPath, None)
+    _scriptPathsAbs.pop(name, None)
+    _scriptPathsRel.pop(name, None)
+
+def _exec_script(relPath, name, spec, code = None):
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    _scriptModules[relPath] = module
+    try:
+        if code == None:
+            spec.loader.exec_module(module)
+        else:
+            exec(code, module.__dict__)
+    except:
+        _forget_script(relPath, name)
+        raise
+    return module
+
+def _import_script(relPath, absPath):
+    prepared = _prepare_script(relPath, absPath)
+    if not prepared:
+        return _scriptModules.get(relPath)
+    name, spec = prepared
+    return _exec_script(relPath, name, spec)
+
+def _get_caller_script(callerDepth):
+    """Returns the module name of the script callerDepth frames above our caller."""
+    return sys._getframe(callerDepth + 1).f_globals["__name__"]
 
 ################################################################################
 #   rootPaths management
@@ -55,6 +120,7 @@ def _add_project_entry(projName, scriptName):
     """
     relPath = os.path.dirname(_scriptPathsRel[scriptName])
     absPath = os.path.dirname(_scriptPathsAbs[scriptName])
+    _projectScripts[projName] = _scriptPathsAbs[scriptName]
     oldAbsPath = getattr(rootPaths, projName, None)
     if oldAbsPath:
         if oldAbsPath == absPath:
@@ -64,6 +130,21 @@ def _add_project_entry(projName, scriptName):
     setattr(rootPathsRel, projName, relPath)
 
 
+def get_project_script(projName):
+    """Return the absolute path of the script that defined project projName."""
+    return _projectScripts.get(projName)
+
+
+def get_project_scripts():
+    """Return the set of absolute paths of all scripts that define projects."""
+    return set(_projectScripts.values())
+
+
+def get_script_paths():
+    """Return the set of absolute paths of all imported scripts."""
+    return set(_scriptPathsAbs.values())
+
+
 def import_file(relPathFromRootDir, altPath = None):
     """Import a file by relative-path-from-repo-rootDir.
 
@@ -80,18 +161,7 @@ def import_file(relPathFromRootDir, altPath = None):
     if not absPath:
         absPath = os.path.normpath(os.path.join(rootDir, relPath))
 
-    if relPath in _scriptRelToAbs:
-        oldAbsPath = _scriptRelToAbs[relPath]
-        if oldAbsPath != absPath:
-            raise Exception("Attempting to import same project_file with differing absPath:\n    %s\n    %s" % (oldAbsPath, absPath))
-        return
-
-    name = str(uuid.uuid4())
-    _scriptPathsAbs[name] = absPath
-    _scriptPathsRel[name] = relPath
-    _scriptRelToAbs[relPath] = absPath
-
-    return _import_script(name, absPath)
+    return _import_script(relPath, absPath)
 
 
 def import_dir(relDirFromRootDir, altPath = None):
@@ -122,24 +192,20 @@ def import_subdir_file(subPath, altPath = None, callerDepth = 1):
     *   calling import_subdir_file from a parent directory's script
     *   defining a rootPath and calling import_file() instead.
     """
-    frame = inspect.stack()[callerDepth]
-    module = inspect.getmodule(frame[0])
+    relPath, absPath = _resolve_subdir_file(_get_caller_script(callerDepth), subPath, altPath)
+    return _import_script(relPath, absPath)
+
 
+def _resolve_subdir_file(callerName, subPath, altPath):
     subPath = os.path.normpath(subPath)
     if len(subPath) > 3 and subPath[0] == '.' and subPath[1] == '.' and subPath[2] == os.path.sep:
         raise Exception("you may not reach outside your directory: %s" % (subPath))
 
-    relPath = _scriptPathsRel[module.__name__]
-    absPath = _scriptPathsAbs[module.__name__]
+    relPath = _scriptPathsRel[callerName]
+    absPath = _scriptPathsAbs[callerName]
     relPath = os.path.join(os.path.dirname(relPath), subPath)
-    absPath = os.path.join(os.path.dirname(absPath), subPath)
-
-    name = str(uuid.uuid4())
-    _scriptPathsAbs[name] = absPath
-    _scriptPathsRel[name] = relPath
-    _scriptRelToAbs[relPath] = absPath
-
-    return _import_script(name, absPath)
+    absPath = altPath or os.path.join(os.path.dirname(absPath), subPath)
+    return (relPath, absPath)
 
 
 def import_subdir(subDir, altPath = None):
@@ -150,6 +216,43 @@ def import_subdir(subDir, altPath = None):
         is equivalent to
             pynja.import_subdir_file("foo/thing/thing.py")
     """
+    return import_subdir_file(_get_subdir_file(subDir), altPath, callerDepth = 2)
+
+
+def _get_subdir_file(subDir):
     basename = os.path.basename(subDir)
-    subPath = os.path.join(subDir, basename + ".py")
-    return import_subdir_file(subPath, altPath, callerDepth = 2)
+    return os.path.join(subDir, basename + ".py")
+
+
+def import_subdirs(subDirs):
+    """Call import_subdir for each of subDirs.
+
+    The scripts' bytecode is read (or compiled) by a pool of importThreads
+    threads, which overlaps the file-system latency of large trees; the scripts
+    are then executed one at a time, in the given order.
+    """
+    callerName = _get_caller_script(1)
+    pending = []
+    for subDir in subDirs:
+        relPath, absPath = _resolve_subdir_file(callerName, _get_subdir_file(subDir), None)
+        prepared = _prepare_script(relPath, absPath)
+        if prepared:
+            name, spec = prepared
+            pending.append((relPath, name, spec))
+
+    modules = []
+    try:
+        if len(pending) > 1 and importThreads > 1:
+            with concurrent.futures.ThreadPoolExecutor(importThreads) as executor:
+                codes = list(executor.map(lambda item: item[2].loader.get_code(item[1]), pending))
+        else:
+            codes = [None] * len(pending)
+
+        for (relPath, name, spec), code in zip(pending, codes):
+            modules.append(_exec_script(relPath, name, spec, code))
+    except:
+        # the scripts after the one that failed were registered, but never executed
+        for relPath, name, spec in pending[len(modules):]:
+            _forget_script(relPath, name)
+        raise
+    return modules
@@ -0,0 +1,286 @@
+import os
+import sys
+import time
+import signal
+import socket
+import selectors
+import fcntl
+import errno
+import traceback
+
+
+# A long-lived process that runs the wrapper scripts of this directory for
+# run-action.py.  Each request runs in a forked child, so imports, compiled
+# script code and anything else the parent holds are already warm, while
+# chdir(), the environment and sys.exit() stay private to the request.
+#
+# Protocol, over a Unix stream socket:
+#   client -> runner:  the request length as 4 little-endian bytes, sent with
+#                      the client's stdin, stdout and stderr descriptors, then
+#                      the NUL-separated request (see run-action.py)
+#   runner -> client:  b"S" once the child is started, then, when the child
+#                      exits, its exit code as a 4-byte signed integer; or b"F"
+#                      if the runner failed to handle the request, which the
+#                      client then runs itself
+# A client that loses the connection before b"S" may retry; if it loses the
+# connection, the runner kills the child's process group.
+
+IDLE_TIMEOUT = 120      # seconds without requests or children, before exiting
+WARM_MODULES = ("re", "glob", "json", "shlex", "shutil", "hashlib", "subprocess", "invoke_common", "log_store", "gcc_common", "msvc_common", "nvcc_common")
+
+_scriptDir = os.path.dirname(os.path.abspath(__file__))
+_codeCache = {}         # map script path -> (mtime_ns, code)
+
+
+def get_code(scriptPath):
+    mtime = os.stat(scriptPath).st_mtime_ns
+    entry = _codeCache.get(scriptPath)
+    if (entry == None) or (entry[0] != mtime):
+        with open(scriptPath, "rb") as file:
+            entry = (mtime, compile(file.read(), scriptPath, "exec"))
+        _codeCache[scriptPath] = entry
+    return entry[1]
+
+
+def parse_request(data):
+    fields = data.decode("utf-8", "surrogateescape").split("\0")
+    cwd, scriptPath, argCount = fields[0:3]
+    argEnd = 3 + int(argCount)
+    args = fields[3:argEnd]
+    env = dict([field.split("=", 1) for field in fields[argEnd:] if "=" in field])
+    return cwd, scriptPath, args, env
+
+
+def run_script(scriptPath, args):
+    """Runs scriptPath as __main__ and returns its exit code, as the interpreter would."""
+    sys.argv = [scriptPath] + args
+    try:
+        exec(get_code(scriptPath), {"__name__" : "__main__", "__file__" : scriptPath, "__builtins__" : __builtins__})
+        code = 0
+    except SystemExit as e:
+        if e.code == None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        code = 1
+    return code
+
+
+class Runner:
+    def __init__(self, sockPath):
+        self.sockPath = sockPath
+        self.selector = selectors.DefaultSelector()
+        self.children = {}      # map pid -> connection
+        self.pending = {}       # map connection -> [fds, length, data], for requests being received
+        self.idleSince = None
+
+    def serve(self):
+        # the lock is held for the life of the runner; runners that lose the race exit
+        self.lockFile = open(self.sockPath + ".lock", "w")
+        try:
+            fcntl.flock(self.lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        if os.path.exists(self.sockPath):
+            os.unlink(self.sockPath)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.sockPath)
+        self.listener.listen(64)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ, self._accept)
+
+        self.wakeRead, self.wakeWrite = os.pipe()
+        os.set_blocking(self.wakeRead, False)
+        os.set_blocking(self.wakeWrite, False)
+        signal.set_wakeup_fd(self.wakeWrite)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        self.selector.register(self.wakeRead, selectors.EVENT_READ, self._reap)
+
+        for name in WARM_MODULES:
+            try:
+                __import__(name)
+            except ImportError:
+                pass
+        for fileName in sorted(os.listdir(_scriptDir)):
+            if fileName.endswith(".py"):
+                get_code(os.path.join(_scriptDir, fileName))
+
+        self.idleSince = _now()
+        while True:
+            timeout = None
+            if self.idleSince != None:
+                timeout = self.idleSince + IDLE_TIMEOUT - _now()
+                if timeout <= 0:
+                    break
+            for key, events in self.selector.select(timeout):
+                key.data(key.fileobj)
+            if self.children or self.pending:
+                self.idleSince = None
+            elif self.idleSince == None:
+                self.idleSince = _now()
+        self._shutdown()
+
+    def _shutdown(self):
+        # clients that connected since the last select have not been sent b"S", and retry
+        os.unlink(self.sockPath)
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                break
+            conn.close()
+        self.listener.close()
+
+    def _accept(self, listener):
+        try:
+            conn, _ = listener.accept()
+        except OSError:
+            return
+        self.pending[conn] = [None, None, b""]
+        self.selector.register(conn, selectors.EVENT_READ, self._receive)
+
+    def _close(self, conn):
+        self.selector.unregister(conn)
+        conn.close()
+
+    def _receive(self, conn):
+        try:
+            self._receive_request(conn)
+        except Exception:
+            # a request that the runner cannot handle must not stop it for the others
+            traceback.print_exc()
+            sys.stderr.flush()
+            request = self.pending.pop(conn, None)
+            for fd in (request and request[0]) or ():
+                os.close(fd)
+            if conn.fileno() == -1:
+                return
+            if conn in self.children.values():
+                self._hangup(conn)
+                return
+            try:
+                conn.sendall(b"F")
+            except OSError:
+                pass
+            self._close(conn)
+
+    def _receive_request(self, conn):
+        request = self.pending[conn]
+        try:
+            if request[0] == None:
+                header, fds, flags, addr = socket.recv_fds(conn, 4, 3)
+                request[0] = fds
+                request[1] = int.from_bytes(header, "little") if len(header) == 4 else None
+                if (request[1] == None) or (len(fds) != 3):
+                    raise OSError(errno.EPROTO, "bad request header")
+            else:
+                data = conn.recv(request[1] - len(request[2]))
+                if not data:
+                    raise OSError(errno.EPROTO, "truncated request")
+                request[2] += data
+        except OSError:
+            del self.pending[conn]
+            for fd in request[0] or ():
+                os.close(fd)
+            self._close(conn)
+            return
+        if len(request[2]) < request[1]:
+            return
+        fds = request[0]
+        pid = os.fork()
+        if pid == 0:
+            self._run_child(conn, fds, request[2])
+        del self.pending[conn]
+        self.children[pid] = conn
+        try:
+            os.setpgid(pid, pid)    # also done by the child; whichever runs first wins
+        except OSError:
+            pass
+        for fd in fds:
+            os.close(fd)
+        try:
+            conn.sendall(b"S")
+        except OSError:
+            pass
+        self.selector.modify(conn, selectors.EVENT_READ, self._hangup)
+
+    def _run_child(self, conn, fds, data):
+        code = 1
+        try:
+            os.setpgid(0, 0)
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            self.selector.close()
+            self.listener.close()
+            os.close(self.wakeRead)
+            os.close(self.wakeWrite)
+            self.lockFile.close()
+            for other in list(self.pending) + list(self.children.values()):
+                if other:
+                    other.close()
+            conn.close()
+            for stdFd, fd in enumerate(fds):
+                os.dup2(fd, stdFd)
+                os.close(fd)
+            cwd, scriptPath, args, env = parse_request(data)
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(env)
+            code = run_script(scriptPath, args)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(code & 0xff)
+
+    def _hangup(self, conn):
+        # the client sends nothing after its request, so this is end of stream
+        for pid, other in self.children.items():
+            if other is conn:
+                try:
+                    os.killpg(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+                self.children[pid] = None
+                break
+        self._close(conn)
+
+    def _reap(self, wakeRead):
+        try:
+            while os.read(wakeRead, 512):
+                pass
+        except BlockingIOError:
+            pass
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            conn = self.children.pop(pid, None)
+            if conn:
+                try:
+                    conn.sendall(os.waitstatus_to_exitcode(status).to_bytes(4, "little", signed=True))
+                except OSError:
+                    pass
+                self._close(conn)
+
+
+def _now():
+    return time.monotonic()
+
+
+if __name__ == '__main__':
+    script, command, sockPath = sys.argv
+    if command != "serve":
+        raise Exception("unknown command: %s" % command)
+    Runner(sockPath).serve()
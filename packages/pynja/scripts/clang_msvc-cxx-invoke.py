@@ -2,14 +2,18 @@ import os
 import sys
 import re
 import msvc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, srcPath, outputPath, pdbPath, depPath, logPath, installDir, arch, rspPath, msvcVer, llvmDir = sys.argv
+    script, workingDir, srcPath, outputPath, pdbPath, depPath, logPath, installDir, arch, rspPath, msvcVer, llvmDir = invoke_common.parse_argv(sys.argv)
 
+    _includePattern = re.compile("Note: including file: *(.*)")
+
+
+    def is_diagnostic(line):
+        return (" error " in line) or (" warning " in line)
 
-    def shell_escape_path(path):
-        return path.replace(" ", "\\ ")
 
     def set_clang_msvc_environment():
         oldPathEnv = os.environ.get('PATH') or ""
@@ -20,15 +24,15 @@ if __name__ == '__main__':
         createPCH = outputPath.endswith(".pch")
         if createPCH:
             objectPath = outputPath + ".obj"
-            extraOptions = "/Fp\"%s\"" % outputPath
+            extraOptions = ["/Fp" + outputPath]
         else:
             objectPath = outputPath
-            extraOptions = ""
+            extraOptions = []
 
         if arch == "x86":
-            extraOptions += " -m32"
+            extraOptions.append("-m32")
         else:
-            extraOptions += " -m64"
+            extraOptions.append("-m64")
 
         mscVerMap = {
              "8" : "1400",
@@ -38,37 +42,23 @@ if __name__ == '__main__':
             "12" : "1800",
             "14" : "1900",
         }
-        extraOptions += " -fmsc-version=" + mscVerMap[msvcVer]
-
-        cmd = "clang-cl /showIncludes \"%s\" \"@%s\" \"/Fo%s\" -D_HAS_EXCEPTIONS=0 %s > \"%s\" 2>&1" % (srcPath, rspPath, objectPath, extraOptions, logPath)
-        exitcode = os.system(cmd)
-
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        needToPrintLog = not not exitcode
-        # write out deps file, and determine if an error or warning occurred
-        with open(depPath, "wt") as depFile:
-            outputPathEsc = shell_escape_path(outputPath)
-            depFile.write("%s: \\\n" % outputPathEsc)
-            for logLine in logContents.splitlines():
-                if " error " in logLine:
-                    needToPrintLog = True
-                elif " warning " in logLine:
-                    if not ("D9035" in logLine): # ignore: Command line warning D9035 : option 'Yd' has been deprecated
-                        needToPrintLog = True
-                else:
-                    match = re.match("Note: including file: ([ ]*)(.*)", logLine)
-                    if match:
-                        incPath = os.path.normpath(match.group(2))
-                        depEsc = shell_escape_path(incPath)
-                        depFile.write("%s \\\n" % depEsc)
-        if needToPrintLog:
-            for logLine in logContents.splitlines():
-                if "D9035" in logLine:
-                    continue
-                if "Note: including file: " in logLine:
-                    continue
-                print(logLine)
+        extraOptions.append("-fmsc-version=" + mscVerMap[msvcVer])
+
+        args = ["clang-cl", "/showIncludes", srcPath, "@" + rspPath, "/Fo" + objectPath, "-D_HAS_EXCEPTIONS=0"] + extraOptions
+        includePaths = []
+
+        def filter_line(line):
+            # the includes go to the deps instead of the log
+            match = _includePattern.match(line)
+            if match:
+                includePaths.append(os.path.normpath(match.group(1).rstrip()))
+                return None
+            if "D9035" in line: # ignore: Command line warning D9035 : option 'Yd' has been deprecated
+                return None
+            return line
+
+        exitcode = invoke_common.run_tool(args, logPath, isDiagnostic=is_diagnostic, lineFilter=filter_line)
+        msvc_common.write_deps(depPath, outputPath, includePaths)
         if exitcode:
             sys.exit(exitcode)
 
@@ -1,19 +1,15 @@
 import os
 import sys
-import re
 import gcc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, srcPath, objPath, depPath, logPath, installDir, executable, rspPath = sys.argv
+    script, workingDir, srcPath, objPath, depPath, logPath, installDir, executable, rspPath = invoke_common.parse_argv(sys.argv)
 
     def cpp_compile():
-        cmd = "%s \"@%s\" \"%s\" -o\"%s\" -MD -MF \"%s\" > \"%s\" 2>&1" % (executable, rspPath, srcPath, objPath, depPath, logPath)
-        exitcode = os.system(cmd)
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("(warning)|(error)", logContents, re.MULTILINE):
-            print("%s" % logContents)
+        args = [executable, "@" + rspPath, srcPath, "-o" + objPath, "-MD", "-MF", depPath]
+        exitcode = invoke_common.run_tool(args, logPath, lineFilter=gcc_common.HeaderTraceFilter())
         if exitcode:
             sys.exit(exitcode)
 
@@ -1,20 +1,15 @@
 import os
 import sys
-import re
 import gcc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, logPath, installDir, toolName, rspPath = sys.argv
+    script, workingDir, logPath, installDir, toolName, rspPath = invoke_common.parse_argv(sys.argv)
 
 
     def link():
-        cmd = "%s \"@%s\" > \"%s\" 2>&1" % (toolName, rspPath, logPath)
-        exitcode = os.system(cmd)
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("(warning)|(error)", logContents, re.MULTILINE):
-            print("%s" % logContents)
+        exitcode = invoke_common.run_tool([toolName, "@" + rspPath], logPath)
         if exitcode:
             sys.exit(exitcode)
 
@@ -1,7 +1,33 @@
 import os
+import re
 
 def set_gcc_environment(installDir):
     oldPathEnv = os.environ.get('PATH') or ""
     os.environ['PATH'] = "%s/bin%s%s" % (installDir, os.pathsep, oldPathEnv)
     os.environ['INCLUDE'] = "%s/include" % installDir
     os.environ['LIB'] = "%s/lib" % installDir
+
+
+_traceLinePattern = re.compile(r"\.+ ")
+
+class HeaderTraceFilter:
+    """A line filter that drops the include trace of -H.
+
+    The lines that show whether a precompiled header was used ('!') or rejected
+    ('x') are kept.
+    """
+    def __init__(self):
+        self._inGuardList = False
+
+    def __call__(self, line):
+        if self._inGuardList:
+            # the list of headers that lack include guards ends the trace
+            if ": " not in line:
+                return None
+            self._inGuardList = False
+        if line.startswith("Multiple include guards may be useful for:"):
+            self._inGuardList = True
+            return None
+        if _traceLinePattern.match(line):
+            return None
+        return line
@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import hashlib
+
+
+# Writes a stamp file that identifies the interpreter and toolchain binaries by
+# content.  The stamp is only rewritten when its contents change, so the
+# regenerator, which depends on it, does not re-run when a binary is merely
+# touched or reinstalled unchanged.
+
+def _hash_file(path):
+    hasher = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _read_stamp(stampPath):
+    try:
+        with open(stampPath, "rt") as file:
+            return json.load(file), os.stat(stampPath).st_mtime_ns
+    except (OSError, ValueError):
+        return None, None
+
+
+def write_stamp(stampPath, paths):
+    """Returns True if the stamp was written."""
+    oldState, stampTime = _read_stamp(stampPath)
+    oldHashes = oldState.get("files", {}) if oldState else {}
+    hashes = {}
+    for path in paths:
+        try:
+            # a file older than the stamp still has the recorded hash
+            if (path in oldHashes) and (os.stat(path).st_mtime_ns < stampTime):
+                hashes[path] = oldHashes[path]
+            else:
+                hashes[path] = _hash_file(path)
+        except OSError:
+            hashes[path] = None
+    state = {
+        "interpreter" : sys.version,
+        "files" : hashes,
+    }
+    if state == oldState:
+        return False
+    with open(stampPath, "wt") as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+    return True
+
+
+if __name__ == '__main__':
+    script, stampPath = sys.argv[0:2]
+    write_stamp(stampPath, sys.argv[2:])
@@ -0,0 +1,121 @@
+import sys
+import re
+import collections
+import subprocess
+import log_store
+
+
+# Runs the tools of the wrapper scripts without a shell, streaming their combined
+# stdout and stderr through a line filter into a bounded buffer.  The buffer keeps
+# the first HEAD_SIZE and the last TAIL_SIZE characters of the output, and notes
+# how many lines were dropped in between, so a tool that floods its output does
+# not exhaust memory.
+
+HEAD_SIZE = 1 << 20
+TAIL_SIZE = 1 << 18
+
+_diagnosticPattern = re.compile("warning|error")
+
+_logStorePath = None    # set by parse_argv()
+
+
+def parse_argv(argv):
+    """Returns argv without the "--log-store STORE" option of ToolChain.logStorePath.
+
+    With the option, the logs of this process go to the log store STORE, and a
+    script's log argument is the key of its record instead of a .log file path.
+    """
+    global _logStorePath
+    if "--log-store" not in argv:
+        return argv
+    index = argv.index("--log-store")
+    _logStorePath = argv[index + 1]
+    return argv[:index] + argv[index + 2:]
+
+
+def has_diagnostic(line):
+    return _diagnosticPattern.search(line) != None
+
+
+class ToolOutput:
+    """The output of the tool runs of one edge.
+
+    Args:
+        isDiagnostic -- predicate on an output line; if it is true for any line,
+            finish() prints the output even when the tools succeed.  If None, the
+            output is only printed when a tool fails.
+        lineFilter -- function of an output line that returns the line to keep,
+            or None to drop it
+    """
+    def __init__(self, isDiagnostic = has_diagnostic, lineFilter = None):
+        self.isDiagnostic = isDiagnostic
+        self.lineFilter = lineFilter
+        self.hasDiagnostic = False
+        self._head = []
+        self._headSize = 0
+        self._tail = collections.deque()
+        self._tailSize = 0
+        self._droppedLines = 0
+
+    def _append(self, line):
+        if self._headSize < HEAD_SIZE:
+            self._head.append(line)
+            self._headSize += len(line)
+            return
+        self._tail.append(line)
+        self._tailSize += len(line)
+        while (self._tailSize > TAIL_SIZE) and (len(self._tail) > 1):
+            self._tailSize -= len(self._tail.popleft())
+            self._droppedLines += 1
+
+    def add_line(self, line):
+        if self.lineFilter:
+            line = self.lineFilter(line)
+            if line == None:
+                return
+        if self.isDiagnostic and not self.hasDiagnostic:
+            self.hasDiagnostic = self.isDiagnostic(line)
+        self._append(line)
+
+    def run(self, args):
+        """Runs args without a shell and returns its exit code; 128 + N if signal N killed it.
+
+        args is a list, or on Windows, a command line string.
+        """
+        try:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors="replace")
+        except OSError as e:
+            self.add_line("error: cannot run %s: %s\n" % (args if isinstance(args, str) else args[0], e.strerror))
+            return 127
+        with process.stdout:
+            for line in process.stdout:
+                self.add_line(line)
+        exitcode = process.wait()
+        if exitcode < 0:
+            exitcode = 128 - exitcode
+        return exitcode
+
+    def get_contents(self):
+        contents = "".join(self._head)
+        if self._droppedLines:
+            contents += "[%d lines dropped]\n" % self._droppedLines
+        return contents + "".join(self._tail)
+
+    def finish(self, logDest, exitcode):
+        """Writes the log of the edge to logDest, and prints it if a tool failed or reported a diagnostic.
+
+        logDest is a .log file path, or the key of a record in the log store; see parse_argv().
+        """
+        contents = self.get_contents()
+        log_store.write_log(_logStorePath, logDest, exitcode, contents)
+        if exitcode or self.hasDiagnostic:
+            sys.stdout.write(contents)
+            sys.stdout.flush()
+
+
+def run_tool(args, logDest, isDiagnostic = has_diagnostic, lineFilter = None):
+    """Runs args, writes their log to logDest, and returns the exit code; see ToolOutput."""
+    output = ToolOutput(isDiagnostic, lineFilter)
+    exitcode = output.run(args)
+    output.finish(logDest, exitcode)
+    return exitcode
@@ -1,9 +1,13 @@
 import os
 import sys
-import re
+import invoke_common
 
 if __name__ == '__main__':
-    script, workingDir, jdkDir, outputPath, logPath = sys.argv
+    script, workingDir, jdkDir, outputPath, logPath = invoke_common.parse_argv(sys.argv)
+
+
+    def is_diagnostic(line):
+        return ("warning:" in line) or ("error:" in line)
 
 
     os.chdir(workingDir)
@@ -14,11 +18,8 @@ if __name__ == '__main__':
     os.environ['PATH'] = "%s%sbin%s%s" % (jdkDir, os.sep, os.pathsep, oldPathEnv)
     os.environ['JAVA_HOME'] = "%s\jre" % (jdkDir)
 
-    cmd = "jar cvf \"%s\" * > \"%s\" 2>&1" % (outputPath, logPath)
-    exitcode = os.system(cmd)
-    with open(logPath, "rt") as logFile:
-        logContents = logFile.read()
-    if re.search("warning:|error:", logContents, re.MULTILINE):
-        print("%s" % logContents)
+    # as with the shell's *, names that start with a dot are skipped
+    fileNames = sorted([name for name in os.listdir(".") if not name.startswith(".")])
+    exitcode = invoke_common.run_tool(["jar", "cvf", outputPath] + fileNames, logPath, isDiagnostic=is_diagnostic)
 
     sys.exit(exitcode)
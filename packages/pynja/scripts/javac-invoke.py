@@ -1,11 +1,15 @@
 import os
 import glob
 import sys
-import re
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, subCommand, workingDir, jdkDir, outputDir, optionsPath, classPathsPath, sourcesPath, logPath, listFilePath, faninPath = sys.argv
+    script, subCommand, workingDir, jdkDir, outputDir, optionsPath, classPathsPath, sourcesPath, logPath, listFilePath, faninPath = invoke_common.parse_argv(sys.argv)
+
+
+    def is_diagnostic(line):
+        return ("warning:" in line) or ("error:" in line)
 
 
     def read_list_file():
@@ -25,7 +29,7 @@ if __name__ == '__main__':
 
     def generate_list_file():
         with open(sourcesPath, "rt") as sourcesFile:
-            sourcesList = sourcesFile.readlines()
+            sourcesList = [line.strip() for line in sourcesFile.readlines() if line.strip()]
 
         with open(listFilePath, "wt") as listFile:
             for sourcePath in sourcesList:
@@ -37,7 +41,7 @@ if __name__ == '__main__':
                     # strip off ".java" and normalize slashes
                     basePath = os.path.normpath(os.path.join(outputDir, sourcePath)[0:-5])
                     listFile.write("%s.class\n" % basePath)
-                    implicitOutputs = glob.glob("%s$*.class" % basePath)
+                    implicitOutputs = sorted(glob.glob("%s$*.class" % basePath))
                     for implicitOutput in implicitOutputs:
                         listFile.write("%s\n" % implicitOutput)
 
@@ -62,15 +66,11 @@ if __name__ == '__main__':
         cpOptionsPath = classPathsPath + ".t"
         create_class_path_options_file(cpOptionsPath)
 
-        cmd = "javac \"@%s\" \"@%s\" \"@%s\" -d \"%s\" > \"%s\" 2>&1" % (optionsPath, cpOptionsPath, sourcesPath, outputDir, logPath)
-        exitcode = os.system(cmd)
+        args = ["javac", "@" + optionsPath, "@" + cpOptionsPath, "@" + sourcesPath, "-d", outputDir]
+        exitcode = invoke_common.run_tool(args, logPath, isDiagnostic=is_diagnostic)
 
         os.unlink(cpOptionsPath)
 
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("warning:|error:", logContents, re.MULTILINE):
-            print("%s" % logContents)
         if exitcode:
             sys.exit(exitcode)
 
@@ -104,6 +104,22 @@ if __name__ == '__main__':
         with open(faninPath, "wt") as faninFile:
             faninFile.write("1")
 
+    def escape_ninja_path(path):
+        return path.replace("$", "$$").replace(" ", "$ ").replace(":", "$:")
+
+    def generate_dyndep_file():
+        # declares every class file as an implicit output of the compile edge
+        outputList = read_list_file()
+        with open(faninPath + ".dd", "wt") as dyndepFile:
+            dyndepFile.write("ninja_dyndep_version = 1\n")
+            dyndepFile.write("build %s" % escape_ninja_path(faninPath))
+            if outputList:
+                dyndepFile.write(" | %s" % " ".join([escape_ninja_path(path) for path in outputList]))
+            dyndepFile.write(": dyndep\n")
+
+        with open(faninPath, "wt") as faninFile:
+            faninFile.write("1")
+
     os.chdir(workingDir)
     if not os.path.exists(outputDir):
         os.makedirs(outputDir)
@@ -117,6 +133,9 @@ if __name__ == '__main__':
         java_compile(outputList)
     elif subCommand == "fanin":
         generate_fanin_file(outputList)
+    elif subCommand == "dyndep":
+        java_compile(outputList)
+        generate_dyndep_file()
     else:
         print("error: unknown subCommand")
         sys.exit(1)
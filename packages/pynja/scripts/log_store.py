@@ -0,0 +1,116 @@
+import os
+import time
+
+
+# A log store holds the tool output of every edge of a build in two files,
+# instead of one .log file per edge:
+#   <store>/data    the outputs, appended one after another
+#   <store>/index   one line per record: "offset size exitcode time key"
+# The key is the path of the edge's output.  A key's latest record is its
+# current one; compact() drops the others.  Appends are serialized by a lock
+# on the index, so edges that run in parallel can share a store.
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock(file):
+        # LK_LOCK gives up after 10 attempts, a second apart
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass
+
+    def _unlock(file):
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(file):
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(file):
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class LogRecord:
+    __slots__ = ("key", "offset", "size", "exitcode", "time")
+
+    def __init__(self, key, offset, size, exitcode, recordTime):
+        self.key = key
+        self.offset = offset
+        self.size = size
+        self.exitcode = exitcode
+        self.time = recordTime
+
+
+def _format_index_line(offset, size, exitcode, recordTime, key):
+    return ("%d %d %d %d %s\n" % (offset, size, exitcode, recordTime, key)).encode("utf-8", "surrogateescape")
+
+
+def write_log(storePath, logDest, exitcode, contents):
+    """Writes contents as the log of an edge, to the .log file logDest, or with a storePath, to the record keyed by logDest."""
+    if storePath == None:
+        with open(logDest, "wt") as logFile:
+            logFile.write(contents)
+    else:
+        append_record(storePath, logDest, exitcode, contents.encode("utf-8", "replace"))
+
+
+def append_record(storePath, key, exitcode, data):
+    if not os.path.isdir(storePath):
+        os.makedirs(storePath, exist_ok=True)
+    with open(os.path.join(storePath, "index"), "ab") as indexFile:
+        _lock(indexFile)
+        try:
+            with open(os.path.join(storePath, "data"), "ab") as dataFile:
+                offset = dataFile.seek(0, os.SEEK_END)
+                dataFile.write(data)
+            indexFile.seek(0, os.SEEK_END)
+            indexFile.write(_format_index_line(offset, len(data), exitcode, int(time.time()), key))
+            indexFile.flush()
+        finally:
+            _unlock(indexFile)
+
+
+def read_index(storePath):
+    """Returns a map of key -> the latest LogRecord of that key."""
+    records = {}
+    try:
+        with open(os.path.join(storePath, "index"), "rb") as indexFile:
+            # an append that was interrupted leaves a partial last line
+            lines = indexFile.read().decode("utf-8", "surrogateescape").split("\n")[:-1]
+    except FileNotFoundError:
+        return records
+    for line in lines:
+        fields = line.split(" ", 4)
+        if len(fields) == 5:
+            offset, size, exitcode, recordTime, key = fields
+            records[key] = LogRecord(key, int(offset), int(size), int(exitcode), int(recordTime))
+    return records
+
+
+def read_record(storePath, record):
+    with open(os.path.join(storePath, "data"), "rb") as dataFile:
+        dataFile.seek(record.offset)
+        return dataFile.read(record.size).decode("utf-8", "replace")
+
+
+def compact(storePath):
+    """Rewrites the store with only the latest record of each key; must not run during a build."""
+    records = read_index(storePath)
+    dataPath = os.path.join(storePath, "data")
+    indexPath = os.path.join(storePath, "index")
+    with open(dataPath, "rb") as dataFile, open(dataPath + ".tmp", "wb") as newDataFile, open(indexPath + ".tmp", "wb") as newIndexFile:
+        for key in sorted(records):
+            record = records[key]
+            dataFile.seek(record.offset)
+            data = dataFile.read(record.size)
+            offset = newDataFile.tell()
+            newDataFile.write(data)
+            newIndexFile.write(_format_index_line(offset, len(data), record.exitcode, record.time, key))
+    os.replace(dataPath + ".tmp", dataPath)
+    os.replace(indexPath + ".tmp", indexPath)
@@ -2,54 +2,44 @@ import os
 import sys
 import re
 import msvc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, srcPath, outputPath, pdbPath, depPath, logPath, installDir, arch, rspPath, msvcVer = sys.argv
+    script, workingDir, srcPath, outputPath, pdbPath, depPath, logPath, installDir, arch, rspPath, msvcVer = invoke_common.parse_argv(sys.argv)
 
+    _includePattern = re.compile("Note: including file: *(.*)")
+
+
+    def is_diagnostic(line):
+        return (" error " in line) or (" warning " in line)
 
-    def shell_escape_path(path):
-        return path.replace(" ", "\\ ")
 
 
     def cpp_compile():
         createPCH = outputPath.endswith(".pch")
         if createPCH:
             objectPath = outputPath + ".obj"
-            extraOptions = "/Fp\"%s\"" % outputPath
+            extraOptions = ["/Fp" + outputPath]
         else:
             objectPath = outputPath
-            extraOptions = ""
-
-        cmd = "cl /showIncludes \"%s\" \"@%s\" \"/Fo%s\" \"/Fd%s\" %s > \"%s\" 2>&1" % (srcPath, rspPath, objectPath, pdbPath, extraOptions, logPath)
-        exitcode = os.system(cmd)
-
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        needToPrintLog = not not exitcode
-        # write out deps file, and determine if an error or warning occurred
-        with open(depPath, "wt") as depFile:
-            outputPathEsc = shell_escape_path(outputPath)
-            depFile.write("%s: \\\n" % outputPathEsc)
-            for logLine in logContents.splitlines():
-                if " error " in logLine:
-                    needToPrintLog = True
-                elif " warning " in logLine:
-                    if not ("D9035" in logLine): # ignore: Command line warning D9035 : option 'Yd' has been deprecated
-                        needToPrintLog = True
-                else:
-                    match = re.match("Note: including file: ([ ]*)(.*)", logLine)
-                    if match:
-                        incPath = os.path.normpath(match.group(2))
-                        depEsc = shell_escape_path(incPath)
-                        depFile.write("%s \\\n" % depEsc)
-        if needToPrintLog:
-            for logLine in logContents.splitlines():
-                if "D9035" in logLine:
-                    continue
-                if "Note: including file: " in logLine:
-                    continue
-                print(logLine)
+            extraOptions = []
+
+        args = ["cl", "/showIncludes", srcPath, "@" + rspPath, "/Fo" + objectPath, "/Fd" + pdbPath] + extraOptions
+        includePaths = []
+
+        def filter_line(line):
+            # the includes go to the deps instead of the log
+            match = _includePattern.match(line)
+            if match:
+                includePaths.append(os.path.normpath(match.group(1).rstrip()))
+                return None
+            if "D9035" in line: # ignore: Command line warning D9035 : option 'Yd' has been deprecated
+                return None
+            return line
+
+        exitcode = invoke_common.run_tool(args, logPath, isDiagnostic=is_diagnostic, lineFilter=filter_line)
+        msvc_common.write_deps(depPath, outputPath, includePaths)
         if exitcode:
             sys.exit(exitcode)
 
@@ -1,11 +1,11 @@
 import os
 import sys
-import re
 import msvc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, logPath, installDir, arch, rspPath = sys.argv
+    script, workingDir, logPath, installDir, arch, rspPath = invoke_common.parse_argv(sys.argv)
 
 
     def shell_escape_path(path):
@@ -13,12 +13,7 @@ if __name__ == '__main__':
 
 
     def link():
-        cmd = "link \"@%s\" > \"%s\" 2>&1 " % (rspPath, logPath)
-        exitcode = os.system(cmd)
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("(warning)|(error)", logContents, re.MULTILINE):
-            print("%s" % logContents)
+        exitcode = invoke_common.run_tool(["link", "@" + rspPath], logPath)
         if exitcode:
             sys.exit(exitcode)
 
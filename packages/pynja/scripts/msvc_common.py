@@ -1,6 +1,23 @@
 import os
 
 
+# The prefix of the include lines that ninja parses for "deps = msvc"; the msvc
+# toolchain sets msvc_deps_prefix to the same string.
+DEPS_PREFIX = "Note: including file: "
+
+
+def write_deps(depPath, outputPath, includePaths):
+    """Writes a make-style depfile; if depPath is "-", prints the includes for ninja's deps log instead."""
+    if depPath == "-":
+        for incPath in includePaths:
+            print(DEPS_PREFIX + incPath)
+        return
+    with open(depPath, "wt") as depFile:
+        depFile.write("%s: \\\n" % outputPath.replace(" ", "\\ "))
+        for incPath in includePaths:
+            depFile.write("%s \\\n" % incPath.replace(" ", "\\ "))
+
+
 def is_os_64bit():
     arch1 = (os.environ.get('PROCESSOR_ARCHITECTURE') or "").lower()
     arch2 = (os.environ.get('PROCESSOR_ARCHITEW6432') or "").lower()
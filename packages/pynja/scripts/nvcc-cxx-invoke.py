@@ -1,11 +1,11 @@
 import os
 import sys
-import re
 import nvcc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, srcPath, objPath, depPath, logPath, installDir, hostCompiler, hostInstallDir, addressModel, rspPath = sys.argv
+    script, workingDir, srcPath, objPath, depPath, logPath, installDir, hostCompiler, hostInstallDir, addressModel, rspPath = invoke_common.parse_argv(sys.argv)
 
     srcPathEsc = nvcc_common.escape_path(srcPath)
     rspPathEsc = nvcc_common.escape_path(rspPath)
@@ -13,14 +13,16 @@ if __name__ == '__main__':
     depPathEsc = nvcc_common.escape_path(depPath)
 
 
-    def generate_deps():
+    def get_force_compiler_options():
         if "msvc" in hostCompiler:
-            forceCompilerOption = nvcc_common.calc_msvc_options(hostCompiler)
-        else:
-            forceCompilerOption = ""
+            return nvcc_common.calc_msvc_options(hostCompiler).split()
+        return []
+
+
+    def generate_deps(output):
         tempDepPath = depPathEsc + ".tmp"
-        cmd = "nvcc -M %s \"%s\" -optf \"%s\" -o \"%s\" > \"%s\" 2>&1" % (forceCompilerOption, srcPathEsc, rspPathEsc, tempDepPath, logPath)
-        exitcode = os.system(cmd)
+        args = ["nvcc", "-M"] + get_force_compiler_options() + [srcPathEsc, "-optf", rspPathEsc, "-o", tempDepPath]
+        exitcode = output.run(args)
 
         if os.path.exists(depPath + ".tmp"):
             with open(tempDepPath, "rt") as tempDepFile:
@@ -31,25 +33,15 @@ if __name__ == '__main__':
             with open(depPath, "wt") as depFile:
                 depFile.writelines(depLines)
 
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("(warning)|(error)", logContents, re.MULTILINE):
-            print("%s" % logContents)
         if exitcode:
+            output.finish(logPath, exitcode)
             sys.exit(exitcode)
 
 
-    def cpp_compile():
-        if "msvc" in hostCompiler:
-            forceCompilerOption = nvcc_common.calc_msvc_options(hostCompiler)
-        else:
-            forceCompilerOption = ""
-        cmd = "nvcc -c %s \"%s\" -optf \"%s\" -o \"%s\" > \"%s\" 2>&1" % (forceCompilerOption, srcPathEsc, rspPathEsc, objPathEsc, logPath)
-        exitcode = os.system(cmd)
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("(warning)|(error)", logContents, re.MULTILINE):
-            print("%s" % logContents)
+    def cpp_compile(output):
+        args = ["nvcc", "-c"] + get_force_compiler_options() + [srcPathEsc, "-optf", rspPathEsc, "-o", objPathEsc]
+        exitcode = output.run(args)
+        output.finish(logPath, exitcode)
         if exitcode:
             sys.exit(exitcode)
 
@@ -58,6 +50,8 @@ if __name__ == '__main__':
 
     nvcc_common.set_nvcc_environment(installDir, hostCompiler, hostInstallDir, addressModel)
 
-    generate_deps()
-    cpp_compile()
+    # one log for both runs
+    output = invoke_common.ToolOutput()
+    generate_deps(output)
+    cpp_compile(output)
     sys.exit(0)
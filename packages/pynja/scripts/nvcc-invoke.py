@@ -1,26 +1,20 @@
 import os
 import sys
-import re
 import nvcc_common
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, workingDir, logPath, installDir, hostCompiler, hostInstallDir, addressModel, rspPath = sys.argv
+    script, workingDir, logPath, installDir, hostCompiler, hostInstallDir, addressModel, rspPath = invoke_common.parse_argv(sys.argv)
 
     rspPathEsc = nvcc_common.escape_path(rspPath)
 
 
     def invoke():
+        forceCompilerOptions = []
         if "msvc" in hostCompiler:
-            forceCompilerOption = nvcc_common.calc_msvc_options(hostCompiler)
-        else:
-            forceCompilerOption = ""
-        cmd = "nvcc %s -optf \"%s\" > \"%s\" 2>&1" % (forceCompilerOption, rspPathEsc, logPath)
-        exitcode = os.system(cmd)
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-        if re.search("(warning)|(error)", logContents, re.MULTILINE):
-            print("%s" % logContents)
+            forceCompilerOptions = nvcc_common.calc_msvc_options(hostCompiler).split()
+        exitcode = invoke_common.run_tool(["nvcc"] + forceCompilerOptions + ["-optf", rspPathEsc], logPath)
         if exitcode:
             sys.exit(exitcode)
 
@@ -1,9 +1,11 @@
 import os
 import sys
+import shlex
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, protocPath, workingDir, sourcePath, outputPath, depPath, logPath, rspPath = sys.argv
+    script, protocPath, workingDir, sourcePath, outputPath, depPath, logPath, rspPath = invoke_common.parse_argv(sys.argv)
 
 
     def shell_escape_path(path):
@@ -62,12 +64,14 @@ if __name__ == '__main__':
 
     def invoke(optionsStr):
         sanitizedOptionsStr = optionsStr.replace("|||", " ").replace("\n", " ")
-        cmd = "%s %s \"%s\" > \"%s\" 2>&1" % (protocPath, sanitizedOptionsStr, sourcePath, logPath)
-        exitcode = os.system(cmd)
+        # the options are quoted as for a shell; on Windows, the command line is
+        # passed as-is, and protoc parses it
+        if os.name == 'nt':
+            args = "\"%s\" %s \"%s\"" % (protocPath, sanitizedOptionsStr, sourcePath)
+        else:
+            args = [protocPath] + shlex.split(sanitizedOptionsStr) + [sourcePath]
+        exitcode = invoke_common.run_tool(args, logPath, isDiagnostic=None)
         if exitcode:
-            with open(logPath, "rt") as logFile:
-                logContents = logFile.read()
-                print(logContents)
             sys.exit(exitcode)
 
 
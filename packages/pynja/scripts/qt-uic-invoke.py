@@ -1,10 +1,10 @@
 import os
 import sys
-import re
+import invoke_common
 
 
 if __name__ == '__main__':
-    script, qtBinDir, workingDir, sourcePath, outputPath, logPath = sys.argv
+    script, qtBinDir, workingDir, sourcePath, outputPath, logPath = invoke_common.parse_argv(sys.argv)
 
     os.chdir(workingDir)
     outputDir = os.path.dirname(outputPath)
@@ -14,11 +14,6 @@ if __name__ == '__main__':
     oldPathEnv = os.environ['PATH']
     os.environ['PATH'] = "%s%s%s" % (qtBinDir, os.pathsep, oldPathEnv)
 
-    cmd = "uic \"%s\" -o \"%s\" 2>\"%s\"" % (sourcePath, outputPath, logPath)
-    exitcode = os.system(cmd)
-    if exitcode:
-        with open(logPath, "rt") as logFile:
-            logContents = logFile.read()
-            print("%s" % logContents)
+    exitcode = invoke_common.run_tool(["uic", sourcePath, "-o", outputPath], logPath, isDiagnostic=None)
 
     sys.exit(exitcode)
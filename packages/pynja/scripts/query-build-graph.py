@@ -0,0 +1,112 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from pynja import build_graph
+
+
+# Queries a build graph saved by regenerate_build(..., graph = True).
+#
+#   python query-build-graph.py <build.ninja.graph> <command> [args]
+#
+#   Commands:
+#       producer PATH           the edge that outputs PATH
+#       consumers PATH          outputs of the edges that have PATH as an input
+#       deps PATH               all inputs PATH transitively depends on
+#       rdeps PATH              all outputs that transitively depend on PATH
+#       affected [PATH...]      all outputs that rebuild if any PATH changes;
+#                               reads paths from stdin if none are given
+#       phony [NAME]            the members of phony target NAME, or all phony target names
+#       edges PROJECT [VARIANT] the outputs of a project's edges; PROJECT may be '*'
+#       duplicates              outputs produced by more than one edge
+
+# map command -> (min, max) argument count; None is unbounded
+_argCounts = {
+    "producer" : (1, 1),
+    "consumers" : (1, 1),
+    "deps" : (1, 1),
+    "rdeps" : (1, 1),
+    "affected" : (0, None),
+    "phony" : (0, 1),
+    "edges" : (1, 2),
+    "duplicates" : (0, 0),
+}
+
+
+def _print_edge(edge):
+    print("%s : %s" % (" ".join(edge.get_outputs()), edge.rule))
+    if edge.projName:
+        print("  project  = %s %s" % (edge.projName, edge.variantName))
+    for name in ("inputs", "implicit", "orderOnly"):
+        for path in getattr(edge, name):
+            print("  %-8s = %s" % (name, path))
+
+
+def _print_paths(paths):
+    for path in sorted(paths):
+        print(path)
+
+
+def _abs_paths(paths):
+    # phony target names are kept as-is
+    return [os.path.abspath(path) if os.sep in path or '/' in path else path for path in paths]
+
+
+def _check_arg_count(command, argCount):
+    minCount, maxCount = _argCounts.get(command, (0, None))
+    return (argCount >= minCount) and ((maxCount == None) or (argCount <= maxCount))
+
+
+def main(argv):
+    if (len(argv) < 2) or not _check_arg_count(argv[1], len(argv) - 2):
+        print("usage: python query-build-graph.py <build.ninja.graph> <command> [args]")
+        return 2
+    graph = build_graph.load(argv[0])
+    command = argv[1]
+    args = _abs_paths(argv[2:])
+    if command == "producer":
+        edge = graph.get_producer(args[0])
+        if not edge:
+            print("%s is not generated" % args[0])
+            return 1
+        _print_edge(edge)
+    elif command == "consumers":
+        for edge in graph.get_consumers(args[0]):
+            print(" ".join(edge.get_outputs()))
+    elif command == "deps":
+        _print_paths(graph.get_deps(args[0]))
+    elif command == "rdeps":
+        _print_paths(graph.get_rdeps(args[0]))
+    elif command == "affected":
+        paths = args or _abs_paths([line.strip() for line in sys.stdin if line.strip()])
+        _print_paths(graph.get_affected(paths))
+    elif command == "phony":
+        if args:
+            edge = graph.get_phony_target(args[0])
+            if not edge:
+                print("unknown phony target %s" % args[0])
+                return 1
+            _print_paths(edge.inputs)
+        else:
+            _print_paths(graph.get_phony_target_names())
+    elif command == "edges":
+        projName = argv[2] if argv[2] != '*' else None
+        variantName = argv[3] if len(argv) > 3 else None
+        for edge in graph.get_edges(projName, variantName):
+            print(" ".join(edge.get_outputs()))
+    elif command == "duplicates":
+        duplicates = graph.get_duplicate_outputs()
+        for output in sorted(duplicates):
+            print(output)
+            for edge in duplicates[output]:
+                print("  %s (%s %s)" % (edge.rule, edge.projName, edge.variantName))
+        if duplicates:
+            return 1
+    else:
+        print("unknown command %s" % command)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
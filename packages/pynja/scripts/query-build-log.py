@@ -0,0 +1,76 @@
+import sys
+import os
+import re
+import time
+import log_store
+
+
+# Queries the tool output stored in a log store; see ToolChain.logStorePath.
+#
+#   python query-build-log.py <store> <command> [args]
+#
+#   Commands:
+#       show PATH...            the output of the edges that output PATH; a PATH that
+#                               is not a key matches the keys that end with it
+#       list                    the key, exit code and time of every edge's latest run
+#       failed                  the output of every edge whose latest run failed
+#       grep PATTERN            the keys of the outputs with a line that matches PATTERN
+#       compact                 drops superseded records; do not run during a build
+
+def _print_record(storePath, record):
+    print("==== %s (exit code %d)" % (record.key, record.exitcode))
+    sys.stdout.write(log_store.read_record(storePath, record))
+
+
+def _find_records(records, path):
+    record = records.get(os.path.abspath(path))
+    if record:
+        return [record]
+    suffix = path.replace("\\", "/")
+    return [records[key] for key in sorted(records) if key.replace("\\", "/").endswith("/" + suffix)]
+
+
+def main(argv):
+    if (len(argv) < 2) or ((argv[1] == "grep") and (len(argv) != 3)):
+        print("usage: python query-build-log.py <store> <command> [args]")
+        return 2
+    storePath = argv[0]
+    command = argv[1]
+    args = argv[2:]
+    if command == "compact":
+        log_store.compact(storePath)
+        return 0
+    records = log_store.read_index(storePath)
+    if command == "show":
+        status = 0
+        for path in args:
+            found = _find_records(records, path)
+            if not found:
+                print("no output stored for %s" % path)
+                status = 1
+            for record in found:
+                _print_record(storePath, record)
+        return status
+    elif command == "list":
+        for key in sorted(records):
+            record = records[key]
+            print("%3d  %s  %s" % (record.exitcode, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.time)), key))
+    elif command == "failed":
+        failed = [records[key] for key in sorted(records) if records[key].exitcode]
+        for record in failed:
+            _print_record(storePath, record)
+        if failed:
+            return 1
+    elif command == "grep":
+        pattern = re.compile(args[0])
+        for key in sorted(records):
+            if pattern.search(log_store.read_record(storePath, records[key])):
+                print(key)
+    else:
+        print("unknown command %s" % command)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
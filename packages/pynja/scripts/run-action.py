@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import stat
+import zlib
+import _socket      # the socket module imports enum, selectors and more; this client only needs the C module
+
+
+# Runs a wrapper script of this directory through the action runner
+# (action_runner.py), which is started on first use:
+#     python -S run-action.py <script> <args>...
+# The request is the working directory, the script, its arguments and the
+# environment; the script's output goes straight to this process's stdout and
+# stderr, and its exit code becomes this process's.  Each runner is keyed by the
+# python version and the scripts' mtimes, so editing a script starts a new runner
+# and the old one exits once idle.  Without Unix sockets, or if no runner starts,
+# the script runs in this process.  A runner that fails to start leaves a
+# <sockPath>.failed marker, so that the edges that follow run in-process at once
+# instead of waiting for START_TIMEOUT each.
+
+START_TIMEOUT = 10      # seconds to wait for a runner to accept the request
+FAILED_RETRY = 600      # seconds after a failed start before trying to start a runner again
+RUN_LOCALLY = "local"   # returned by run_remote() when the runner cannot handle the request
+
+_scriptDir = os.path.dirname(os.path.abspath(__file__))
+_runnerScript = os.path.join(_scriptDir, "action_runner.py")
+
+
+def get_sock_path():
+    """Returns the path of the runner socket, or None if there is no private directory for it."""
+    runDir = os.path.join(os.environ.get("TMPDIR") or "/tmp", "pynja-runner-%d" % os.getuid())
+    try:
+        os.mkdir(runDir, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    # anyone who can connect can run code as this user
+    st = os.lstat(runDir)
+    if (not stat.S_ISDIR(st.st_mode)) or (st.st_uid != os.getuid()) or (st.st_mode & 0o077):
+        return None
+    key = [sys.version, _scriptDir]
+    with os.scandir(_scriptDir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".py"):
+                key.append("%s %d" % (entry.name, entry.stat().st_mtime_ns))
+    key.sort()
+    return os.path.join(runDir, "%08x.sock" % zlib.crc32("\n".join(key).encode("utf-8", "surrogateescape")))
+
+
+def start_runner(sockPath):
+    fileActions = [
+        (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+        (os.POSIX_SPAWN_OPEN, 1, sockPath + ".log", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600),
+        (os.POSIX_SPAWN_DUP2, 1, 2),
+    ]
+    return os.posix_spawn(sys.executable, [sys.executable, _runnerScript, "serve", sockPath], os.environ, file_actions=fileActions, setsid=True)
+
+
+def runner_failed(pid):
+    """Returns True if the runner process pid exited with an error; reaps it if it exited.
+
+    A runner that loses the start race exits successfully.
+    """
+    try:
+        exitedPid, status = os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        return False
+    return (exitedPid == pid) and (status != 0)
+
+
+def has_start_failed(sockPath):
+    try:
+        return time.time() - os.stat(sockPath + ".failed").st_mtime < FAILED_RETRY
+    except OSError:
+        return False
+
+
+def record_start_failure(sockPath):
+    with open(sockPath + ".failed", "w"):
+        pass
+    print("run-action: the action runner did not start; see %s.log.  Running scripts in-process." % sockPath, file=sys.stderr)
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def run_remote(sockPath, scriptPath, args):
+    """Returns the exit code of the script, None if no runner accepted the request, or RUN_LOCALLY."""
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(sockPath)
+            fields = [os.getcwd(), scriptPath, str(len(args))] + args + ["%s=%s" % item for item in os.environ.items()]
+            data = "\0".join(fields).encode("utf-8", "surrogateescape")
+            fds = b"".join([fd.to_bytes(4, sys.byteorder) for fd in (0, 1, 2)])
+            sock.sendmsg([len(data).to_bytes(4, "little")], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+            sock.sendall(data)
+            reply = sock.recv(1)
+            if reply == b"F":
+                return RUN_LOCALLY
+            if reply != b"S":
+                return None
+        except OSError:
+            return None
+        status = recv_exactly(sock, 4)
+        if len(status) != 4:
+            print("run-action: the action runner exited while running %s" % scriptPath, file=sys.stderr)
+            return 1
+        return int.from_bytes(status, "little", signed=True)
+    finally:
+        sock.close()
+
+
+def run_in_process(scriptPath, args):
+    import runpy
+    sys.argv = [scriptPath] + args
+    runpy.run_path(scriptPath, run_name="__main__")
+
+
+if __name__ == '__main__':
+    scriptPath = os.path.abspath(sys.argv[1])
+    args = sys.argv[2:]
+
+    sockPath = None
+    # the runner uses socket.recv_fds() and os.waitstatus_to_exitcode(), new in 3.9
+    if hasattr(_socket, "AF_UNIX") and hasattr(os, "posix_spawn") and (sys.version_info >= (3, 9)):
+        sockPath = get_sock_path()
+    if sockPath and not has_start_failed(sockPath):
+        deadline = time.monotonic() + START_TIMEOUT
+        lastStart = None
+        runnerPid = None
+        delay = 0.002
+        while True:
+            code = run_remote(sockPath, scriptPath, args)
+            if code == RUN_LOCALLY:
+                break
+            if code != None:
+                sys.exit(code if code >= 0 else 128 - code)
+            if (runnerPid and runner_failed(runnerPid)) or (time.monotonic() >= deadline):
+                record_start_failure(sockPath)
+                break
+            if has_start_failed(sockPath):
+                break
+            # a runner that loses the start race exits at once; so does one whose
+            # predecessor still holds the lock while shutting down, hence the restarts
+            if (lastStart == None) or (time.monotonic() - lastStart > 0.5):
+                runnerPid = start_runner(sockPath)
+                lastStart = time.monotonic()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+    run_in_process(scriptPath, args)
@@ -1,9 +1,151 @@
+import os
 from . import io
 
+def emit_tool_edge(project, toolchain, outputs, rule, pool = None, **kwargs):
+    """Emits a build edge that runs a tool; kwargs are as for NinjaWriter.build.
+
+    With toolchain.compactEdges, only outputs[0] is an explicit output, so that
+    compact rules can refer to it as $out; the other outputs become implicit outputs.
+    If pool is set, the edge runs in that ninja pool.
+    """
+    if pool:
+        kwargs["variables"] = tuple(kwargs.get("variables", ())) + (("pool", pool),)
+    if toolchain.compactEdges:
+        project.projectMan.ninjaFile.build(project, outputs[:1], rule, implicitOutputs = outputs[1:], **kwargs)
+    else:
+        project.projectMan.ninjaFile.build(project, outputs, rule, **kwargs)
+
+def get_task_pool(project, task, defaultPool = None):
+    """Returns the pool of task's edges: task.pool, or else defaultPool if it was added; see ProjectMan.add_pool()."""
+    return project.projectMan.get_pool(task.pool, defaultPool)
+
+def get_link_pool(project, task):
+    return get_task_pool(project, task, "lto-link" if task.lto else "link")
+
 def write_rsp_file(project, task, options, rspPath = None, joinStr = " \n"):
     rspContents = joinStr.join(options)
     if not rspPath:
         rspPath = task.outputPath + ".rsp"
-    io.write_file_if_different(rspPath, rspContents)
+    # A reused subninja file already references an up-to-date response file.
+    written = False
+    if not (project._subninjaReused and os.path.exists(rspPath)):
+        written = io.write_file_if_different(rspPath, rspContents)
+    profiler = project.projectMan.profiler
+    if profiler:
+        profiler.rsp_file(project, rspPath, written)
 
     project.makeFiles.append(rspPath)
+
+def emit_rsp_file(project, toolchain, task, options):
+    """Provides the response file of the edge that runs task.
+
+    Returns (implicit, variables): the implicit dependencies and the variables
+    to add to the edge.  With toolchain.rspInManifest, the options are stored in
+    the manifest and ninja writes the response file when the edge runs.  Ninja
+    hashes rspfile_content together with the command, so changed options still
+    cause a rebuild.
+    """
+    if toolchain.rspInManifest:
+        rspContents = " ".join(options).replace("\n", " ").replace("$", "$$")
+        return [], (("RSP_CONTENT", rspContents),)
+    write_rsp_file(project, task, options)
+    return [task.outputPath + ".rsp"], ()
+
+def share_compile(project, toolchain, task, rule, options):
+    """Returns True if an identical compile was already emitted; see ProjectMan.shareCompiles.
+
+    Compiles are identical if they have the same rule, options, source, working
+    directory and dependencies.  A shared task's outputPath, and the project's
+    link input, are redirected to the object of the first identical compile.
+    """
+    projectMan = project.projectMan
+    if not projectMan.shareCompiles or task.createPCH or task.extraOutputs:
+        return False
+    key = (rule, tuple(options), task.sourcePath, task.workingDir, tuple(task.extraDeps), tuple(task.orderOnlyDeps))
+    sharedPath = projectMan.get_shared_compile_output(key, task.outputPath)
+    if sharedPath == task.outputPath:
+        return False
+    inputs = project._inputs
+    if task.outputPath in inputs:
+        inputs[inputs.index(task.outputPath)] = sharedPath
+    task.outputPath = sharedPath
+    return True
+
+def share_generated_output(project, task, toolName, builtDir, key, pathSlots = ("outputPath",)):
+    """Moves the outputs of a code generator task to a shared directory; see ProjectMan.shareGeneratedSources.
+
+    key identifies the generator's command, excluding output paths.  The paths
+    in pathSlots and task.extraOutputs keep their location relative to builtDir.
+    The directory of task.outputPath is added to project.includePaths, so that
+    generated headers are found as before.
+    """
+    projectMan = project.projectMan
+    if not projectMan.shareGeneratedSources:
+        return
+    sharedDir = projectMan.get_shared_output_dir(toolName, key)
+    def relocate(path):
+        return os.path.join(sharedDir, os.path.relpath(path, builtDir))
+    for slot in pathSlots:
+        setattr(task, slot, relocate(getattr(task, slot)))
+    task.extraOutputs = [relocate(path) for path in task.extraOutputs]
+    includeDir = os.path.dirname(task.outputPath)
+    if includeDir not in project.includePaths:
+        project.includePaths.append(includeDir)
+
+def claim_generated_output(project, task, rule, options):
+    """Returns False if an earlier variant already emitted the edge that generates task's shared outputs."""
+    projectMan = project.projectMan
+    if not projectMan.shareGeneratedSources:
+        return True
+    return projectMan.claim_generated_output(task.outputPath, (rule, tuple(options), task.sourcePath, tuple(task.extraDeps)))
+
+def depfile_rule_variables(toolchain, depFile):
+    """Returns the rule variables that make ninja read the make-style depfile of an edge.
+
+    With toolchain.useDepsLog, ninja stores the dependencies in its deps log and
+    deletes depFile.
+    """
+    if toolchain.useDepsLog:
+        return (("depfile", depFile), ("deps", "gcc"))
+    return (("depfile", depFile),)
+
+def log_rule_arg(toolchain, logFile = "\"$LOG_FILE\"", key = "\"$LOG_KEY\""):
+    """Returns the script arguments of a rule that say where the tool output of an edge goes.
+
+    That is logFile, or with toolchain.logStorePath, the store option followed by
+    key, the key of the edge's record in the log store; see invoke_common.parse_argv().
+    Edges bind the variable with log_edge_variable().
+    """
+    if toolchain.logStorePath:
+        return "--log-store \"%s\"  %s" % (toolchain.logStorePath.replace("$", "$$"), key)
+    return logFile
+
+def log_edge_variable(toolchain, outputPath):
+    """Returns the edge variable for log_rule_arg(); outputPath is already translated."""
+    if toolchain.logStorePath:
+        return ("LOG_KEY", outputPath)
+    return ("LOG_FILE", outputPath + ".log")
+
+def get_log_outputs(toolchain, outputPath):
+    """Returns the log files that an edge outputs, which the log store does without."""
+    if toolchain.logStorePath:
+        return []
+    return [outputPath + ".log"]
+
+_runActionScript = os.path.join(os.path.dirname(__file__), "scripts", "run-action.py")
+
+def get_script_command(toolchain, scriptPath):
+    """Returns the start of a rule command that runs the python script at scriptPath.
+
+    With toolchain.useActionRunner, the script runs in a forked child of a
+    long-lived runner process; see scripts/action_runner.py.
+    """
+    if toolchain.useActionRunner:
+        return "python -S \"%s\"  \"%s\"" % (_runActionScript, scriptPath)
+    return "python \"%s\"" % scriptPath
+
+def rsp_rule_variables(toolchain, rspFile):
+    """Returns the rule variables that make ninja write rspFile, for use with emit_rsp_file."""
+    if toolchain.rspInManifest:
+        return (("rspfile", rspFile), ("rspfile_content", "$RSP_CONTENT"))
+    return ()
@@ -1,5 +1,6 @@
 import os
 from .tc import *
+from .option_list import translate_option_list
 from . import build
 
 
@@ -34,29 +34,101 @@ class GccToolChain(CppToolChain):
         self._link_script = os.path.join(self._scriptDir, "gcc-link-invoke.py")
         # Conservatively set LTO support to False.
         self.ltoSupport = False
+        # If True, rules run the compiler, archiver and linker directly from a shell
+        # command that sets PATH, instead of through the python scripts.  There are no
+        # .log files; ninja buffers and prints the tool output.  Requires a POSIX host.
+        self.directInvoke = False
+
+    def get_identity_paths(self):
+        binDir = os.path.join(self.installDir, "bin")
+        return [os.path.join(binDir, "%s%s%s" % (self.prefix, toolName, self.suffix)) for toolName in ("g++", "ar")]
 
     def emit_rules(self, ninjaFile):
         arName = "%sar%s" % (self.prefix, self.suffix)
 
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# %s\n" % self.name)
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_cxx\n" % self.name)
-        ninjaFile.write("  depfile = $DEP_FILE\n")
-        ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OBJ_FILE\"  \"$DEP_FILE\"  \"$LOG_FILE\"  \"%s\"  $TOOL_NAME  \"$RSP_FILE\"\n" % (self._cxx_script, self.installDir))
-        ninjaFile.write("  description = %s_cxx  $DESC\n" % self.name)
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_lib\n" % self.name)
-        ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$LOG_FILE\"  \"%s\"  %s  \"$RSP_FILE\"\n" % (self._lib_script, self.installDir, arName))
-        ninjaFile.write("  description = %s_lib  $DESC\n" % self.name)
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_link\n" % self.name)
-        ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$LOG_FILE\"  \"%s\"  $TOOL_NAME  \"$RSP_FILE\"\n" % (self._link_script, self.installDir))
-        ninjaFile.write("  description = %s_link $DESC\n" % self.name)
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
+        ninjaFile.banner(self.name)
+        if self.directInvoke:
+            self._emit_direct_rules(ninjaFile, arName)
+            return
+        if self.compactEdges:
+            self._emit_compact_rules(ninjaFile, arName)
+            return
+        ninjaFile.rule("%s_cxx" % self.name, depfile_rule_variables(self, "$DEP_FILE") + (
+            ("command", "%s  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OBJ_FILE\"  \"$DEP_FILE\"  %s  \"%s\"  $TOOL_NAME  \"$RSP_FILE\"" % (get_script_command(self, self._cxx_script), log_rule_arg(self), self.installDir)),
+            ("description", "%s_cxx  $DESC" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$RSP_FILE"))
+        ninjaFile.rule("%s_lib" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  \"$RSP_FILE\"" % (get_script_command(self, self._lib_script), log_rule_arg(self), self.installDir, arName)),
+            ("description", "%s_lib  $DESC" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$RSP_FILE"))
+        ninjaFile.rule("%s_link" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  $TOOL_NAME  \"$RSP_FILE\"" % (get_script_command(self, self._link_script), log_rule_arg(self), self.installDir)),
+            ("description", "%s_link $DESC" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$RSP_FILE"))
+
+    def _emit_compact_rules(self, ninjaFile, arName):
+        toolName = "%s%s%s" % (self.prefix, "g++", self.suffix)
+        ninjaFile.rule("%s_cxx" % self.name, depfile_rule_variables(self, "$out.d") + (
+            ("command", "%s  \"$WORKING_DIR\"  $in  $out  $out.d  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._cxx_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, toolName)),
+            ("description", "%s_cxx  $in" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$out.rsp"))
+        ninjaFile.rule("%s_lib" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._lib_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, arName)),
+            ("description", "%s_lib  $out" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$out.rsp"))
+        ninjaFile.rule("%s_link" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._link_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, toolName)),
+            ("description", "%s_link $out" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$out.rsp"))
+
+    def _emit_direct_rules(self, ninjaFile, arName):
+        if os.name == "nt":
+            raise Exception("%s: directInvoke requires a POSIX shell" % self.name)
+        if self.compactEdges:
+            # ninja shell-quotes $in and $out itself
+            toolName = "%s%s%s" % (self.prefix, "g++", self.suffix)
+            depFile, rspFile = "$out.d", "$out.rsp"
+            srcArg, outArg, depArg, rspArg = "$in", "$out", depFile, "@" + rspFile
+            compileDesc, desc = "$in", "$out"
+        else:
+            toolName = "$TOOL_NAME"
+            depFile, rspFile = "$DEP_FILE", "$RSP_FILE"
+            srcArg, outArg, depArg, rspArg = "\"$SRC_FILE\"", "\"$OBJ_FILE\"", "\"$DEP_FILE\"", "\"@$RSP_FILE\""
+            compileDesc, desc = "$DESC", "$DESC"
+        # the same working directory and PATH as gcc_common.set_gcc_environment()
+        env = "cd \"$WORKING_DIR\" && PATH=\"%s/bin:$$PATH\" exec" % self.installDir
+        ninjaFile.rule("%s_cxx" % self.name, depfile_rule_variables(self, depFile) + (
+            ("command", "%s %s %s %s -o%s -MD -MF %s" % (env, toolName, rspArg, srcArg, outArg, depArg)),
+            ("description", "%s_cxx  %s" % (self.name, compileDesc)),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, rspFile))
+        ninjaFile.rule("%s_lib" % self.name, (
+            ("command", "%s %s %s" % (env, arName, rspArg)),
+            ("description", "%s_lib  %s" % (self.name, desc)),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, rspFile))
+        ninjaFile.rule("%s_link" % self.name, (
+            ("command", "%s %s %s" % (env, toolName, rspArg)),
+            ("description", "%s_link %s" % (self.name, desc)),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, rspFile))
+
+    def _get_log_outputs(self, task):
+        # direct invocations write no log; ninja prints their output
+        if self.directInvoke:
+            return []
+        return get_log_outputs(self, task.outputPath)
+
+    def _get_script_deps(self, script):
+        if self.directInvoke:
+            return []
+        return [script]
 
 
     def translate_debug_level(self, options, task):
@@ -92,25 +164,31 @@ class GccToolChain(CppToolChain):
             options.append("-Werror")
 
     def translate_include_paths(self, options, task):
-        for includePath in task.includePaths:
+        def translate(includePath):
             if not includePath:
                 raise Exception("empty includePath set for: " + task.outputPath)
             includePathEsc = binutils_esc_path(includePath)
-            options.append("-I\"%s\"" % includePathEsc)
+            return "-I\"%s\"" % includePathEsc
+        translate_option_list(options, task.includePaths, (self, "includePaths"), translate)
 
     def translate_defines(self, options, task):
-        for define in task.defines:
+        def translate(define):
             if not define:
                 raise Exception("empty define set for: " + task.outputPath)
-            options.append("-D%s" % define)
+            return "-D%s" % define
+        translate_option_list(options, task.defines, (self, "defines"), translate)
 
     def translate_linker_inputs(self, options, task):
+        # -L applies to every -l on the command line, so each directory is passed once
+        libDirs = set()
         for input in task.inputs:
             libName = get_lib_name(input)
             if libName:
                 libDir = os.path.dirname(input)
-                libDirEsc = binutils_esc_path(libDir)
-                options.append("-L\"%s\"" % libDirEsc)
+                if libDir not in libDirs:
+                    libDirs.add(libDir)
+                    libDirEsc = binutils_esc_path(libDir)
+                    options.append("-L\"%s\"" % libDirEsc)
                 options.append("-l\"%s\"" % libName)
             else:
                 inputEsc = binutils_esc_path(input)
@@ -158,7 +236,9 @@ class GccToolChain(CppToolChain):
                 headerPathEsc = binutils_esc_path(task.usePCH)
                 task.extraDeps.append(task.usePCH)
             options.append("-include \"%s\"" % headerPathEsc)
-            options.append("-H")
+            if not self.directInvoke:
+                # logs the include tree, which shows whether the PCH was used
+                options.append("-H")
             options.append("-Winvalid-pch")
 
     def translate_dialect(self, options, task):
@@ -185,7 +265,9 @@ class GccToolChain(CppToolChain):
         # write response file
         options = []
         self.translate_cpp_options(options, task)
-        write_rsp_file(project, task, options)
+        if share_compile(project, self, task, "%s_cxx" % self.name, options):
+            return
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         if task.createPCH:
             # Create a copy of the source header, which will reside next to the
@@ -193,32 +275,31 @@ class GccToolChain(CppToolChain):
             project.projectMan.emit_copy(task.sourcePath, task.outputPath[:-4])
 
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        name = self.name
-        outputPath = build.xlat_path(project, task.outputPath)
-        sourcePath = build.xlat_path(project, task.sourcePath)
-        logPath = outputPath + ".log"
-        sourceName = os.path.basename(task.sourcePath)
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._cxx_script)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-        # write build command
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(name)s_cxx  %(sourcePath)s | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  SRC_FILE    = %s\n" % sourcePath)
-        ninjaFile.write("  OBJ_FILE    = %s\n" % outputPath)
-        ninjaFile.write("  DEP_FILE    = %s.d\n" % outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  TOOL_NAME   = %s%s%s\n" % (self.prefix, "g++", self.suffix))
-        ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            sourceName = os.path.basename(task.sourcePath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                ("SRC_FILE", build.xlat_path(project, task.sourcePath)),
+                ("OBJ_FILE", outputPath),
+                ("DEP_FILE", outputPath + ".d"),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("TOOL_NAME", "%s%s%s" % (self.prefix, "g++", self.suffix)),
+                ("DESC", "%s -> %s" % (sourceName, outputName)),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + self._get_log_outputs(task),
+            "%s_cxx" % self.name,
+            inputs = (task.sourcePath,),
+            implicit = rspDeps + self._get_script_deps(self._cxx_script) + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + rspVariables)
 
 
     def emit_static_lib(self, project, task):
@@ -228,30 +309,28 @@ class GccToolChain(CppToolChain):
         outputFileEsc = binutils_esc_path(task.outputPath)
         options.append("\"%s\"" % outputFileEsc)
         self.translate_linker_inputs(options, task)
-        write_rsp_file(project, task, options)
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        name = self.name
-        outputPath = build.xlat_path(project, task.outputPath)
-        logPath = outputPath + ".log"
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._lib_script)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(name)s_lib | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        build.translate_path_list(ninjaFile, project, task.inputs)
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  DESC        = %s\n" % outputName)
-        ninjaFile.write("\n")
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("DESC", outputName),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + self._get_log_outputs(task),
+            "%s_lib" % self.name,
+            implicit = rspDeps + self._get_script_deps(self._lib_script) + task.inputs + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + rspVariables)
 
 
     def translate_link_options(self, options, task):
@@ -275,35 +354,35 @@ class GccToolChain(CppToolChain):
         # write response file
         options = []
         self.translate_link_options(options, task)
-        write_rsp_file(project, task, options)
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        name = self.name
-        outputPath = build.xlat_path(project, task.outputPath)
-        libraryPath = ""
+        outputs = [task.outputPath] + task.extraOutputs
         if task.outputLibraryPath and (task.outputLibraryPath != task.outputPath):
-            libraryPath = build.xlat_path(project, task.outputLibraryPath)
-        logPath = outputPath + ".log"
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._lib_script)
+            outputs.append(task.outputLibraryPath)
+        outputs.extend(self._get_log_outputs(task))
 
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
+        implicit = rspDeps + self._get_script_deps(self._lib_script)
+        implicit.extend([input for input in task.inputs if os.path.isabs(input)])
+        implicit.extend(task.extraDeps)
 
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(libraryPath)s %(logPath)s : %(name)s_link | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        for input in task.inputs:
-            if os.path.isabs(input):
-                inputEsc = build.ninja_esc_path(input)
-                ninjaFile.write(" ")
-                ninjaFile.write(inputEsc)
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  TOOL_NAME   = %s%s%s\n" % (self.prefix, "g++", self.suffix))
-        ninjaFile.write("  DESC        = %s\n" % outputName)
-        ninjaFile.write("\n")
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("TOOL_NAME", "%s%s%s" % (self.prefix, "g++", self.suffix)),
+                ("DESC", outputName),
+            )
+
+        emit_tool_edge(project, self,
+            outputs,
+            "%s_link" % self.name,
+            implicit = implicit,
+            pool = get_link_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + rspVariables)
@@ -1,6 +1,8 @@
 import os
 from .tc import *
 from . import build
+from . import io
+from .ninja_writer import ninja_esc_path
 
 
 class JavacToolChain(build.ToolChain):
@@ -12,28 +14,44 @@ class JavacToolChain(build.ToolChain):
         self._scriptDir = os.path.join(os.path.dirname(__file__), "scripts")
         self._javac_script = os.path.join(self._scriptDir, "javac-invoke.py")
         self._jar_script = os.path.join(self._scriptDir, "jar-invoke.py")
+        # If True, each compile is a single edge that writes a ninja dyndep file, which
+        # declares the class files (including inner classes) as implicit outputs of the
+        # edge.  This replaces the separate fanin edge; it requires ninja 1.10.
+        self.useDyndep = False
 
-    def emit_rules(self, ninjaFile):
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# %s\n" % self.name)
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_javac\n" % self.name)
-        ninjaFile.write("  command = python \"%s\"  compile  \"$WORKING_DIR\"  \"%s\"  \"$OUT_DIR\"  \"$OPTIONS\"  \"$CLASSPATHS\"  \"$SOURCES\"  \"$LOG_FILE\"  \"$LIST_FILE\"  \"$FANIN_FILE\"  \n" % (self._javac_script, self.jdkDir))
-        ninjaFile.write("  description = %s  $DESC\n" % self.name)
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_javac_fanin\n" % self.name)
-        ninjaFile.write("  depfile = $DEP_FILE\n")
-        ninjaFile.write("  command = python \"%s\"  fanin  \"$WORKING_DIR\"  \"%s\"  \"$OUT_DIR\"  \"$OPTIONS\"  \"$CLASSPATHS\"  \"$SOURCES\"  \"$LOG_FILE\"  \"$LIST_FILE\"  \"$FANIN_FILE\"  \n" % (self._javac_script, self.jdkDir))
-        ninjaFile.write("  description = %s  $DESC\n" % self.name)
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
+    def get_identity_paths(self):
+        return [os.path.join(self.jdkDir, "bin", "javac"), os.path.join(self.jdkDir, "bin", "jar")]
 
-        ninjaFile.write("rule %s_jar\n" % self.name)
-        ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"%s\"  \"$OUTPUT_FILE\"  \"$LOG_FILE\"  \n" % (self._jar_script, self.jdkDir))
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("  description = %s  $DESC\n" % self.name)
-        ninjaFile.write("\n")
+    def emit_rules(self, ninjaFile):
+        ninjaFile.banner(self.name)
+        ninjaFile.rule("%s_javac" % self.name, (
+            ("command", "%s  compile  \"$WORKING_DIR\"  \"%s\"  \"$OUT_DIR\"  \"$OPTIONS\"  \"$CLASSPATHS\"  \"$SOURCES\"  %s  \"$LIST_FILE\"  \"$FANIN_FILE\"" % (get_script_command(self, self._javac_script), self.jdkDir, log_rule_arg(self))),
+            ("description", "%s  $DESC" % self.name),
+            ("restat", "1"),
+        ))
+        ninjaFile.rule("%s_javac_fanin" % self.name, (
+            ("depfile", "$DEP_FILE"),
+            ("command", "%s  fanin  \"$WORKING_DIR\"  \"%s\"  \"$OUT_DIR\"  \"$OPTIONS\"  \"$CLASSPATHS\"  \"$SOURCES\"  %s  \"$LIST_FILE\"  \"$FANIN_FILE\"" % (get_script_command(self, self._javac_script), self.jdkDir, log_rule_arg(self))),
+            ("description", "%s  $DESC" % self.name),
+            ("restat", "1"),
+        ))
+        # A generator edge, so that the class files that its dyndep file adds after
+        # a compile are not reported as missing from the build log, which would
+        # re-run the compile on the next build.  Deleted class files still do.
+        # Ninja then ignores changes to the command, so the jdkDir is also written
+        # to a file that the edge depends on, and "ninja -t clean" only removes the
+        # edge's outputs when given -g.
+        ninjaFile.rule("%s_javac_dyndep" % self.name, (
+            ("command", "%s  dyndep  \"$WORKING_DIR\"  \"%s\"  \"$OUT_DIR\"  \"$OPTIONS\"  \"$CLASSPATHS\"  \"$SOURCES\"  %s  \"$LIST_FILE\"  \"$FANIN_FILE\"" % (get_script_command(self, self._javac_script), self.jdkDir, log_rule_arg(self))),
+            ("description", "%s  $DESC" % self.name),
+            ("generator", "1"),
+            ("restat", "1"),
+        ))
+        ninjaFile.rule("%s_jar" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  \"%s\"  \"$OUTPUT_FILE\"  %s" % (get_script_command(self, self._jar_script), self.jdkDir, log_rule_arg(self))),
+            ("restat", "1"),
+            ("description", "%s  $DESC" % self.name),
+        ))
 
     def emit_java_compile(self, project, task):
         # write options file; this also updates extraInputs/extraOutputs
@@ -50,64 +68,66 @@ class JavacToolChain(build.ToolChain):
 
         # emit ninja file contents
         ninjaFile = project.projectMan.ninjaFile
-        name = self.name
-        outputPath = build.ninja_esc_path(task.outputPath)
-        outputName = os.path.basename(outputPath)
-        scriptPath = build.ninja_esc_path(self._javac_script)
-
-        extraOutputs = " ".join([build.ninja_esc_path(p) for p in task.extraOutputs])
+        outputName = os.path.basename(task.outputPath)
+        variables = (
+            ("WORKING_DIR", task.workingDir),
+            ("OUT_DIR", task.outputDir),
+            ("OPTIONS", task.outputPath + ".rsp"),
+            ("CLASSPATHS", task.outputPath + ".cp"),
+            ("SOURCES", task.outputPath + ".src"),
+            log_edge_variable(self, task.outputPath),
+            ("LIST_FILE", task.outputPath + ".list"),
+            ("FANIN_FILE", task.outputPath),
+            ("DESC", outputName),
+        )
 
         # write build command
-        ninjaFile.write("build %(outputPath)s.list %(extraOutputs)s %(outputPath)s.log : %(name)s_javac | %(outputPath)s.rsp %(outputPath)s.cp %(outputPath)s.src  %(scriptPath)s " % locals())
+        pool = get_task_pool(project, task, "javac")
         absSourceFilePaths = [os.path.join(task.workingDir, p) for p in task.sourceFilePaths]
-        build.translate_path_list(ninjaFile, project, absSourceFilePaths)
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % task.workingDir)
-        ninjaFile.write("  OUT_DIR     = %s\n" % task.outputDir)
-        ninjaFile.write("  OPTIONS     = %s.rsp\n" % task.outputPath)
-        ninjaFile.write("  CLASSPATHS  = %s.cp\n" % task.outputPath)
-        ninjaFile.write("  SOURCES     = %s.src\n" % task.outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % task.outputPath)
-        ninjaFile.write("  LIST_FILE   = %s.list\n" % task.outputPath)
-        ninjaFile.write("  FANIN_FILE  = %s\n" % task.outputPath)
-        ninjaFile.write("  DESC        = %s\n" % (outputName))
-        ninjaFile.write("\n")
+        if self.useDyndep:
+            self._emit_java_compile_dyndep(project, task, variables, absSourceFilePaths, pool)
+            return
+        ninjaFile.build(project,
+            [task.outputPath + ".list"] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            "%s_javac" % self.name,
+            implicit = [task.outputPath + ".rsp", task.outputPath + ".cp", task.outputPath + ".src", self._javac_script] + absSourceFilePaths + task.extraDeps,
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + ((("pool", pool),) if pool else ()))
 
         # write fanin command
-        ninjaFile.write("build %(outputPath)s : %(name)s_javac_fanin | %(outputPath)s.list %(scriptPath)s \n" % locals())
-        ninjaFile.write("  DEP_FILE    = %s.d\n" % task.outputPath)
-        ninjaFile.write("  WORKING_DIR = %s\n" % task.workingDir)
-        ninjaFile.write("  OUT_DIR     = %s\n" % task.outputDir)
-        ninjaFile.write("  OPTIONS     = %s.rsp\n" % task.outputPath)
-        ninjaFile.write("  CLASSPATHS  = %s.cp\n" % task.outputPath)
-        ninjaFile.write("  SOURCES     = %s.src\n" % task.outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % task.outputPath)
-        ninjaFile.write("  LIST_FILE   = %s.list\n" % task.outputPath)
-        ninjaFile.write("  FANIN_FILE  = %s\n" % task.outputPath)
-        ninjaFile.write("  DESC        = %s\n" % (outputName))
-        ninjaFile.write("\n")
+        ninjaFile.build(project,
+            (task.outputPath,),
+            "%s_javac_fanin" % self.name,
+            implicit = (task.outputPath + ".list", self._javac_script),
+            variables = (("DEP_FILE", task.outputPath + ".d"),) + variables)
+
+    def _emit_java_compile_dyndep(self, project, task, variables, absSourceFilePaths, pool):
+        # The compile rewrites the dyndep file once it knows the class files.  Until
+        # then, it must exist for ninja to load, so that is written here.
+        dyndepPath = task.outputPath + ".dd"
+        if not os.path.exists(dyndepPath):
+            io.write_file_if_different(dyndepPath, "ninja_dyndep_version = 1\nbuild %s: dyndep\n" % ninja_esc_path(task.outputPath))
+        project.makeFiles.append(dyndepPath)
+        write_rsp_file(project, task, [self.jdkDir], task.outputPath + ".jdk", "\n")
+
+        project.projectMan.ninjaFile.build(project,
+            [task.outputPath, task.outputPath + ".list"] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            "%s_javac_dyndep" % self.name,
+            implicit = [task.outputPath + ".rsp", task.outputPath + ".cp", task.outputPath + ".src", task.outputPath + ".jdk", self._javac_script] + absSourceFilePaths + task.extraDeps,
+            orderOnly = task.orderOnlyDeps + [dyndepPath],
+            variables = variables + (("dyndep", build.xlat_path(project, dyndepPath)),) + ((("pool", pool),) if pool else ()))
 
     def emit_jar_create(self, project, task):
         # emit ninja file contents
-        ninjaFile = project.projectMan.ninjaFile
-        name = self.name
-        outputPath = build.ninja_esc_path(task.outputPath)
-        outputName = os.path.basename(outputPath)
-        scriptPath = build.ninja_esc_path(self._jar_script)
-
-        extraOutputs = " ".join([build.ninja_esc_path(p) for p in task.extraOutputs])
-
-        # write build command
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(outputPath)s.log : %(name)s_jar | %(scriptPath)s " % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % task.workingDir)
-        ninjaFile.write("  OUTPUT_FILE = %s\n" % task.outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % task.outputPath)
-        ninjaFile.write("  DESC        = %s\n" % (task.outputPath))
-        ninjaFile.write("\n")
+        pool = get_task_pool(project, task)
+        project.projectMan.ninjaFile.build(project,
+            [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            "%s_jar" % self.name,
+            implicit = [self._jar_script] + task.extraDeps,
+            orderOnly = task.orderOnlyDeps,
+            variables = (
+                ("WORKING_DIR", task.workingDir),
+                ("OUTPUT_FILE", task.outputPath),
+                log_edge_variable(self, task.outputPath),
+                ("DESC", task.outputPath),
+            ) + ((("pool", pool),) if pool else ()))
@@ -58,26 +58,58 @@ if os.name == "nt":
             self.defaultLinkOptions.append("/nologo")
 
 
+        def get_identity_paths(self):
+            binDir = os.path.join(self.installDir, "VC", "bin")
+            return [os.path.join(binDir, "cl.exe"), os.path.join(binDir, "amd64", "cl.exe"), os.path.join(binDir, "x86_amd64", "cl.exe")]
+
+        def _get_cxx_deps(self, depFile):
+            """Returns (rule variables, depfile argument of the compile script) for the compile rules."""
+            if self.useDepsLog:
+                # The compile script prints the includes reported by /showIncludes, and
+                # ninja removes them from the output.
+                return (("deps", "msvc"), ("msvc_deps_prefix", "Note: including file:")), "-"
+            return (("depfile", depFile),), depFile
+
         def emit_rules(self, ninjaFile):
-            ninjaFile.write("#############################################\n")
-            ninjaFile.write("# %s\n" % self.name)
-            ninjaFile.write("\n")
-            ninjaFile.write("rule %s_cxx\n" % self.name)
-            ninjaFile.write("  depfile = $DEP_FILE\n")
-            ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OBJ_FILE\"  \"$PDB_FILE\"  \"$DEP_FILE\"  \"$LOG_FILE\"  \"%s\"  %s  \"$RSP_FILE\" %s %s\n" % (self._cxx_script, self.installDir, self.arch, self.msvcVer, self._cxx_script_extra_args))
-            ninjaFile.write("  description = %s_cxx  $DESC\n" % self.name)
-            ninjaFile.write("  restat = 1\n")
-            ninjaFile.write("\n")
-            ninjaFile.write("rule %s_lib\n" % self.name)
-            ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$LOG_FILE\"  \"%s\"  %s  \"$RSP_FILE\"\n" % (self._lib_script, self.installDir, self.arch))
-            ninjaFile.write("  description = %s_lib  $DESC\n" % self.name)
-            ninjaFile.write("  restat = 1\n")
-            ninjaFile.write("\n")
-            ninjaFile.write("rule %s_link\n" % self.name)
-            ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$LOG_FILE\"  \"%s\"  %s  \"$RSP_FILE\"\n" % (self._link_script, self.installDir, self.arch))
-            ninjaFile.write("  description = %s_link $DESC\n" % self.name)
-            ninjaFile.write("  restat = 1\n")
-            ninjaFile.write("\n")
+            ninjaFile.banner(self.name)
+            if self.compactEdges:
+                self._emit_compact_rules(ninjaFile)
+                return
+            depVariables, depArg = self._get_cxx_deps("$DEP_FILE")
+            ninjaFile.rule("%s_cxx" % self.name, depVariables + (
+                ("command", "%s  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OBJ_FILE\"  \"$PDB_FILE\"  \"%s\"  %s  \"%s\"  %s  \"$RSP_FILE\" %s %s" % (get_script_command(self, self._cxx_script), depArg, log_rule_arg(self), self.installDir, self.arch, self.msvcVer, self._cxx_script_extra_args)),
+                ("description", "%s_cxx  $DESC" % self.name),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$RSP_FILE"))
+            ninjaFile.rule("%s_lib" % self.name, (
+                ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  \"$RSP_FILE\"" % (get_script_command(self, self._lib_script), log_rule_arg(self), self.installDir, self.arch)),
+                ("description", "%s_lib  $DESC" % self.name),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$RSP_FILE"))
+            ninjaFile.rule("%s_link" % self.name, (
+                ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  \"$RSP_FILE\"" % (get_script_command(self, self._link_script), log_rule_arg(self), self.installDir, self.arch)),
+                ("description", "%s_link $DESC" % self.name),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$RSP_FILE"))
+
+        def _emit_compact_rules(self, ninjaFile):
+            # PDB_FILE is only bound by edges that create a PDB; it is empty otherwise
+            depVariables, depArg = self._get_cxx_deps("$out.d")
+            ninjaFile.rule("%s_cxx" % self.name, depVariables + (
+                ("command", "%s  \"$WORKING_DIR\"  $in  $out  \"$PDB_FILE\"  %s  %s  \"%s\"  %s  $out.rsp %s %s" % (get_script_command(self, self._cxx_script), depArg, log_rule_arg(self, "$out.log", "$out"), self.installDir, self.arch, self.msvcVer, self._cxx_script_extra_args)),
+                ("description", "%s_cxx  $in" % self.name),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$out.rsp"))
+            ninjaFile.rule("%s_lib" % self.name, (
+                ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._lib_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, self.arch)),
+                ("description", "%s_lib  $out" % self.name),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$out.rsp"))
+            ninjaFile.rule("%s_link" % self.name, (
+                ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._link_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, self.arch)),
+                ("description", "%s_link $out" % self.name),
+                ("restat", "1"),
+            ) + rsp_rule_variables(self, "$out.rsp"))
 
 
         def translate_opt_level(self, options, task):
@@ -125,16 +157,18 @@ if os.name == "nt":
                 options.append("/WX")
 
         def translate_include_paths(self, options, task):
-            for includePath in task.includePaths:
+            def translate(includePath):
                 if not includePath:
                     raise Exception("empty includePath set for: " + task.outputPath)
-                options.append("/I\"%s\"" % includePath)
+                return "/I\"%s\"" % includePath
+            translate_option_list(options, task.includePaths, (self, "includePaths"), translate)
 
         def translate_defines(self, options, task):
-            for define in task.defines:
+            def translate(define):
                 if not define:
                     raise Exception("empty define set for: " + task.outputPath)
-                options.append("/D%s" % define)
+                return "/D%s" % define
+            translate_option_list(options, task.defines, (self, "defines"), translate)
 
         def translate_crt(self, options, task):
             if task.optLevel == 0:
@@ -214,36 +248,37 @@ if os.name == "nt":
             options.append("/nologo")
             options.append("/c")
             self.translate_cpp_options(options, task)
-            write_rsp_file(project, task, options)
+            rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
             # emit ninja file contents
-            ninjaFile = project.projectMan.ninjaFile
-            name = self.name
             outputPath = build.xlat_path(project, task.outputPath)
             pdbPath = "" if not task._creatingPDB else outputPath + ".pdb"
-            sourcePath = build.xlat_path(project, task.sourcePath)
-            logPath = outputPath + ".log"
-            sourceName = os.path.basename(task.sourcePath)
-            outputName = os.path.basename(task.outputPath)
-            scriptPath = build.ninja_esc_path(self._cxx_script)
-
-            extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-            # write build command
-            ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(name)s_cxx  %(sourcePath)s | %(outputPath)s.rsp %(scriptPath)s " % locals())
-            build.translate_extra_deps(ninjaFile, project, task, False)
-            build.translate_order_only_deps(ninjaFile, project, task, True)
-            ninjaFile.write("\n")
-
-            ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-            ninjaFile.write("  SRC_FILE    = %s\n" % sourcePath)
-            ninjaFile.write("  OBJ_FILE    = %s\n" % outputPath)
-            ninjaFile.write("  PDB_FILE    = %s\n" % pdbPath)
-            ninjaFile.write("  DEP_FILE    = %s.d\n" % outputPath)
-            ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-            ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-            ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-            ninjaFile.write("\n")
+            if self.compactEdges:
+                variables = [("WORKING_DIR", build.xlat_path(project, task.workingDir))]
+                if pdbPath:
+                    variables.append(("PDB_FILE", pdbPath))
+            else:
+                sourceName = os.path.basename(task.sourcePath)
+                outputName = os.path.basename(task.outputPath)
+                variables = (
+                    ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                    ("SRC_FILE", build.xlat_path(project, task.sourcePath)),
+                    ("OBJ_FILE", outputPath),
+                    ("PDB_FILE", pdbPath),
+                    ("DEP_FILE", outputPath + ".d"),
+                    log_edge_variable(self, outputPath),
+                    ("RSP_FILE", outputPath + ".rsp"),
+                    ("DESC", "%s -> %s" % (sourceName, outputName)),
+                )
+
+            emit_tool_edge(project, self,
+                [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+                "%s_cxx" % self.name,
+                inputs = (task.sourcePath,),
+                implicit = rspDeps + [self._cxx_script] + task.extraDeps,
+                pool = get_task_pool(project, task),
+                orderOnly = task.orderOnlyDeps,
+                variables = tuple(variables) + rspVariables)
 
             if task.createPCH:
                 project.projectMan.emit_copy(task.sourcePath, task.outputPath[:-4])
@@ -255,30 +290,27 @@ if os.name == "nt":
             options.append("\"/OUT:%s\"" % task.outputPath)
             for input in task.inputs:
                 options.append("\"%s\"" % input)
-            write_rsp_file(project, task, options)
+            rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
             # emit ninja file contents
-            ninjaFile = project.projectMan.ninjaFile
-            name = self.name
+            emit_tool_edge(project, self,
+                [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+                "%s_lib" % self.name,
+                implicit = rspDeps + [self._lib_script] + task.inputs + task.extraDeps,
+                pool = get_task_pool(project, task),
+                orderOnly = task.orderOnlyDeps,
+                variables = self._get_invoke_variables(project, task) + rspVariables)
+
+        def _get_invoke_variables(self, project, task):
+            if self.compactEdges:
+                return (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
             outputPath = build.xlat_path(project, task.outputPath)
-            logPath = outputPath + ".log"
-            outputName = os.path.basename(task.outputPath)
-            scriptPath = build.ninja_esc_path(self._lib_script)
-
-            extraOutputs = " ".join([build.xlat_path(project, path) for paths in task.extraOutputs])
-
-            ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(name)s_lib | %(outputPath)s.rsp %(scriptPath)s " % locals())
-            build.translate_path_list(ninjaFile, project, task.inputs)
-            build.translate_extra_deps(ninjaFile, project, task, False)
-            build.translate_order_only_deps(ninjaFile, project, task, True)
-            ninjaFile.write("\n")
-
-            ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-            ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-            ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-            ninjaFile.write("  DESC        = %s\n" % outputName)
-            ninjaFile.write("\n")
-            ninjaFile.write("\n")
+            return (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("DESC", os.path.basename(task.outputPath)),
+            )
 
         def emit_link(self, project, task):
             options = []
@@ -303,37 +335,26 @@ if os.name == "nt":
             for input in task.inputs:
                 options.append("\"%s\"" % input)
             options.extend(task.extraOptions)
-            write_rsp_file(project, task, options)
+            rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
             # emit ninja file contents
-            ninjaFile = project.projectMan.ninjaFile
-            name = self.name
-            outputPath = build.xlat_path(project, task.outputPath)
-            libraryPath = ""
+            outputs = [task.outputPath]
             if task.outputLibraryPath and (task.outputLibraryPath != task.outputPath):
-                libraryPath = build.xlat_path(project, task.outputLibraryPath)
-            logPath = outputPath + ".log"
-            outputName = os.path.basename(task.outputPath)
-            scriptPath = build.ninja_esc_path(self._lib_script)
-
-            extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-            ninjaFile.write("build %(outputPath)s %(libraryPath)s %(extraOutputs)s %(logPath)s : %(name)s_link | %(outputPath)s.rsp %(scriptPath)s " % locals())
-            for input in task.inputs:
-                if os.path.isabs(input):
-                    inputEsc = build.xlat_path(project, input)
-                    ninjaFile.write(" ")
-                    ninjaFile.write(inputEsc)
-            build.translate_extra_deps(ninjaFile, project, task, False)
-            build.translate_order_only_deps(ninjaFile, project, task, True)
-            ninjaFile.write("\n")
-
-            ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-            ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-            ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-            ninjaFile.write("  DESC        = %s\n" % outputName)
-            ninjaFile.write("\n")
-            ninjaFile.write("\n")
+                outputs.append(task.outputLibraryPath)
+            outputs.extend(task.extraOutputs)
+            outputs.extend(get_log_outputs(self, task.outputPath))
+
+            implicit = rspDeps + [self._lib_script]
+            implicit.extend([input for input in task.inputs if os.path.isabs(input)])
+            implicit.extend(task.extraDeps)
+
+            emit_tool_edge(project, self,
+                outputs,
+                "%s_link" % self.name,
+                implicit = implicit,
+                pool = get_link_pool(project, task),
+                orderOnly = task.orderOnlyDeps,
+                variables = self._get_invoke_variables(project, task) + rspVariables)
 else:
     class MsvcToolChain(build.ToolChain):
         """A stub implementation for non-Windows OSes."""
@@ -35,21 +35,36 @@ class NvccToolChain(CppToolChain):
         self._invoke_script  = os.path.join(self._scriptDir, "nvcc-invoke.py")
 
 
+    def get_identity_paths(self):
+        return [os.path.join(self.installDir, "bin", "nvcc")]
+
     def emit_rules(self, ninjaFile):
-        ninjaFile.write("#############################################\n")
-        ninjaFile.write("# %s\n" % self.name)
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_cxx\n" % self.name)
-        ninjaFile.write("  depfile = $DEP_FILE\n")
-        ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OBJ_FILE\"  \"$DEP_FILE\"  \"$LOG_FILE\"  \"%s\"  %s  \"%s\"  %s  \"$RSP_FILE\"\n" % (self._cxx_script, self.installDir, self.hostCompiler, self.hostInstallDir, self.addressModel))
-        ninjaFile.write("  description = %s_cxx  $DESC\n" % self.name)
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
-        ninjaFile.write("rule %s_invoke\n" % self.name)
-        ninjaFile.write("  command = python \"%s\"  \"$WORKING_DIR\"  \"$LOG_FILE\"  \"%s\"  %s  \"%s\"  %s  \"$RSP_FILE\"\n" % (self._invoke_script, self.installDir, self.hostCompiler, self.hostInstallDir, self.addressModel))
-        ninjaFile.write("  description = $DESC\n")
-        ninjaFile.write("  restat = 1\n")
-        ninjaFile.write("\n")
+        ninjaFile.banner(self.name)
+        if self.compactEdges:
+            self._emit_compact_rules(ninjaFile)
+            return
+        ninjaFile.rule("%s_cxx" % self.name, depfile_rule_variables(self, "$DEP_FILE") + (
+            ("command", "%s  \"$WORKING_DIR\"  \"$SRC_FILE\"  \"$OBJ_FILE\"  \"$DEP_FILE\"  %s  \"%s\"  %s  \"%s\"  %s  \"$RSP_FILE\"" % (get_script_command(self, self._cxx_script), log_rule_arg(self), self.installDir, self.hostCompiler, self.hostInstallDir, self.addressModel)),
+            ("description", "%s_cxx  $DESC" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$RSP_FILE"))
+        ninjaFile.rule("%s_invoke" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  \"%s\"  %s  \"$RSP_FILE\"" % (get_script_command(self, self._invoke_script), log_rule_arg(self), self.installDir, self.hostCompiler, self.hostInstallDir, self.addressModel)),
+            ("description", "$DESC"),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$RSP_FILE"))
+
+    def _emit_compact_rules(self, ninjaFile):
+        ninjaFile.rule("%s_cxx" % self.name, depfile_rule_variables(self, "$out.d") + (
+            ("command", "%s  \"$WORKING_DIR\"  $in  $out  $out.d  %s  \"%s\"  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._cxx_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, self.hostCompiler, self.hostInstallDir, self.addressModel)),
+            ("description", "%s_cxx  $in" % self.name),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$out.rsp"))
+        ninjaFile.rule("%s_invoke" % self.name, (
+            ("command", "%s  \"$WORKING_DIR\"  %s  \"%s\"  %s  \"%s\"  %s  $out.rsp" % (get_script_command(self, self._invoke_script), log_rule_arg(self, "$out.log", "$out"), self.installDir, self.hostCompiler, self.hostInstallDir, self.addressModel)),
+            ("description", "$out"),
+            ("restat", "1"),
+        ) + rsp_rule_variables(self, "$out.rsp"))
 
 
     def translate_debug_level(self, options, task):
@@ -102,12 +117,16 @@ class NvccToolChain(CppToolChain):
             task.extraDeps.append(task.usePCH)
 
     def translate_linker_inputs(self, options, task):
+        # -L applies to every -l on the command line, so each directory is passed once
+        libDirs = set()
         for input in task.inputs:
             libName = get_lib_name(input)
             if libName:
                 libDir = os.path.dirname(input)
-                libDirEsc = binutils_esc_path(libDir)
-                options.append("-L\"%s\"" % libDirEsc)
+                if libDir not in libDirs:
+                    libDirs.add(libDir)
+                    libDirEsc = binutils_esc_path(libDir)
+                    options.append("-L\"%s\"" % libDirEsc)
                 options.append("-l\"%s\"" % libName)
             else:
                 inputEsc = binutils_esc_path(input)
@@ -138,34 +157,35 @@ class NvccToolChain(CppToolChain):
         # write response file
         options = []
         self.translate_cpp_options(options, task)
-        write_rsp_file(project, task, options)
+        if share_compile(project, self, task, "%s_cxx" % self.name, options):
+            return
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         # emit ninja file contents
-        name = self.name
-        outputPath = build.xlat_path(project, task.outputPath)
-        sourcePath = build.xlat_path(project, task.sourcePath)
-        logPath = outputPath + ".log"
-        sourceName = os.path.basename(task.sourcePath)
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._cxx_script)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-        # write build command
-        ninjaFile = project.projectMan.ninjaFile
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(name)s_cxx  %(sourcePath)s | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  SRC_FILE    = %s\n" % sourcePath)
-        ninjaFile.write("  OBJ_FILE    = %s\n" % outputPath)
-        ninjaFile.write("  DEP_FILE    = %s.d\n" % outputPath)
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  DESC        = %s -> %s\n" % (sourceName, outputName))
-        ninjaFile.write("\n")
+        if self.compactEdges:
+            variables = (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
+        else:
+            outputPath = build.xlat_path(project, task.outputPath)
+            sourceName = os.path.basename(task.sourcePath)
+            outputName = os.path.basename(task.outputPath)
+            variables = (
+                ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+                ("SRC_FILE", build.xlat_path(project, task.sourcePath)),
+                ("OBJ_FILE", outputPath),
+                ("DEP_FILE", outputPath + ".d"),
+                log_edge_variable(self, outputPath),
+                ("RSP_FILE", outputPath + ".rsp"),
+                ("DESC", "%s -> %s" % (sourceName, outputName)),
+            )
+
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            "%s_cxx" % self.name,
+            inputs = (task.sourcePath,),
+            implicit = rspDeps + [self._cxx_script] + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = variables + rspVariables)
 
     def emit_static_lib(self, project, task):
         # write response file
@@ -174,30 +194,27 @@ class NvccToolChain(CppToolChain):
         outputFileEsc = binutils_esc_path(task.outputPath)
         options.append("-o \"%s\"" % outputFileEsc)
         self.translate_linker_inputs(options, task)
-        write_rsp_file(project, task, options)
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
 
         # emit ninja file contents
-        name = self.name
+        emit_tool_edge(project, self,
+            [task.outputPath] + task.extraOutputs + get_log_outputs(self, task.outputPath),
+            "%s_invoke" % self.name,
+            implicit = rspDeps + [self._invoke_script] + task.inputs + task.extraDeps,
+            pool = get_task_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = self._get_invoke_variables(project, task) + rspVariables)
+
+    def _get_invoke_variables(self, project, task):
+        if self.compactEdges:
+            return (("WORKING_DIR", build.xlat_path(project, task.workingDir)),)
         outputPath = build.xlat_path(project, task.outputPath)
-        logPath = outputPath + ".log"
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._invoke_script)
-
-        extraOutputs = " ".join([build.xlat_path(project, path) for path in task.extraOutputs])
-
-        ninjaFile = project.projectMan.ninjaFile
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(logPath)s : %(name)s_invoke | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        build.translate_path_list(ninjaFile, project, task.inputs)
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  DESC        = %s\n" % outputName)
-        ninjaFile.write("\n")
-        ninjaFile.write("\n")
+        return (
+            ("WORKING_DIR", build.xlat_path(project, task.workingDir)),
+            log_edge_variable(self, outputPath),
+            ("RSP_FILE", outputPath + ".rsp"),
+            ("DESC", os.path.basename(task.outputPath)),
+        )
 
     def emit_link(self, project, task):
         if "msvc" in self.hostCompiler:
@@ -208,35 +225,6 @@ class NvccToolChain(CppToolChain):
                 task.inputs.append(os.path.join(winsdkLibDir, "gdi32.lib"))
                 task.inputs.append(os.path.join(winsdkLibDir, "uuid.lib"))
 
-        name = self.name
-        outputPath = build.xlat_path(project, task.outputPath)
-        libraryPath = ""
-        if task.outputLibraryPath and (task.outputLibraryPath != task.outputPath):
-            libraryPath = build.xlat_path(project, task.outputLibraryPath)
-        logPath = outputPath + ".log"
-        outputName = os.path.basename(task.outputPath)
-        scriptPath = build.ninja_esc_path(self._invoke_script)
-
-        extraOutputs = " ".join([build.ninja_esc_path(p) for p in task.extraOutputs])
-
-        ninjaFile = project.projectMan.ninjaFile
-        ninjaFile.write("build %(outputPath)s %(extraOutputs)s %(libraryPath)s %(logPath)s : %(name)s_invoke | %(outputPath)s.rsp %(scriptPath)s" % locals())
-        for input in task.inputs:
-            if os.path.isabs(input):
-                inputEsc = build.ninja_esc_path(input)
-                ninjaFile.write(" ")
-                ninjaFile.write(inputEsc)
-        build.translate_extra_deps(ninjaFile, project, task, False)
-        build.translate_order_only_deps(ninjaFile, project, task, True)
-        ninjaFile.write("\n")
-
-        ninjaFile.write("  WORKING_DIR = %s\n" % build.xlat_path(project, task.workingDir))
-        ninjaFile.write("  LOG_FILE    = %s.log\n" % outputPath)
-        ninjaFile.write("  RSP_FILE    = %s.rsp\n" % outputPath)
-        ninjaFile.write("  DESC        = %s\n" % outputName)
-        ninjaFile.write("\n")
-        ninjaFile.write("\n")
-
         # write response file
         options = []
         options.extend(self.defaultLinkOptions)
@@ -252,4 +240,22 @@ class NvccToolChain(CppToolChain):
             options.append("-Xlinker --strip-debug")
         self.translate_linker_inputs(options, task)
         options.extend(task.extraOptions)
-        write_rsp_file(project, task, options)
+        rspDeps, rspVariables = emit_rsp_file(project, self, task, options)
+
+        # emit ninja file contents
+        outputs = [task.outputPath] + task.extraOutputs
+        if task.outputLibraryPath and (task.outputLibraryPath != task.outputPath):
+            outputs.append(task.outputLibraryPath)
+        outputs.extend(get_log_outputs(self, task.outputPath))
+
+        implicit = rspDeps + [self._invoke_script]
+        implicit.extend([input for input in task.inputs if os.path.isabs(input)])
+        implicit.extend(task.extraDeps)
+
+        emit_tool_edge(project, self,
+            outputs,
+            "%s_invoke" % self.name,
+            implicit = implicit,
+            pool = get_link_pool(project, task),
+            orderOnly = task.orderOnlyDeps,
+            variables = self._get_invoke_variables(project, task) + rspVariables)
@@ -0,0 +1,68 @@
+class TransitiveList:
+    """An ordered list of values and of references to other TransitiveLists.
+
+    Iterating yields the values of the list and, recursively, of the referenced
+    lists, each value once, at its last position in that depth-first order.  So
+    every value follows the values of all lists that reference it, which is the
+    order that static linking requires.  The flattened values are memoized, so
+    referenced lists must be complete before this list is first read; projects
+    are, once get_project() returns them.
+    """
+    __slots__ = ("_entries", "_flat")
+
+    def __init__(self, values = ()):
+        self._entries = []
+        self._flat = None
+        self.extend(values)
+
+    def append(self, value):
+        self._flat = None
+        self._entries.append(value)
+
+    def extend(self, values):
+        """Adds a reference to values if it is a TransitiveList, and copies its values otherwise."""
+        self._flat = None
+        if isinstance(values, TransitiveList):
+            self._entries.append(values)
+        else:
+            self._entries.extend(values)
+
+    def flatten(self):
+        """Returns the tuple of deduplicated values."""
+        if self._flat == None:
+            self._flat = ()     # a reference cycle reads this list as empty
+            expanded = []
+            for entry in self._entries:
+                if isinstance(entry, TransitiveList):
+                    expanded.extend(entry.flatten())
+                else:
+                    expanded.append(entry)
+            seen = set()
+            flat = []
+            for value in reversed(expanded):
+                if value not in seen:
+                    seen.add(value)
+                    flat.append(value)
+            flat.reverse()
+            self._flat = tuple(flat)
+        return self._flat
+
+    def __iter__(self):
+        return iter(self.flatten())
+
+    def __len__(self):
+        return len(self.flatten())
+
+    def __contains__(self, value):
+        return value in self.flatten()
+
+    def __getitem__(self, index):
+        return self.flatten()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (TransitiveList, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "TransitiveList(%r)" % list(self)
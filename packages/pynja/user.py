@@ -1,31 +1,238 @@
 import os
-import tempfile
+import sys
+import subprocess
 from . import io
 from . import build
+from . import ninja_writer
+from . import fingerprint
+from . import profiler
 from . import cb_vsproj
 
-def regenerate_build(generate_ninja_build, builtDir, codeBrowsingDir = None):
+# Set in the environment of worker processes started by a multi-process regenerate_build.
+_PARTITION_ENV = "PYNJA_GENERATE_PARTITION"
+_FRAGMENT_ENV = "PYNJA_GENERATE_FRAGMENT"
+
+
+def _start_generate_workers(ninjaPath, jobs):
+    workers = []
+    for index in range(1, jobs):
+        fragmentPath = "%s.part%d" % (ninjaPath, index)
+        env = dict(os.environ)
+        env[_PARTITION_ENV] = "%d/%d" % (index, jobs)
+        env[_FRAGMENT_ENV] = fragmentPath
+        process = subprocess.Popen([sys.executable] + sys.argv, env = env, stdout = subprocess.DEVNULL)
+        workers.append((process, fragmentPath))
+    return workers
+
+
+def _merge_generate_workers(projectMan, workers):
+    for process, fragmentPath in workers:
+        if process.wait() != 0:
+            raise Exception("generation worker failed; exit code = %d" % process.returncode)
+    for process, fragmentPath in workers:
+        projectMan.merge_partition(fragmentPath)
+        os.unlink(fragmentPath)
+    projectMan.finish_partitions()
+
+
+def get_selection_args(argv = None):
+    """Parses selective-generation arguments for regenerate_build.
+
+    Recognizes these arguments in argv (default: sys.argv[1:]), and ignores the rest:
+        --targets=name,...      projects or phony targets to generate
+        --variants=pattern,...  fnmatch patterns for top-level variants to generate
+        --all                   generate everything
+    Returns (targets, variants); both are None if no selection argument was given.
+    """
+    if argv == None:
+        argv = sys.argv[1:]
+    targets = None
+    variants = None
+    for arg in argv:
+        if arg == "--all":
+            targets = []
+            variants = []
+        elif arg.startswith("--targets="):
+            targets = [name for name in arg[len("--targets="):].split(",") if name]
+        elif arg.startswith("--variants="):
+            variants = [pattern for pattern in arg[len("--variants="):].split(",") if pattern]
+    if (targets != None) or (variants != None):
+        targets = targets or []
+        variants = variants or []
+    return (targets, variants)
+
+
+def _get_selection(selectionPath, targets, variants):
+    """Returns the selection as {"targets" : [...], "variants" : [...]}, or None for everything."""
+    if (targets == None) and (variants == None):
+        selection = io.read_json_file(selectionPath)
+    else:
+        selection = { "targets" : sorted(set(targets or [])), "variants" : sorted(set(variants or [])) }
+    if selection and (selection["targets"] or selection["variants"]):
+        return selection
+    return None
+
+
+def _apply_selection(projectMan, selection, indexPath):
+    """Restricts projectMan to selection; returns False if generating everything instead."""
+    targetIndex = io.read_json_file(indexPath) or {}
+    roots = set()
+    projNames = set()
+    for name in selection["targets"]:
+        if name in targetIndex:
+            roots.update(targetIndex[name])
+        elif name in build.projectFactory:
+            projNames.add(name)
+        else:
+            return False
+    projectMan.set_selection(roots, projNames, selection["variants"])
+    return True
+
+
+def _generate_partition(generate_ninja_build, ninjaPath, partition, selection):
+    index, count = [int(part) for part in partition.split("/")]
+    projectMan = build.ProjectMan(ninja_writer.NinjaWriter(), ninjaPath)
+    projectMan.set_partition(index, count, True)
+    if selection:
+        _apply_selection(projectMan, selection, ninjaPath + ".targets")
+    generate_ninja_build(projectMan)
+    projectMan.save_partition(os.environ[_FRAGMENT_ENV])
+
+
+class _NullPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+def _phase(generationProfiler, name):
+    if generationProfiler:
+        return generationProfiler.phase(name)
+    return _NullPhase()
+
+
+def regenerate_build(generate_ninja_build, builtDir, codeBrowsingDir = None, subninjas = False, jobs = 1, profile = None, targets = None, variants = None, graph = False):
+    """Run generate_ninja_build and write the result to builtDir/build.ninja.
+
+    Args:
+        subninjas -- if True, each project is written to its own .ninja file pulled in
+            with 'subninja', and regeneration only re-emits projects whose scripts
+            (or whose dependency projects' scripts) changed.
+        jobs -- number of processes to generate with; 0 means one per CPU.  Each
+            worker re-runs the calling script and emits every jobs'th top-level
+            request_project() call; request_project() returns None for requests
+            handled by another process.  Top-level get_project() calls are emitted
+            by every process.  Code-browsing projects are only
+            written by single-process runs.
+        profile -- True, or a profiler.GenerationProfiler with hooks attached, to
+            write builtDir/build.ninja.profile.json and a Chrome trace in
+            builtDir/build.ninja.trace.json.  With jobs > 1, only the projects
+            emitted by the parent process are profiled.
+        targets -- names of projects or phony targets to generate; see get_selection_args().
+            Only the top-level request_project() calls that lead to them are emitted,
+            and the others return None.  Phony targets, and projects that are not
+            requested at the top level, are found in builtDir/build.ninja.targets,
+            which every full generation rewrites; if a name is not found there,
+            everything is generated.
+        variants -- fnmatch patterns; only top-level request_project() calls whose
+            variant matches one of them are emitted.
+            If both targets and variants are None, the selection of the previous run
+            is used, so that ninja's regeneration keeps it.  Pass empty lists to
+            generate everything again.
+        graph -- if True, save a build_graph.BuildGraph of the build to
+            builtDir/build.ninja.graph, for queries with scripts/query-build-graph.py.
+            Not available with subninjas, since reused subninja files are not re-emitted.
+
+    If nothing that generation depends on has changed since the last run (see
+    fingerprint.py), generation is skipped.  Generation is deterministic, and
+    build.ninja and the other generated files are only written if their contents
+    change, so ninja only reloads build.ninja when it really changed.
+    """
     ninjaPath = os.path.join(builtDir, "build.ninja")
     lockPath = ninjaPath + ".lock"
 
+    selectionPath = ninjaPath + ".selection"
+    indexPath = ninjaPath + ".targets"
+
+    partition = os.environ.get(_PARTITION_ENV)
+    if partition:
+        # the parent process holds the lock
+        _generate_partition(generate_ninja_build, ninjaPath, partition, _get_selection(selectionPath, targets, variants))
+        return
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if subninjas and jobs > 1:
+        raise Exception("subninjas and multi-process generation (jobs > 1) cannot be combined")
+    if subninjas and graph:
+        raise Exception("subninjas and the build graph (graph = True) cannot be combined")
+
     io.create_dir(builtDir)
 
     with io.CrudeLockFile(lockPath):
-        with tempfile.TemporaryFile('w+t') as tempNinjaFile:
-            projectMan = build.ProjectMan(tempNinjaFile, ninjaPath)
-            generate_ninja_build(projectMan)
-            tempNinjaFile.seek(0)
-            newContent = tempNinjaFile.read()
-            io.write_file_if_different(ninjaPath, newContent)
-
-            if os.name == 'nt':
-                generators = []
-                generators.append(cb_vsproj.VS2008(projectMan, codeBrowsingDir))
-                generators.append(cb_vsproj.VS2010(projectMan, codeBrowsingDir))
-                generators.append(cb_vsproj.VS2012(projectMan, codeBrowsingDir))
-
-                for generator in generators:
-                    generator.emit_vs_projects()
-                    for projName, slnName in projectMan._cbProjectRoots.items():
-                        project = projectMan.get_first_project(projName)
-                        generator.emit_sln(slnName, project._cbProjectRefs)
+        selection = _get_selection(selectionPath, targets, variants)
+        if selection:
+            io.write_json_file(selectionPath, selection)
+        elif os.path.exists(selectionPath):
+            os.unlink(selectionPath)
+
+        graphPath = ninjaPath + ".graph"
+        fingerprintPath = ninjaPath + ".fingerprint"
+        if (not graph or os.path.exists(graphPath)) and fingerprint.is_current(fingerprintPath, build.get_loaded_modules(os.getcwd()), selection):
+            # The REGENERATE edge is restat, so ninja does not re-run it, nor reload build.ninja.
+            return
+
+        generationProfiler = profile
+        if profile == True:
+            generationProfiler = profiler.GenerationProfiler()
+
+        projectMan = build.ProjectMan(ninja_writer.NinjaWriter(), ninjaPath)
+        projectMan.profiler = generationProfiler
+        workers = []
+        if subninjas:
+            projectMan.enable_subninjas()
+        if selection and not _apply_selection(projectMan, selection, indexPath):
+            print("pynja: selected targets not found in %s; generating everything" % indexPath)
+        if jobs > 1:
+            projectMan.set_partition(0, jobs, False)
+            workers = _start_generate_workers(ninjaPath, jobs)
+        try:
+            with _phase(generationProfiler, "generate"):
+                generate_ninja_build(projectMan)
+        except:
+            for process, fragmentPath in workers:
+                process.kill()
+            raise
+        if jobs > 1:
+            with _phase(generationProfiler, "merge workers"):
+                _merge_generate_workers(projectMan, workers)
+        with _phase(generationProfiler, "write manifest"):
+            projectMan.ninjaFile.write_file(ninjaPath)
+        projectMan.save_subninja_state()
+        projectMan.save_dir_snapshot()
+        if projectMan.shareCompiles:
+            io.write_json_file(ninjaPath + ".shared_compiles.json", projectMan.get_shared_compile_report())
+        if graph:
+            with _phase(generationProfiler, "save build graph"):
+                projectMan.get_build_graph().save(graphPath)
+        fingerprint.save(fingerprintPath, projectMan.get_regenerator_inputs(), projectMan.get_generated_files(), selection)
+        if not projectMan._selection:
+            io.write_json_file(indexPath, projectMan.get_target_index())
+
+        if generationProfiler:
+            generationProfiler.write_report(ninjaPath + ".profile.json")
+            generationProfiler.write_chrome_trace(ninjaPath + ".trace.json")
+
+        if os.name == 'nt' and jobs == 1:
+            generators = []
+            generators.append(cb_vsproj.VS2008(projectMan, codeBrowsingDir))
+            generators.append(cb_vsproj.VS2010(projectMan, codeBrowsingDir))
+            generators.append(cb_vsproj.VS2012(projectMan, codeBrowsingDir))
+
+            for generator in generators:
+                generator.emit_vs_projects()
+                for projName, slnName in projectMan._cbProjectRoots.items():
+                    project = projectMan.get_first_project(projName)
+                    generator.emit_sln(slnName, project._cbProjectRefs)
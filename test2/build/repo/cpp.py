@@ -3,6 +3,8 @@ import pynja
 
 
 class CppVariant(pynja.Variant):
+    __slots__ = ()
+
     if os.name == 'nt':
         fieldDefs = [
             "os",           [ "windows", "android" ],
@@ -29,6 +31,8 @@ class CppVariant(pynja.Variant):
         return CppVariant.fieldDefs
 
 class CppLibVariant(pynja.Variant):
+    __slots__ = ()
+
     fieldDefs = list(CppVariant.fieldDefs)
     fieldDefs.extend([
         "linkage",      [ "sta", "dyn" ],
@@ -55,6 +59,16 @@ class CppProject(pynja.CppProject):
         if isinstance(self.toolchain, pynja.AndroidGccToolChain):
             self.android_select_stl('gnu-libstdc++', linkDynamic=True)
 
+        # define macros to handle DLL import/export
+        # And add the dllexport.h header to include paths for every project.
+        # These are shared by every compile, after the project's own settings.
+        linkage = getattr(self.variant, "linkage", None)
+        if linkage == 'dyn':
+            self._exportDefines = pynja.OptionList([type(self).__name__ + "_EXPORT=1", type(self).__name__ + "_SHARED=1"])
+        else:
+            self._exportDefines = pynja.OptionList([type(self).__name__ + "_EXPORT=0", type(self).__name__ + "_SHARED=0"])
+        self._exportIncludePaths = pynja.OptionList([os.path.join(pynja.rootPaths.dllexport, "include")])
+
 
     def get_toolchain(self):
         toolchainName = "%s-%s" % (self.variant.toolchain, self.variant.arch)
@@ -72,7 +86,7 @@ class CppProject(pynja.CppProject):
 
     def set_cpp_compile_options(self, task):
         super().set_cpp_compile_options(task)
-        task.extraDeps.extend(self._forcedDeps)
+        task.extraDeps.extend(sorted(self._forcedDeps))
         task.phonyTarget = os.path.basename(task.sourcePath)
         if self.variant.os == "windows":
             if "msvc" in self.variant.toolchain:
@@ -91,16 +105,8 @@ class CppProject(pynja.CppProject):
         if isinstance(self.toolchain, pynja.ClangToolChain):
             task.extraOptions.append("-fcolor-diagnostics")
 
-        # define macros to handle DLL import/export
-        # And add the dllexport.h header to include paths for every project.
-        linkage = getattr(self.variant, "linkage", None)
-        if linkage == 'dyn':
-            task.defines.append(type(self).__name__ + "_EXPORT=1")
-            task.defines.append(type(self).__name__ + "_SHARED=1")
-        else:
-            task.defines.append(type(self).__name__ + "_EXPORT=0")
-            task.defines.append(type(self).__name__ + "_SHARED=0")
-        task.includePaths.append(os.path.join(pynja.rootPaths.dllexport, "include"))
+        task.defines.extend(self._exportDefines)
+        task.includePaths.extend(self._exportIncludePaths)
 
 
     # library creation
@@ -134,15 +140,7 @@ class CppProject(pynja.CppProject):
     def get_cpplib_project(self, projName, linkage=None):
         if linkage == None:
             linkage = self.variant.linkage
-        variantStr = "%s-%s-%s-%s-%s-%s" % (
-            self.variant.os,
-            self.variant.toolchain,
-            self.variant.arch,
-            self.variant.config,
-            self.variant.crt,
-            linkage
-        )
-        variant = CppLibVariant(variantStr)
+        variant = self.variant.derive(CppLibVariant, linkage=linkage)
         project = self.get_project(projName, variant)
         return project
 
@@ -3,15 +3,18 @@ import pynja
 from .root_paths import *
 
 class DeployVariant(pynja.Variant):
+    __slots__ = ()
+
+    fieldDefs = [
+        "product",      [ "app32", "app64", "sdk" ],
+        "config",       [ "dbg", "rel" ],
+    ]
+
     def __init__(self, string):
         super().__init__(string, self.get_field_defs())
 
     def get_field_defs(self):
-        fieldDefs = [
-            "product",      [ "app32", "app64", "sdk" ],
-            "config",       [ "dbg", "rel" ],
-        ]
-        return fieldDefs
+        return DeployVariant.fieldDefs
 
 class DeployProject(pynja.DeployProject):
     def __init__(self, projectMan, variant):
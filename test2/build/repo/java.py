@@ -5,14 +5,17 @@ from .root_paths import *
 
 
 class JavaVariant(pynja.Variant):
+    __slots__ = ()
+
+    fieldDefs = [
+        "toolchain",    [ "javac"  ],
+    ]
+
     def __init__(self, string):
         super().__init__(string, self.get_field_defs())
 
     def get_field_defs(self):
-        fieldDefs = [
-            "toolchain",    [ "javac"  ],
-        ]
-        return fieldDefs
+        return JavaVariant.fieldDefs
 
 
 class JavaProject(pynja.JavaProject):
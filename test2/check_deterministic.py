@@ -0,0 +1,67 @@
+import os, sys, subprocess
+
+# Generates the build twice, with different string hash seeds, and checks that
+# the second run reproduces every generated file byte for byte, without
+# rewriting any of them.  Then checks that ninja does not plan to regenerate
+# the build right away.
+
+builtDir = os.path.join('_out', 'built')
+
+# these record timings or file states, and so differ between runs
+ignoredSuffixes = ('.fingerprint', '.profile.json', '.trace.json', '.lock')
+
+def remake(hashSeed):
+    fingerprintPath = os.path.join(builtDir, 'build.ninja.fingerprint')
+    if os.path.exists(fingerprintPath):
+        os.unlink(fingerprintPath)
+    env = dict(os.environ)
+    env['PYTHONHASHSEED'] = str(hashSeed)
+    return subprocess.call([sys.executable, 'remake.py'] + sys.argv[1:], env=env)
+
+def snapshot():
+    files = {}
+    for dirPath, dirNames, fileNames in os.walk(builtDir):
+        for fileName in fileNames:
+            if fileName.endswith(ignoredSuffixes):
+                continue
+            path = os.path.join(dirPath, fileName)
+            if fileName.endswith('.ninja') or fileName.endswith('.rsp') or fileName.startswith('build.ninja'):
+                with open(path, 'rb') as file:
+                    files[path] = (file.read(), os.stat(path).st_mtime_ns)
+    return files
+
+def check_no_regenerate():
+    output = subprocess.check_output(['ninja', '-C', builtDir, '-n', 'build.ninja'], universal_newlines=True)
+    if 'no work to do' not in output:
+        sys.stdout.write(output)
+        return ['ninja plans to regenerate build.ninja right after generation']
+    return []
+
+def check_deterministic():
+    exitcode = remake(1)
+    if exitcode:
+        return exitcode
+    before = snapshot()
+    exitcode = remake(2)
+    if exitcode:
+        return exitcode
+    after = snapshot()
+
+    errors = []
+    for path in sorted(set(before) | set(after)):
+        if path not in after:
+            errors.append('missing after the second run: ' + path)
+        elif path not in before:
+            errors.append('only written by the second run: ' + path)
+        elif before[path][0] != after[path][0]:
+            errors.append('contents differ: ' + path)
+        elif before[path][1] != after[path][1]:
+            errors.append('rewritten with identical contents: ' + path)
+    errors.extend(check_no_regenerate())
+    for error in errors:
+        print(error)
+    print('%d generated files checked, %d problems' % (len(before), len(errors)))
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    exit(check_deterministic())
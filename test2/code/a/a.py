@@ -1,5 +1,3 @@
 import pynja
 
-pynja.import_subdir("a0")
-pynja.import_subdir("a1")
-pynja.import_subdir("a2")
+pynja.import_subdirs(["a0", "a1", "a2"])
@@ -7,12 +7,8 @@ class a2(repo.CppProject):
     def emit(self):
         self.includePaths.append(os.path.join(pynja.rootPaths.a2, "include"))
 
-        sources = [
-            "source/a2_0.cpp",
-        ]
-
         pchTask = self.make_pch("source/a2_pch.h")
-        with self.cpp_compile_ex(sources) as tasks:
+        with self.cpp_compile_glob_ex("source/*.cpp") as tasks:
             tasks.usePCH = pchTask.outputPath
 
         self.make_library("a2")
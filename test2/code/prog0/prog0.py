@@ -17,7 +17,7 @@ class prog0(repo.CppProject):
             task.includePaths.append(os.path.join(pynja.rootPaths.a0, "includeSpecial"))
         with self.cpp_compile_ex("source/e0_7.cpp") as task:
             # force no optimizations on this file
-            task.optimize = 0
+            task.optLevel = 0
 
         # compile multiple files at a time
         sources = [
@@ -143,16 +143,16 @@ def generate_ninja_build(projectMan):
     else:
         raise Exception("Not implemented")
 
-    deploy_variants.append(repo.DeployVariant("app32-dbg"))
-    deploy_variants.append(repo.DeployVariant("app32-rel"))
-    deploy_variants.append(repo.DeployVariant("app64-dbg"))
-    deploy_variants.append(repo.DeployVariant("app64-rel"))
+    deploy_variants.extend(repo.DeployVariant.enumerate(product=["app32", "app64"]))
 
     # assume protoc is in the path
     projectMan.add_toolchain(pynja.protoc.ProtocToolChain("protoc"))
     # add re2c
     projectMan.add_toolchain(pynja.re2c.Re2cToolChain(pynja.rootPaths.re2c))
 
+    # limit concurrent links and java compiles to what fits in memory
+    projectMan.add_default_pools()
+
     projectMan.emit_rules()
 
     projectMan.ninjaFile.write("\n");
@@ -161,11 +161,11 @@ def generate_ninja_build(projectMan):
     projectMan.ninjaFile.write("\n");
 
     for variant in cpp_variants:
-        projectMan.get_project("prog0", variant)
+        projectMan.request_project("prog0", variant)
     for variant in java_variants:
-        projectMan.get_project("java2", variant)
+        projectMan.request_project("java2", variant)
     for variant in deploy_variants:
-        projectMan.get_project("test2", variant)
+        projectMan.request_project("test2", variant)
 
     currentScriptPath = os.path.join(pynja.rootDir, os.path.basename(__file__))
 
@@ -181,4 +181,5 @@ def generate_ninja_build(projectMan):
 print("generating with rootDir=%s" % pynja.rootDir)
 repo.init()
 pynja.import_file('code/test2.py')
-pynja.regenerate_build(generate_ninja_build, pynja.rootPaths.built, pynja.rootPaths.codeBrowsing)
+targets, variants = pynja.get_selection_args()
+pynja.regenerate_build(generate_ninja_build, pynja.rootPaths.built, pynja.rootPaths.codeBrowsing, targets=targets, variants=variants)